@@ -1,7 +1,14 @@
 from django.contrib import admin
-from .models import User
+from .models import User, OutboxEmail
 
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     list_display=['name','email']
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'to', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['subject', 'dedupe_key']
@@ -7,4 +7,5 @@ class AccountsConfig(AppConfig):
 
 
     def ready(self):
-        import accounts.signals
\ No newline at end of file
+        import accounts.signals
+        import accounts.schema
\ No newline at end of file
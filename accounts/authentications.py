@@ -1,17 +1,32 @@
-from django.contrib.auth.backends import BaseBackend
+from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
-from django.db.models import Q
 from .utils import LimitLoginAttempt
 from .services import send_otp
+from django.utils.translation import gettext_lazy as _
 from rest_framework.exceptions import (
     NotAuthenticated
 )
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from .utils import user_cache
 
 User = get_user_model()
 
-loginAttempt = LimitLoginAttempt()
+class CustomAuthentication(ModelBackend):
+    """
+    Log in with an email or a phone number. The identifier is classified
+    up front so the user is found by one lookup on a unique index, and
+    permissions come from ModelBackend, so it is the only backend needed.
+    """
 
-class CustomAuthentication(BaseBackend):
+    @staticmethod
+    def identifier_field(identifier):
+        return 'email' if '@' in identifier else 'phone'
+
+    def user_for_identifier(self, identifier):
+        return User.objects.get(**{self.identifier_field(identifier): identifier})
     
     def authenticate(self, request, email=None, password=None, **kwargs):
         
@@ -19,22 +34,23 @@ class CustomAuthentication(BaseBackend):
             email = kwargs.get('username').strip()
 
         try:
-            user = User.objects.get(
-                Q(email=email) | Q(phone=email)  
-            )
+            user = self.user_for_identifier(email)
         except User.DoesNotExist:
+            # hash anyway so unknown identifiers take as long as wrong passwords
+            User().set_password(password)
             return None
 
         
-        loginAttempt(user.email)
+        login_attempt = LimitLoginAttempt()
+        login_attempt(user.email)
         
         if user.check_password(password):
             if not user.is_active and user.last_login is None:
                 send_otp(user.email)
                 raise NotAuthenticated({"detail":"Account is not verified."})
-            loginAttempt.clear()
+            login_attempt.clear()
             return user
-        loginAttempt.attempt()
+        login_attempt.attempt()
 
         return None
 
@@ -43,3 +59,33 @@ class CustomAuthentication(BaseBackend):
             return User.objects.get(pk=user_id)
         except User.DoesNotExist:
             return None
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user through the two-tier
+    user cache instead of querying accounts_user on every request.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = user_cache.get(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
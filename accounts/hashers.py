@@ -0,0 +1,64 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from rest_framework.exceptions import Throttled
+
+
+class HashPool:
+    """
+    Runs password hashing on a few threads per process. Callers beyond the
+    workers plus the queue wait up to ``timeout`` seconds for a slot and are
+    then turned away, so a burst of logins cannot hold every request thread.
+    """
+
+    def __init__(self, workers, queue, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(workers + queue)
+        self.executor = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    # threads do not survive a fork, so every process gets its own executor
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None or self.pid != os.getpid():
+                self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password-hash')
+                self.pid = os.getpid()
+            return self.executor
+
+    def run(self, func, *args):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise Throttled(detail='Too many logins in progress, try again shortly.')
+        try:
+            return self.get_executor().submit(func, *args).result()
+        finally:
+            self.slots.release()
+
+
+hash_pool = HashPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    queue=settings.PASSWORD_HASH_QUEUE,
+    timeout=settings.PASSWORD_HASH_WAIT,
+)
+
+
+class CalibratedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 with the iteration count from
+    ``settings.PASSWORD_HASH_ITERATIONS`` (see ``calibrate_hasher``).
+
+    The algorithm name is unchanged, so existing hashes verify as before and
+    ``check_password`` re-encodes them with the configured count on the next
+    successful login. ``verify`` hashes through ``encode``, so checks run in
+    ``hash_pool`` too.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
+
+    def encode(self, password, salt, iterations=None):
+        return hash_pool.run(super().encode, password, salt, iterations)
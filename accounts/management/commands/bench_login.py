@@ -0,0 +1,54 @@
+import statistics
+import time
+from django.contrib.auth import authenticate
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from accounts.authentications import CustomAuthentication
+from accounts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Time the email and phone login paths against the current database. Nothing is kept.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lookups', type=int, default=1000, help='Identifier lookups timed per path')
+        parser.add_argument('--logins', type=int, default=5, help='Full logins timed per path, dominated by password hashing')
+
+    def handle(self, *args, **options):
+        backend = CustomAuthentication()
+        password = 'bench-login-1'
+        with transaction.atomic():
+            user = User.objects.create_user('bench-login@example.com', password)
+            User.objects.filter(pk=user.pk).update(phone='700000000', is_active=True)
+
+            for path, identifier in (('email', user.email), ('phone', '700000000')):
+                timings, queries = self.measure(
+                    options['lookups'], lambda: backend.user_for_identifier(identifier)
+                )
+                self.report(f'{path} lookup', timings, queries)
+                timings, queries = self.measure(
+                    options['logins'], lambda: authenticate(None, email=identifier, password=password)
+                )
+                self.report(f'{path} login', timings, queries)
+
+            transaction.set_rollback(True)
+
+    def measure(self, runs, call):
+        timings = []
+        with CaptureQueriesContext(connection) as captured:
+            for _ in range(runs):
+                start = time.perf_counter()
+                call()
+                timings.append((time.perf_counter() - start) * 1000)
+        return timings, len(captured) / max(runs, 1)
+
+    def report(self, label, timings, queries):
+        if not timings:
+            return
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f'{label:<14} runs={len(timings):<5} mean={statistics.fmean(timings):.3f}ms '
+            f'p50={statistics.median(timings):.3f}ms p95={p95:.3f}ms queries/run={queries:g}'
+        )
@@ -0,0 +1,45 @@
+import time
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        'Time PBKDF2 on this host and print the PASSWORD_HASH_ITERATIONS value '
+        'that verifies one password in about --target-ms.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=100, help='Wanted verify time per password')
+        parser.add_argument('--sample-iterations', type=int, default=100000)
+        parser.add_argument('--rounds', type=int, default=5, help='Samples taken, the fastest is used')
+        parser.add_argument('--min-iterations', type=int, default=100000, help='Never recommend fewer iterations')
+
+    def handle(self, *args, **options):
+        hasher = PBKDF2PasswordHasher()
+        salt = hasher.salt()
+        sample = options['sample_iterations']
+
+        timings = []
+        for _ in range(options['rounds']):
+            start = time.perf_counter()
+            hasher.encode('calibrate-hasher', salt, sample)
+            timings.append(time.perf_counter() - start)
+        per_iteration = min(timings) / sample
+
+        iterations = int(options['target_ms'] / 1000 / per_iteration) // 1000 * 1000
+        if iterations < options['min_iterations']:
+            self.stderr.write(self.style.WARNING(
+                f"{options['target_ms']:g}ms allows only {iterations} iterations, "
+                f"using the minimum of {options['min_iterations']}."
+            ))
+            iterations = options['min_iterations']
+
+        current = settings.PASSWORD_HASH_ITERATIONS
+        self.stdout.write(
+            f'{sample} iterations: {min(timings) * 1000:.1f}ms. '
+            f'Current {current}: ~{current * per_iteration * 1000:.0f}ms, '
+            f'recommended {iterations}: ~{iterations * per_iteration * 1000:.0f}ms.'
+        )
+        self.stdout.write(self.style.SUCCESS(f'PASSWORD_HASH_ITERATIONS={iterations}'))
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from accounts.services import tokens_prune
+
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding/blacklisted JWTs, password-reset tokens and old outbox emails in small batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.TOKEN_JANITOR_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=settings.TOKEN_JANITOR_PAUSE, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        removed = tokens_prune(batch_size=options['batch_size'], pause=options['pause'])
+        for table, count in removed.items():
+            self.stdout.write(f'{table}: {count} removed')
+        self.stdout.write(self.style.SUCCESS(f'Done: {sum(removed.values())} rows removed.'))
@@ -0,0 +1,32 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from accounts.services import outbox_deliver
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbox emails in batches over one SMTP connection per batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.EMAIL_OUTBOX_BATCH_SIZE)
+        parser.add_argument('--max-attempts', type=int, default=settings.EMAIL_OUTBOX_MAX_ATTEMPTS)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when the queue is empty')
+        parser.add_argument('--interval', type=float, default=settings.EMAIL_OUTBOX_INTERVAL)
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = outbox_deliver(
+                batch_size=options['batch_size'],
+                max_attempts=options['max_attempts'],
+            )
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, failed {failed}.')
+            if not (sent or failed):
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {total_sent} sent, {total_failed} failed.'))
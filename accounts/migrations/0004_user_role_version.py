@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 05:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='role_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 
 
@@ -37,6 +38,8 @@ class User(AbstractUser):
     phone = models.CharField(max_length=20, null=True, unique=True)
     role = models.CharField(max_length=10, choices=UserRole.choices, default=UserRole.TEACHER, db_index=True)
     is_active = models.BooleanField(default=False)
+    # bumped when the role changes, so tokens minted before stop vouching for it
+    role_version = models.PositiveIntegerField(default=0)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
@@ -60,4 +63,38 @@ class Profile(models.Model):
     
 
     def __str__(self):
-        return self.user.email
\ No newline at end of file
+        return self.user.email
+
+
+class OutboxStatus(models.TextChoices):
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+
+class OutboxEmail(models.Model):
+    """
+    Email queued by request handlers and delivered by the outbox worker.
+    ``dedupe_key`` makes enqueueing the same message twice a no-op.
+    """
+    dedupe_key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.JSONField()
+    status = models.CharField(max_length=10, choices=OutboxStatus.choices, default=OutboxStatus.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['next_attempt_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} -> {", ".join(self.to)}'
@@ -0,0 +1,7 @@
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    """Describe CachedJWTAuthentication as the bearer JWT it extends."""
+
+    target_class = 'accounts.authentications.CachedJWTAuthentication'
@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from .models import User,UserRole
+from .tokens import RoleRefreshToken
 from .validators import(
     PasswordValidator,
     EmailValidator,
@@ -27,10 +29,11 @@ class UserInputSerializer(serializers.Serializer):
 
         
     def validate(self, data):
-        EmailValidator().validate(data['email'])
+        # uniqueness is enforced by the database when the user is inserted
+        EmailValidator(unique=False).validate(data['email'])
 
         if 'phone' in data:
-            PhoneValidator().validate(data['phone'])
+            PhoneValidator(unique=False).validate(data['phone'])
         else:
             if data['role'] == UserRole.TEACHER:
                 raise serializers.ValidationError({"detail":"Teachers must have a phone number"})
@@ -78,4 +81,8 @@ class UserChangePasswordSerializer(serializers.Serializer):
     def validate(self, data):
         if data['new_password'] != data['confirm_password']:
             raise serializers.ValidationError({"detail":"Passwords do not match"})
-        return data
\ No newline at end of file
+        return data
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RoleRefreshToken
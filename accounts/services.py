@@ -1,59 +1,97 @@
-from .models import User, Profile,UserRole
+import logging
+import time
+from datetime import timedelta
+from functools import lru_cache
+from .models import User, Profile,UserRole, OutboxEmail, OutboxStatus
 from django.shortcuts import get_object_or_404
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import IntegrityError, transaction
+from django.utils.crypto import salted_hmac
 from .utils import OTP_manager
 from rest_framework import serializers
-from rest_framework_simplejwt.tokens import RefreshToken
+from .tokens import RoleRefreshToken, role_claims_invalidate
 from rest_framework.authentication import authenticate
 from django.contrib.auth import login
 from django.contrib.auth.models import Group
+from django.contrib.auth.hashers import make_password
 from accounts.social_auth.google_oauth import GoogleOAuth2
 from django.utils import timezone
+from django_rest_passwordreset.models import ResetPasswordToken, get_password_reset_token_expiry_time
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from api import metrics
+
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=None)
+def role_group_id(role):
+    """Id of the group of a role, cached per process; cleared when groups change."""
+    return Group.objects.values_list('id', flat=True).get(name=role)
+
+
+def _integrity_detail(error):
+    message = str(error)
+    if 'email' in message:
+        return 'Email already exists'
+    if 'phone' in message:
+        return 'Phone already exists'
+    return message
+
 
 def user_create(name, email, role, password, phone=None):
-    
+    """
+    Register a user in one transaction: the user, its role group and its
+    profile are three INSERTs, and duplicate email or phone is reported
+    from the unique constraints instead of checked beforehand.
+    """
     try:
-        user = User.objects.create_user(email, password)
-        user.name = name if name else None
-        if phone is not None:
-            user.phone = phone
-        user.role = role
-        user.groups.clear()
-        user.groups.add(Group.objects.get(name=role))
-        user.save()
-    except Exception as e:
-        raise serializers.ValidationError({"detail":e})
-    
-    profile_create(user, None, None)
-    if not user.is_active:
-        send_otp(user.email)
+        group_id = role_group_id(role)
+    except Group.DoesNotExist:
+        raise serializers.ValidationError({"detail":f"Unknown role {role}"})
+
+    # hash outside the transaction so the write locks are held briefly
+    user = User(
+        email=User.objects.normalize_email(email),
+        name=name if name else None,
+        phone=phone,
+        role=role,
+        password=make_password(password),
+    )
+    try:
+        with transaction.atomic():
+            user.save(force_insert=True)
+            User.groups.through.objects.create(user_id=user.id, group_id=group_id)
+            Profile.objects.create(user=user)
+            if not user.is_active:
+                _otp_enqueue(user.email)
+    except IntegrityError as e:
+        raise serializers.ValidationError({"detail":_integrity_detail(e)})
     return user
 
 
 def profile_create(user, photo, bio):
-    profile = Profile.objects.create(user=user)
-    profile.photo = photo
-    profile.bio = bio
-    profile.save()    
-    return profile
+    return Profile.objects.create(user=user, photo=photo, bio=bio)
 
 
-def send_otp(email: str):
-    otp = OTP_manager()
-    user = get_object_or_404(User, email=email)
-    if user.is_active:
-        raise serializers.ValidationError({"detail":"has already been verified."})
-    otp_code = otp.generate_otp(email)
-    send_mail(
+def _otp_enqueue(email):
+    otp_code = OTP_manager().generate_otp(email)
+    email_enqueue(
         subject='OTP for eduak',
-        message=f'Your OTP is {otp_code}',
+        body=f'Your OTP is {otp_code}',
+        to=[email],
         from_email=settings.EMAIL_HOST_USER,
-        recipient_list=[email],
-        fail_silently=False,
+        # keyed hash, so the table holds no usable code once the email is sent
+        dedupe_key=f"otp:{salted_hmac('otp-outbox', f'{email}:{otp_code}').hexdigest()}",
     )
     return otp_code
 
+
+def send_otp(email: str):
+    user = get_object_or_404(User, email=email)
+    if user.is_active:
+        raise serializers.ValidationError({"detail":"has already been verified."})
+    return _otp_enqueue(email)
+
 def verify_otp(email: str, otp: str):
     user = get_object_or_404(User, email=email)
     otp_manager = OTP_manager()
@@ -65,25 +103,38 @@ def verify_otp(email: str, otp: str):
 
 
 def user_update(user, name=None, email=None, phone=None, role=None, photo=None, bio=None):
+    # ``user`` may come from the user cache, so only the columns changed
+    # here are written, not older copies of the others
+    fields = []
     if name is not None:
         user.name = name
+        fields.append('name')
     if email is not None:
         if User.objects.exclude(id=user.id).filter(email=email).first():
             raise serializers.ValidationError({"detail":'Email already exists'})
         user.email = email
+        fields.append('email')
     if phone is not None:
         user.phone = phone
+        fields.append('phone')
+    role_changed = role is not None and role != user.role
     if role is not None:
         user.role = role
+        fields.append('role')
         user.groups.clear()
         user.groups.add(Group.objects.get(name=role))
 
+    profile_fields = []
     if photo is not None:
         user.profile.photo = photo
+        profile_fields.append('photo')
     if bio is not None:
         user.profile.bio = bio
-    user.profile.save()
-    user.save()
+        profile_fields.append('bio')
+    user.profile.save(update_fields=profile_fields)
+    user.save(update_fields=fields)
+    if role_changed:
+        role_claims_invalidate(user)
     return user
 
 
@@ -91,7 +142,7 @@ def user_change_password(user, old_password, new_password):
     if not user.check_password(old_password):
         raise serializers.ValidationError({"detail":"Invalid old password"})
     user.set_password(new_password)
-    user.save()
+    user.save(update_fields=['password'])
     return user
 
 
@@ -116,5 +167,160 @@ def google_login(code):
     user.last_login = timezone.now()
     user.save()     
 
-    refresh = RefreshToken.for_user(user)
-    return refresh
\ No newline at end of file
+    refresh = RoleRefreshToken.for_user(user)
+    return refresh
+
+
+def email_enqueue(subject, body, to, html_body='', from_email=None, dedupe_key=None):
+    """
+    Queue an email for the outbox worker instead of talking to SMTP on the
+    request thread. Enqueueing an existing ``dedupe_key`` returns the
+    queued email unchanged.
+    """
+    try:
+        with transaction.atomic():
+            return OutboxEmail.objects.create(
+                dedupe_key=dedupe_key,
+                subject=subject,
+                body=body,
+                html_body=html_body,
+                from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+                to=list(to),
+            )
+    except IntegrityError:
+        if dedupe_key is None:
+            raise
+        return OutboxEmail.objects.get(dedupe_key=dedupe_key)
+
+
+def _outbox_claim(batch_size, lease):
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxStatus.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        # lease the batch so concurrent workers skip it while we send
+        OutboxEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            next_attempt_at=now + timedelta(seconds=lease)
+        )
+    return emails
+
+
+def _outbox_retry(email, error, backoff, max_attempts):
+    email.attempts += 1
+    email.last_error = str(error)
+    email.next_attempt_at = timezone.now() + timedelta(seconds=backoff * 2 ** (email.attempts - 1))
+    if email.attempts >= max_attempts:
+        email.status = OutboxStatus.FAILED
+    logger.warning('Outbox email %s failed (attempt %s): %s', email.pk, email.attempts, error)
+
+
+def outbox_deliver(batch_size=None, max_attempts=None, backoff=None):
+    """
+    Send one batch of due outbox emails over a single SMTP connection.
+    Failed emails are retried with exponential backoff until
+    ``max_attempts``. Returns (sent, failed).
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    max_attempts = max_attempts or settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+    backoff = backoff or settings.EMAIL_OUTBOX_BACKOFF
+
+    emails = _outbox_claim(batch_size, lease=settings.EMAIL_OUTBOX_LEASE)
+    if not emails:
+        return 0, 0
+    # past this, one more send could outlive the lease and be repeated by another worker
+    deadline = time.monotonic() + settings.EMAIL_OUTBOX_LEASE - 5 * settings.EMAIL_TIMEOUT
+
+    sent = failed = 0
+    remaining = list(emails)
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+        # the rest keep their old next_attempt_at and are due again at once
+        while remaining and time.monotonic() < deadline:
+            email = remaining.pop(0)
+            message = EmailMultiAlternatives(
+                subject=email.subject,
+                body=email.body,
+                from_email=email.from_email,
+                to=email.to,
+                connection=connection,
+            )
+            if email.html_body:
+                message.attach_alternative(email.html_body, 'text/html')
+            started = time.perf_counter()
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                metrics.email_send_duration.observe(time.perf_counter() - started, result='failed')
+                failed += 1
+                _outbox_retry(email, e, backoff, max_attempts)
+            else:
+                metrics.email_send_duration.observe(time.perf_counter() - started, result='sent')
+                sent += 1
+                email.status = OutboxStatus.SENT
+                email.sent_at = timezone.now()
+                # bodies carry OTP codes and reset links, of no use once sent
+                email.body = email.html_body = ''
+    except Exception as e:
+        # the connection itself failed: retry the rest of the batch later
+        for email in remaining:
+            failed += 1
+            _outbox_retry(email, e, backoff, max_attempts)
+    finally:
+        connection.close()
+        OutboxEmail.objects.bulk_update(
+            emails,
+            ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at', 'body', 'html_body'],
+        )
+    return sent, failed
+
+
+def _delete_in_batches(queryset, batch_size, pause):
+    deleted = 0
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        with transaction.atomic():
+            queryset.model.objects.filter(pk__in=pks).delete()
+        deleted += len(pks)
+        if len(pks) < batch_size:
+            return deleted
+        # let other writers take the table lock between batches
+        time.sleep(pause)
+
+
+def tokens_prune(batch_size=None, pause=None):
+    """
+    Delete expired refresh-token bookkeeping, password-reset tokens and
+    outbox emails done with for EMAIL_OUTBOX_KEEP_DAYS in batches of
+    ``batch_size`` rows, sleeping ``pause`` seconds between batches.
+    Returns the number of rows removed per table.
+    """
+    batch_size = batch_size or settings.TOKEN_JANITOR_BATCH_SIZE
+    pause = settings.TOKEN_JANITOR_PAUSE if pause is None else pause
+    now = timezone.now()
+    reset_expiry = now - timedelta(hours=get_password_reset_token_expiry_time())
+    outbox_expiry = now - timedelta(days=settings.EMAIL_OUTBOX_KEEP_DAYS)
+
+    # blacklist rows first, so deleting their outstanding tokens cascades to nothing
+    return {
+        'blacklisted': _delete_in_batches(
+            BlacklistedToken.objects.filter(token__expires_at__lt=now), batch_size, pause
+        ),
+        'outstanding': _delete_in_batches(
+            OutstandingToken.objects.filter(expires_at__lt=now), batch_size, pause
+        ),
+        'password_reset': _delete_in_batches(
+            ResetPasswordToken.objects.filter(created_at__lte=reset_expiry), batch_size, pause
+        ),
+        'outbox': _delete_in_batches(
+            OutboxEmail.objects.filter(
+                status__in=[OutboxStatus.SENT, OutboxStatus.FAILED], created__lt=outbox_expiry
+            ),
+            batch_size, pause,
+        ),
+    }
@@ -1,12 +1,13 @@
-from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django_rest_passwordreset.signals import reset_password_token_created
 from django.dispatch import receiver
 from django.urls import reverse
 from decouple import config
-from django.db.models.signals import post_migrate
+from django.db.models.signals import post_migrate, post_save, post_delete
 from django.contrib.auth.models import Group
-from .models import UserRole
+from .models import User, Profile, UserRole
+from .utils import user_cache
+from .services import email_enqueue, role_group_id
 
 @receiver(post_migrate)
 def create_groups(sender, **kwargs):
@@ -14,6 +15,21 @@ def create_groups(sender, **kwargs):
     Group.objects.get_or_create(name=UserRole.STUDENT)
 
 
+@receiver([post_save, post_delete], sender=Group)
+def clear_role_group_ids(sender, **kwargs):
+    role_group_id.cache_clear()
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    user_cache.invalidate(instance.user_id)
+
+
 
 @receiver(reset_password_token_created)
 def password_reset_token_created(sender, instance, reset_password_token, *args, **kwargs):
@@ -34,12 +50,12 @@ def password_reset_token_created(sender, instance, reset_password_token, *args,
     email_html_message = render_to_string('email/user_reset_password.html', context)
     email_plaintext_message = render_to_string('email/user_reset_password.txt', context)
 
-    # Create the email object and send
-    msg = EmailMultiAlternatives(
+    # Queue the email for the outbox worker
+    email_enqueue(
         subject="Password Reset for {title}".format(title=config('APP_NAME')),
         body=email_plaintext_message,
+        html_body=email_html_message,
         from_email=config('DEFAULT_FROM_EMAIL'),
-        to=[reset_password_token.user.email]
+        to=[reset_password_token.user.email],
+        dedupe_key=f"password-reset:{reset_password_token.key}",
     )
-    msg.attach_alternative(email_html_message, "text/html")
-    msg.send()
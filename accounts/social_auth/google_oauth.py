@@ -1,6 +1,82 @@
+import base64
+import json
+import re
+import threading
+import time
 from django.conf import settings
 import requests
+import rsa
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
 from rest_framework import serializers
+from urllib3.util.retry import Retry
+
+
+# One pooled session per process: connections to Google are kept alive
+# between logins. Only failed connects of GETs are retried, so a request
+# never takes longer than its timeouts allow and single-use authorization
+# codes are never sent twice.
+session = requests.Session()
+adapter = HTTPAdapter(
+    pool_maxsize=settings.GOOGLE_HTTP_POOL_SIZE,
+    max_retries=Retry(connect=2, read=0, backoff_factor=0.2, allowed_methods={'GET'}),
+)
+session.mount('https://', adapter)
+session.mount('http://', adapter)
+
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+
+
+def _b64decode(value):
+    return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+
+def _b64int(value):
+    return int.from_bytes(_b64decode(value), 'big')
+
+
+class GoogleKeys:
+    """
+    Google's ID-token signing keys, fetched from the JWKS endpoint and kept
+    for as long as its Cache-Control max-age allows. An unknown key id
+    triggers a refetch, at most once per ``refresh_interval`` seconds.
+    """
+
+    def __init__(self, refresh_interval=60):
+        self.keys = TTLCache(maxsize=16, ttl=settings.GOOGLE_CERTS_TTL)
+        self.refresh_interval = refresh_interval
+        self.fetched_at = None
+        self.lock = threading.Lock()
+
+    def get(self, kid):
+        with self.lock:
+            key = self.keys.get(kid)
+            now = time.monotonic()
+            if key is None and (self.fetched_at is None or now - self.fetched_at >= self.refresh_interval):
+                self.fetched_at = now
+                self.fetch()
+                key = self.keys.get(kid)
+            return key
+
+    def fetch(self):
+        response = session.get(settings.GOOGLE_CERTS_URL, timeout=settings.GOOGLE_HTTP_TIMEOUT)
+        response.raise_for_status()
+        max_age = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+        if max_age:
+            self.keys = TTLCache(maxsize=16, ttl=int(max_age.group(1)))
+        else:
+            self.keys.clear()
+        for jwk in response.json()['keys']:
+            if jwk.get('kty') == 'RSA':
+                self.keys[jwk['kid']] = rsa.PublicKey(_b64int(jwk['n']), _b64int(jwk['e']))
+
+    def clear(self):
+        with self.lock:
+            self.keys.clear()
+            self.fetched_at = None
+
+
+google_keys = GoogleKeys()
 
 
 class GoogleOAuth2:
@@ -9,8 +85,9 @@ class GoogleOAuth2:
         self.client_id = settings.GOOGLE_CLIENT_ID
         self.client_secret = settings.GOOGLE_CLIENT_SECRET
         self.redirect_uri = settings.GOOGLE_REDIRECT_URI
-        self.access_token_url = 'https://accounts.google.com/o/oauth2/token'
-        self.user_info_url = 'https://www.googleapis.com/oauth2/v1/userinfo'
+        self.access_token_url = settings.GOOGLE_TOKEN_URL
+        self.user_info_url = settings.GOOGLE_USER_INFO_URL
+        self.timeout = settings.GOOGLE_HTTP_TIMEOUT
 
     def get_access_token(self):
         try:
@@ -21,21 +98,55 @@ class GoogleOAuth2:
                 'redirect_uri': self.redirect_uri,
                 'grant_type': 'authorization_code'
             }
-            response = requests.post(self.access_token_url, data=data)
+            response = session.post(self.access_token_url, data=data, timeout=self.timeout)
             return response.json()
         except Exception as e:
             raise serializers.ValidationError({"detail":e})
-    
-    def get_user_info(self):
+
+    def verify_id_token(self, id_token):
+        """Check the signature and claims of an RS256 ID token and return its claims."""
+        try:
+            header, payload, signature = id_token.split('.')
+            kid = json.loads(_b64decode(header)).get('kid')
+            key = google_keys.get(kid)
+            if key is None:
+                raise ValueError('Unknown signing key.')
+            if rsa.verify(f'{header}.{payload}'.encode(), _b64decode(signature), key) != 'SHA-256':
+                raise ValueError('Unexpected signature algorithm.')
+            claims = json.loads(_b64decode(payload))
+        except (ValueError, KeyError, rsa.VerificationError, requests.RequestException) as e:
+            raise serializers.ValidationError({"detail":f"Invalid id_token: {e}"})
+
+        if claims.get('iss') not in GOOGLE_ISSUERS:
+            raise serializers.ValidationError({"detail":"Invalid id_token issuer."})
+        if claims.get('aud') != self.client_id:
+            raise serializers.ValidationError({"detail":"Invalid id_token audience."})
+        if claims.get('exp', 0) < time.time() - settings.GOOGLE_ID_TOKEN_LEEWAY:
+            raise serializers.ValidationError({"detail":"Expired id_token."})
+        if not claims.get('email'):
+            raise serializers.ValidationError({"detail":"id_token has no email."})
+        return claims
+
+    def get_user_info(self, access_token=None):
         try:
-            access_token = self.get_access_token()
+            access_token = access_token or self.get_access_token()
             data = {
                 'access_token': access_token['access_token']
             }
-            response = requests.get(self.user_info_url, params=data)
+            response = session.get(self.user_info_url, params=data, timeout=self.timeout)
             return response.json()
         except Exception as e:
             raise serializers.ValidationError({"detail":e})
 
     def get_user(self):
-        return self.get_user_info()
\ No newline at end of file
+        tokens = self.get_access_token()
+        if 'id_token' not in tokens:
+            # without the openid scope there is no ID token to verify
+            return self.get_user_info(tokens)
+        claims = self.verify_id_token(tokens['id_token'])
+        return {
+            'email': claims['email'],
+            'name': claims.get('name'),
+            'verified_email': claims.get('email_verified', False),
+            'picture': claims.get('picture'),
+        }
@@ -1,10 +1,44 @@
-from django.test import TestCase
+import base64
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+import rsa
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.core.cache import caches
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.contrib.auth import get_user_model
+from django.contrib.auth import hashers
 from django.contrib.auth.models import Group
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
+from rest_framework.exceptions import Throttled, ValidationError
 from django.urls import reverse
-from accounts.models import Profile, UserRole
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from django_rest_passwordreset.models import ResetPasswordToken
+from api.testing import QueryBudgetMixin
+from accounts.hashers import HashPool
+from accounts.social_auth.google_oauth import google_keys
+from accounts.models import Profile, UserRole, OutboxEmail, OutboxStatus
+from accounts.services import user_update, user_change_password, email_enqueue, outbox_deliver
+from accounts.tokens import ROLE_VERSION_KEY, RoleRefreshToken, role_version
+from accounts.utils import LimitLoginAttempt, UserCache, user_cache
+from api.cache import SQLiteCache
 
 User = get_user_model()
 
@@ -95,6 +129,29 @@ class UserRegistrationTest(APITestCase):
         response = self.client.post(self.register_url, self.valid_data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_register_user_duplicate_phone(self):
+        """Test registration with duplicate phone is caught by the constraint"""
+        self.client.post(self.register_url, self.valid_data)
+        data = self.valid_data.copy()
+        data['email'] = 'other@example.com'
+        response = self.client.post(self.register_url, data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(str(response.data['detail']), 'Phone already exists')
+        self.assertFalse(User.objects.filter(email='other@example.com').exists())
+
+    def test_register_user_writes_only(self):
+        """Test registration inserts user, group, profile and OTP email without lookups"""
+        self.client.post(self.register_url, dict(self.valid_data, email='warm@example.com', phone='771111111'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.register_url, self.valid_data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        statements = [q['sql'].split()[0] for q in queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(statements, ['INSERT'] * 4)
+        user = User.objects.get(email=self.valid_data['email'])
+        self.assertEqual(list(user.groups.values_list('name', flat=True)), ['teacher'])
+        self.assertTrue(Profile.objects.filter(user=user).exists())
+        self.assertEqual(OutboxEmail.objects.filter(to=[user.email]).count(), 1)
+
 
 class OTPTest(APITestCase):
     """Test OTP functionality"""
@@ -153,3 +210,592 @@ class UserProfileTest(APITestCase):
         self.client.force_authenticate(user=None)
         response = self.client.get(self.profile_url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class RoleClaimsTest(APITestCase):
+    """Test role claims embedded in JWT tokens"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        teacher_group, _ = Group.objects.get_or_create(name='teacher')
+        Group.objects.get_or_create(name='student')
+        
+        self.user = User.objects.create_user(
+            email='teacher@example.com',
+            password='testpass123'
+        )
+        self.user.role = UserRole.TEACHER
+        self.user.is_active = True
+        self.user.phone = '771234567'
+        self.user.groups.add(teacher_group)
+        self.user.save()
+        Profile.objects.create(user=self.user)
+        
+        self.login_url = reverse('token_obtain_pair')
+        self.refresh_url = reverse('token_refresh')
+        self.teacher_courses_url = reverse('teacher-course-list')
+    
+    def login(self):
+        response = self.client.post(
+            self.login_url,
+            {'email': self.user.email, 'password': 'testpass123'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+    
+    def test_login_token_has_role_claims(self):
+        """Test access token carries role and groups"""
+        access = AccessToken(self.login()['access'])
+        self.assertEqual(access['role'], UserRole.TEACHER)
+        self.assertEqual(access['groups'], ['teacher'])
+        self.assertFalse(access['is_superuser'])
+    
+    def test_teacher_permission_without_group_query(self):
+        """Test IsTeacher is decided from claims alone"""
+        tokens = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.teacher_courses_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for query in queries.captured_queries:
+            self.assertNotIn('auth_group', query['sql'])
+    
+    def test_role_change_invalidates_claims(self):
+        """Test changing role stops old tokens vouching for it"""
+        tokens = self.login()
+        user_update(self.user, role=UserRole.STUDENT)
+        
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        response = self.client.get(self.teacher_courses_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        
+        self.client.credentials()
+        response = self.client.post(self.refresh_url, {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_role_change_seen_by_every_worker(self):
+        """Test a role change holds whatever a worker's own cache or the shared one holds"""
+        tokens = self.login()
+        user_update(self.user, role=UserRole.STUDENT)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+
+        # another worker's process-local cache still has the old version
+        caches['default'].set(ROLE_VERSION_KEY.format(self.user.pk), 0, timeout=None)
+        response = self.client.get(self.teacher_courses_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        # the shared cache was restarted or evicted the key
+        caches['shared'].clear()
+        response = self.client.get(self.teacher_courses_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(role_version(self.user.pk), 1)
+
+
+class CachedJWTAuthenticationTest(APITestCase):
+    """Test cached user resolution for JWT requests"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        Group.objects.get_or_create(name='teacher')
+        Group.objects.get_or_create(name='student')
+        
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.user.is_active = True
+        self.user.save()
+        Profile.objects.create(user=self.user, bio='Hello')
+        
+        access = RoleRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.profile_url = reverse('user-profile')
+    
+    def test_steady_state_has_no_identity_queries(self):
+        """Test repeated requests resolve user and profile from cache"""
+        self.client.get(self.profile_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.profile_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['bio'], 'Hello')
+    
+    def test_profile_save_invalidates(self):
+        """Test profile changes are visible on the next request"""
+        self.client.get(self.profile_url)
+        profile = Profile.objects.get(user=self.user)
+        profile.bio = 'Updated'
+        profile.save()
+        response = self.client.get(self.profile_url)
+        self.assertEqual(response.data['bio'], 'Updated')
+    
+    def test_deactivation_invalidates(self):
+        """Test deactivated users are rejected immediately"""
+        self.client.get(self.profile_url)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.profile_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivation_reaches_other_workers(self):
+        """Test a worker with an empty local tier never reads another process's old copy"""
+        self.client.get(self.profile_url)
+        key = user_cache.key(self.user.pk)
+        stale = user_cache.cache.get(key)
+        self.user.is_active = False
+        self.user.save()
+        # the process-local cache of another worker still holds the active user
+        caches['default'].set(key, stale)
+        self.assertFalse(UserCache().get(self.user.pk).is_active)
+
+    def test_update_keeps_concurrent_changes(self):
+        """Test saving a cached user writes only the changed columns"""
+        cached = user_cache.get(self.user.pk)
+        user_change_password(self.user, 'testpass123', 'newpass456')
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        user_update(cached, name='Renamed')
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(user.name, 'Renamed')
+        self.assertTrue(user.check_password('newpass456'))
+        self.assertFalse(user.is_active)
+
+
+class EmailOutboxTest(APITestCase):
+    """Test queued email delivery"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        Group.objects.get_or_create(name='teacher')
+        Group.objects.get_or_create(name='student')
+        
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.send_otp_url = reverse('otp-send')
+    
+    def test_send_otp_only_enqueues(self):
+        """Test the request handler does not talk to SMTP"""
+        response = self.client.post(self.send_otp_url, {'email': self.user.email})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxEmail.objects.filter(to=[self.user.email]).count(), 1)
+    
+    def test_enqueue_dedupes(self):
+        """Test the same dedupe key is queued once"""
+        first = email_enqueue('Hi', 'Body', ['a@example.com'], dedupe_key='welcome:1')
+        second = email_enqueue('Hi', 'Body', ['a@example.com'], dedupe_key='welcome:1')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+    
+    def test_worker_sends_batch(self):
+        """Test the command delivers due emails and marks them sent"""
+        for i in range(3):
+            email_enqueue('Hi', 'Body', [f'user{i}@example.com'], html_body='<p>Body</p>')
+        call_command('send_outbox', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxStatus.SENT).exists())
+        self.assertFalse(OutboxEmail.objects.exclude(body='', html_body='').exists())
+
+    def test_otp_not_stored_after_send(self):
+        """Test the OTP stays out of the dedupe key and leaves the row once sent"""
+        response = self.client.post(self.send_otp_url, {'email': self.user.email})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        otp_code = caches['default'].get(self.user.email)
+        email = OutboxEmail.objects.get()
+        self.assertNotIn(otp_code, email.dedupe_key)
+        outbox_deliver()
+        self.assertIn(otp_code, mail.outbox[0].body)
+        email.refresh_from_db()
+        self.assertEqual(email.body, '')
+
+    @override_settings(EMAIL_OUTBOX_LEASE=50, EMAIL_TIMEOUT=10)
+    def test_worker_stops_before_lease_ends(self):
+        """Test no send starts once it could outlive the lease"""
+        email = email_enqueue('Hi', 'Body', ['a@example.com'])
+        self.assertEqual(outbox_deliver(), (0, 0))
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxStatus.PENDING)
+        self.assertLessEqual(email.next_attempt_at, timezone.now())
+        self.assertEqual(len(mail.outbox), 0)
+    
+    def test_worker_retries_with_backoff(self):
+        """Test failures are rescheduled and eventually given up"""
+        email = email_enqueue('Hi', 'Body', ['a@example.com'])
+        with mock.patch.object(locmem.EmailBackend, 'send_messages', side_effect=OSError('down')):
+            self.assertEqual(outbox_deliver(max_attempts=2, backoff=60), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual(email.attempts, 1)
+            self.assertEqual(email.status, OutboxStatus.PENDING)
+            self.assertGreater(email.next_attempt_at, timezone.now())
+            
+            OutboxEmail.objects.update(next_attempt_at=timezone.now())
+            outbox_deliver(max_attempts=2, backoff=60)
+            email.refresh_from_db()
+            self.assertEqual(email.status, OutboxStatus.FAILED)
+        self.assertEqual(len(mail.outbox), 0)
+
+
+def _failed_login(identifier):
+    """Run one failed login attempt in a worker process; returns its code."""
+    limiter = LimitLoginAttempt(attempts_limit=5, cache_alias='shared')
+    try:
+        limiter(identifier)
+        limiter.attempt()
+    except ValidationError as e:
+        return e.get_codes()['detail']
+
+
+def _increment(identifier):
+    limiter = LimitLoginAttempt(cache_alias='shared')
+    limiter(identifier)
+    return limiter.increment()
+
+
+class IdentifierLoginTest(APITestCase):
+    """Test logging in by email or phone"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='login@example.com', password='testpass123')
+        self.user.phone = '771234567'
+        self.user.is_active = True
+        self.user.save()
+        self.login_url = reverse('token_obtain_pair')
+
+    def login(self, identifier):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                self.login_url, {'email': identifier, 'password': 'testpass123'}, format='json'
+            )
+        lookups = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and 'FROM "accounts_user"' in q['sql']]
+        return response, lookups
+
+    def test_login_by_email_and_phone(self):
+        """Test each identifier is looked up once on its own column"""
+        for identifier, column in (('login@example.com', '"email"'), ('771234567', '"phone"')):
+            response, lookups = self.login(identifier)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(lookups), 1)
+            self.assertIn(f'"accounts_user".{column} =', lookups[0])
+            self.assertNotIn(' OR ', lookups[0])
+
+    def test_unknown_identifier(self):
+        """Test an unknown phone is rejected"""
+        response, _ = self.login('779999999')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_bench_login_command(self):
+        """Test the benchmark reports both paths and leaves no user behind"""
+        out = StringIO()
+        call_command('bench_login', lookups=3, logins=1, stdout=out)
+        for label in ('email lookup', 'email login', 'phone lookup', 'phone login'):
+            self.assertIn(label, out.getvalue())
+        self.assertIn('queries/run=1', out.getvalue())
+        self.assertFalse(User.objects.filter(email='bench-login@example.com').exists())
+
+
+class CalibratedHasherTest(APITestCase):
+    """Test the calibrated password hasher"""
+
+    def test_login_rehashes_with_configured_iterations(self):
+        """Test a stored hash is upgraded on the next successful login"""
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            user = User.objects.create_user(email='hash@example.com', password='testpass123')
+        User.objects.filter(pk=user.pk).update(is_active=True)
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            response = self.client.post(
+                reverse('token_obtain_pair'), {'email': user.email, 'password': 'testpass123'}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+
+    def test_login_checks_password_in_pool(self):
+        """Test check_password and a login run PBKDF2 on hash_pool threads only"""
+        user = User.objects.create_user(email='pool@example.com', password='testpass123')
+        User.objects.filter(pk=user.pk).update(is_active=True)
+        threads = []
+        original = hashers.pbkdf2
+
+        def pbkdf2(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return original(*args, **kwargs)
+
+        with mock.patch.object(hashers, 'pbkdf2', pbkdf2):
+            self.assertTrue(User.objects.get(pk=user.pk).check_password('testpass123'))
+            response = self.client.post(
+                reverse('token_obtain_pair'), {'email': user.email, 'password': 'testpass123'}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(threads), 2)
+        for name in threads:
+            self.assertTrue(name.startswith('password-hash'), name)
+
+    def test_pool_refuses_when_full(self):
+        """Test hashing beyond the pool's workers and queue is throttled"""
+        pool = HashPool(workers=1, queue=0, timeout=0)
+        started, release = threading.Event(), threading.Event()
+
+        def busy():
+            started.set()
+            release.wait(5)
+
+        worker = threading.Thread(target=pool.run, args=(busy,))
+        worker.start()
+        started.wait(5)
+        try:
+            with self.assertRaises(Throttled):
+                pool.run(lambda: None)
+        finally:
+            release.set()
+            worker.join()
+        self.assertEqual(pool.run(lambda x: x * 2, 21), 42)
+
+    def test_calibrate_command(self):
+        """Test the calibration prints a setting value"""
+        out = StringIO()
+        call_command(
+            'calibrate_hasher', sample_iterations=1000, rounds=1, min_iterations=1000, stdout=out
+        )
+        self.assertRegex(out.getvalue(), r'PASSWORD_HASH_ITERATIONS=\d+000')
+
+
+class GoogleStubHandler(BaseHTTPRequestHandler):
+    """Serves the Google token, JWKS and userinfo endpoints from the test server."""
+
+    def respond(self):
+        path = urlsplit(self.path).path
+        self.server.hits[path] += 1
+        if path == '/slow':
+            time.sleep(1)
+        body = json.dumps(self.server.routes[path]()).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Cache-Control', 'public, max-age=3600')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = respond
+
+    def log_message(self, *args):
+        pass
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+class GoogleLoginTest(APITestCase):
+    """Test Google login against a local stub of Google's endpoints"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.public_key, cls.private_key = rsa.newkeys(1024)
+        cls.foreign_key = rsa.newkeys(1024)[1]
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), GoogleStubHandler)
+        cls.server.hits = Counter()
+        cls.server.routes = {
+            '/token': lambda: {'access_token': 'access', 'id_token': cls.server.id_token},
+            '/slow': lambda: {'access_token': 'access'},
+            '/certs': lambda: {'keys': [{
+                'kty': 'RSA', 'alg': 'RS256', 'use': 'sig', 'kid': 'key-1',
+                'n': _b64(cls.public_key.n.to_bytes(128, 'big')), 'e': _b64(b'\x01\x00\x01'),
+            }]},
+            '/userinfo': lambda: {'email': 'google@example.com', 'name': 'Google', 'verified_email': True},
+        }
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        base = f'http://127.0.0.1:{cls.server.server_port}'
+        cls.urls = override_settings(
+            GOOGLE_TOKEN_URL=f'{base}/token',
+            GOOGLE_CERTS_URL=f'{base}/certs',
+            GOOGLE_USER_INFO_URL=f'{base}/userinfo',
+        )
+        cls.urls.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.urls.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        Group.objects.get_or_create(name='student')
+        google_keys.clear()
+        self.server.hits.clear()
+        self.server.id_token = self.id_token()
+
+    def id_token(self, key=None, **claims):
+        header = _b64(json.dumps({'alg': 'RS256', 'kid': 'key-1', 'typ': 'JWT'}).encode())
+        payload = _b64(json.dumps({
+            'iss': 'https://accounts.google.com',
+            'aud': settings.GOOGLE_CLIENT_ID,
+            'exp': time.time() + 3600,
+            'email': 'google@example.com',
+            'email_verified': True,
+            'name': 'Google User',
+            **claims,
+        }).encode())
+        signature = rsa.sign(f'{header}.{payload}'.encode(), key or self.private_key, 'SHA-256')
+        return f'{header}.{payload}.{_b64(signature)}'
+
+    def login(self, code='code'):
+        return self.client.get(reverse('google_login'), {'code': code})
+
+    def test_login_verifies_id_token_locally(self):
+        """Test the id_token is verified with cached keys and userinfo is skipped"""
+        self.assertEqual(self.login('first').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.login('second').status_code, status.HTTP_200_OK)
+        user = User.objects.get(email='google@example.com')
+        self.assertEqual(user.name, 'Google User')
+        self.assertTrue(user.is_active)
+        self.assertEqual(self.server.hits, Counter({'/token': 2, '/certs': 1}))
+
+    def test_rejects_foreign_signature(self):
+        """Test an id_token signed by another key is rejected"""
+        self.server.id_token = self.id_token(key=self.foreign_key)
+        self.assertEqual(self.login().status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(User.objects.filter(email='google@example.com').exists())
+
+    def test_rejects_other_audience(self):
+        """Test an id_token issued to another client is rejected"""
+        self.server.id_token = self.id_token(aud='someone-else')
+        self.assertEqual(self.login().status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_slow_upstream_times_out(self):
+        """Test a slow token endpoint fails after the read timeout"""
+        base = f'http://127.0.0.1:{self.server.server_port}'
+        with override_settings(GOOGLE_TOKEN_URL=f'{base}/slow', GOOGLE_HTTP_TIMEOUT=(1, 0.2)):
+            start = time.monotonic()
+            response = self.login()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertLess(time.monotonic() - start, 1)
+
+
+class TokenJanitorTest(TestCase):
+    """Test pruning expired tokens"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='janitor@example.com', password='testpass123')
+
+    def outstanding(self, jti, expires_at, blacklisted=False):
+        token = OutstandingToken.objects.create(
+            user=self.user, jti=jti, token=jti, created_at=timezone.now(), expires_at=expires_at
+        )
+        if blacklisted:
+            BlacklistedToken.objects.create(token=token)
+        return token
+
+    def test_prune_removes_only_expired_rows(self):
+        """Test expired rows go in batches and live ones stay"""
+        past, future = timezone.now() - timedelta(hours=1), timezone.now() + timedelta(hours=1)
+        for i in range(5):
+            self.outstanding(f'expired-{i}', past, blacklisted=i < 3)
+        live = self.outstanding('live', future, blacklisted=True)
+        old = ResetPasswordToken.objects.create(user=self.user, user_agent='test', ip_address='127.0.0.1')
+        ResetPasswordToken.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=2))
+        fresh = ResetPasswordToken.objects.create(user=self.user, user_agent='test', ip_address='127.0.0.1')
+        sent = email_enqueue('Hi', '', ['a@example.com'])
+        OutboxEmail.objects.filter(pk=sent.pk).update(
+            status=OutboxStatus.SENT, created=timezone.now() - timedelta(days=settings.EMAIL_OUTBOX_KEEP_DAYS + 1)
+        )
+        pending = email_enqueue('Hi', 'Body', ['b@example.com'])
+        OutboxEmail.objects.filter(pk=pending.pk).update(created=timezone.now() - timedelta(days=30))
+
+        out = StringIO()
+        with mock.patch('accounts.services.time.sleep') as sleep:
+            call_command('prune_tokens', batch_size=2, pause=0.5, stdout=out)
+
+        self.assertIn('blacklisted: 3 removed', out.getvalue())
+        self.assertIn('outstanding: 5 removed', out.getvalue())
+        self.assertIn('password_reset: 1 removed', out.getvalue())
+        self.assertIn('outbox: 1 removed', out.getvalue())
+        self.assertEqual(list(OutboxEmail.objects.all()), [pending])
+        self.assertEqual(list(OutstandingToken.objects.all()), [live])
+        self.assertTrue(BlacklistedToken.objects.filter(token=live).exists())
+        self.assertEqual(list(ResetPasswordToken.objects.all()), [fresh])
+        # each full batch is followed by a pause: one blacklisted, two outstanding
+        self.assertEqual(sleep.call_count, 3)
+
+
+class LimitLoginAttemptTest(TestCase):
+    """Test the cross-process login attempt limiter"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'shared': {
+                'BACKEND': 'api.cache.SQLiteCache',
+                'LOCATION': os.path.join(self.tmpdir.name, 'shared.sqlite3'),
+            },
+        })
+        self.settings_override.enable()
+    
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tmpdir.cleanup()
+    
+    def test_lockout_at_limit(self):
+        """Test the limit-th failure locks the account"""
+        statuses = [_failed_login('user@example.com') for _ in range(6)]
+        self.assertEqual(statuses, [401, 401, 401, 401, 429, 429])
+    
+    def test_success_clears_attempts(self):
+        """Test a successful login resets the counter"""
+        _failed_login('user@example.com')
+        limiter = LimitLoginAttempt(cache_alias='shared')
+        limiter('user@example.com')
+        limiter.clear()
+        self.assertEqual(limiter.increment(), 1)
+    
+    def test_counter_is_atomic_across_processes(self):
+        """Test concurrent increments from several processes are all counted"""
+        with multiprocessing.get_context('fork').Pool(4) as pool:
+            counts = pool.map(_increment, ['racer@example.com'] * 200)
+        self.assertEqual(sorted(counts), list(range(1, 201)))
+    
+    def test_limit_holds_across_processes(self):
+        """Test concurrent failures from several workers lock at the limit"""
+        with multiprocessing.get_context('fork').Pool(4) as pool:
+            statuses = pool.map(_failed_login, ['racer@example.com'] * 40)
+        self.assertEqual(statuses.count(401), 4)
+        self.assertEqual(statuses.count(429), 36)
+
+    def test_expired_counters_are_culled(self):
+        """Test writes periodically delete expired rows from the cache file"""
+        cache = SQLiteCache(os.path.join(self.tmpdir.name, 'cull.sqlite3'), {'OPTIONS': {'CULL_EVERY': 3}})
+        cache.set('expired', 1, timeout=0)
+        cache.add('window', 1, timeout=0)
+        rows = lambda: cache.connection().execute('SELECT key FROM cache').fetchall()
+        self.assertEqual(len(rows()), 2)
+        self.assertIsNone(cache.get('expired'))
+        cache.add('live', 1, timeout=60)
+        self.assertEqual(rows(), [(cache.make_key('live'),)])
+        expires, = cache.connection().execute('SELECT expires FROM cache').fetchone()
+        self.assertAlmostEqual(expires, time.time() + 60, delta=5)
+
+
+class AccountQueryBudgetTest(QueryBudgetMixin, APITestCase):
+    """Test account endpoints run a fixed number of queries"""
+
+    def setUp(self):
+        self.user = User.objects.create(email='budget@example.com', is_active=True)
+        Profile.objects.create(user=self.user)
+        self.seeded = 0
+        access = RoleRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def seed(self, count):
+        """Add ``count`` other users with profiles"""
+        for _ in range(count):
+            self.seeded += 1
+            Profile.objects.create(user=User.objects.create(email=f'other{self.seeded}@example.com'))
+
+    def test_profile_budget(self):
+        """Test the profile is served from the user cache"""
+        self.assertQueryBudget(0, self.seed, lambda: self.client.get(reverse('user-profile')))
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.token_blacklist.models import (
+    OutstandingToken,
+    BlacklistedToken,
+)
+from .models import User
+
+ROLE_VERSION_KEY = 'role_version_{}'
+
+
+def role_version(user_id):
+    """
+    User.role_version of ``user_id``, read through ROLE_VERSION_CACHE so
+    every worker sees a bump at once; the column keeps it when the cache
+    loses the key.
+    """
+    cache = caches[settings.ROLE_VERSION_CACHE]
+    key = ROLE_VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = User.objects.filter(pk=user_id).values_list('role_version', flat=True).first() or 0
+        # add, so a bump stored meanwhile is not overwritten with the old value
+        cache.add(key, version, timeout=None)
+    return version
+
+
+def role_claims_invalidate(user):
+    """
+    Make every token issued to ``user`` so far stop vouching for its role:
+    access tokens fall back to a database check and refresh tokens are
+    blacklisted so no new access token can copy the stale claims.
+    """
+    users = User.objects.filter(pk=user.pk)
+    users.update(role_version=F('role_version') + 1)
+    version = users.values_list('role_version', flat=True).get()
+    user.role_version = version  # so a later save of ``user`` keeps it
+    caches[settings.ROLE_VERSION_CACHE].set(ROLE_VERSION_KEY.format(user.pk), version, timeout=None)
+
+    outstanding = OutstandingToken.objects.filter(
+        user=user,
+        expires_at__gt=timezone.now(),
+        blacklistedtoken__isnull=True,
+    )
+    BlacklistedToken.objects.bulk_create(
+        [BlacklistedToken(token=token) for token in outstanding],
+        ignore_conflicts=True,
+    )
+
+
+def role_claims(request):
+    """
+    Role claims of the token that authenticated ``request``, or None when
+    the request was not authenticated by one of our tokens or the claims
+    were invalidated since the token was issued.
+    """
+    payload = getattr(request.auth, 'payload', None)
+    if not payload or 'role' not in payload:
+        return None
+    if payload.get('role_version') != role_version(request.user.pk):
+        return None
+    return payload
+
+
+class RoleRefreshToken(RefreshToken):
+    """
+    Refresh token carrying the user's role and group names. The claims are
+    copied to every access token derived from it.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['role'] = user.role
+        token['groups'] = list(user.groups.values_list('name', flat=True))
+        token['is_superuser'] = user.is_superuser
+        # an outdated instance only makes the claims unused, never trusted
+        token['role_version'] = user.role_version
+        return token
@@ -1,12 +1,12 @@
 from django.urls import path, include
 from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
     TokenRefreshView,
     TokenVerifyView,
     TokenBlacklistView,
 )
 
 from .views import (
+    LoginAPI,
     UserCreateAPI,
     UserProfileAPI,
     OTPSendAPI,
@@ -17,7 +17,7 @@ from .views import (
 )
 
 urlpatterns = [
-    path('login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('login/', LoginAPI.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('token/verify/', TokenVerifyView.as_view(), name='token_verify'),
     path('logout/', TokenBlacklistView.as_view(), name='token_blacklist'),
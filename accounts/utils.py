@@ -1,57 +1,86 @@
+import logging
+import pickle
+import threading
 import pyotp
-from django.core.cache import cache
+from cachetools import TTLCache
+from django.core.cache import cache, caches
 from rest_framework import serializers
 from rest_framework import status
 from django.utils.timezone import now ,timedelta
 from django.conf import settings
+from django.db import close_old_connections
+from api import metrics
 
 LOGIN_ATTEMPT_LIMIT = settings.LOGIN_ATTEMPT_LIMIT
 LOGIN_BLOCK_TIME = settings.LOGIN_BLOCK_TIME
 LOGIN_ATTEMPT_EXPIRE_TIME = settings.LOGIN_ATTEMPT_EXPIRE_TIME
+LOGIN_ATTEMPT_CACHE = settings.LOGIN_ATTEMPT_CACHE
+USER_CACHE_LOCAL_SIZE = settings.USER_CACHE_LOCAL_SIZE
+USER_CACHE_LOCAL_TTL = settings.USER_CACHE_LOCAL_TTL
+USER_CACHE_TTL = settings.USER_CACHE_TTL
+USER_CACHE = settings.USER_CACHE
 
 
 class LimitLoginAttempt:
+    """
+    Failed-login limiter. Counters live in a cache shared by all workers and
+    are only changed with atomic ``add``/``incr``, so concurrent attempts
+    from several processes are all counted and the lockout happens at
+    exactly ``attempts_limit`` failures.
+    """
     
-    def __init__(self, attempts_limit=LOGIN_ATTEMPT_LIMIT, block_time=LOGIN_BLOCK_TIME, expire_time=LOGIN_ATTEMPT_EXPIRE_TIME):
+    def __init__(self, attempts_limit=LOGIN_ATTEMPT_LIMIT, block_time=LOGIN_BLOCK_TIME, expire_time=LOGIN_ATTEMPT_EXPIRE_TIME, cache_alias=LOGIN_ATTEMPT_CACHE):
         self.attempts_limit = attempts_limit
         self.block_time =  block_time
         self.expire_time =  expire_time
+        self.cache = caches[cache_alias]
 
 
     def __call__(self, identifier):
         
         self.block_key = f"block_{identifier}"
-        block_data = cache.get(self.block_key)
+        block_data = self.cache.get(self.block_key)
         if block_data:
-            block_end_time = block_data["end_time"]
-            time_remaining = block_end_time - now()
-            mins_remaining = int(time_remaining.total_seconds() / 60)
-            
-            raise serializers.ValidationError(
-                {"detail":f"Account temporarily locked. Try again after {mins_remaining} minutes."},
-                status.HTTP_429_TOO_MANY_REQUESTS
-            )
+            self.raise_blocked(block_data["end_time"])
         
         self.attempt_key = f"attempt_{identifier}"
+
+    def raise_blocked(self, block_end_time):
+        time_remaining = block_end_time - now()
+        mins_remaining = int(time_remaining.total_seconds() / 60)
+        
+        raise serializers.ValidationError(
+            {"detail":f"Account temporarily locked. Try again after {mins_remaining} minutes."},
+            status.HTTP_429_TOO_MANY_REQUESTS
+        )
         
     def clear(self):
-        cache.delete(self.attempt_key)
+        self.cache.delete(self.attempt_key)
+
+    def increment(self):
+        # the window starts at the first failure and is not extended by later ones
+        self.cache.add(self.attempt_key, 0, timeout=self.expire_time*60)
+        try:
+            return self.cache.incr(self.attempt_key)
+        except ValueError:
+            # expired between add and incr
+            self.cache.add(self.attempt_key, 1, timeout=self.expire_time*60)
+            return 1
         
     def attempt(self):
-        attempts = cache.get(self.attempt_key,0)
-        attempts += 1
+        attempts = self.increment()
         if attempts >= self.attempts_limit :
+            # the counter is left to expire on its own so racing attempts
+            # keep counting past the limit instead of starting over
             block_end_time = now() + timedelta(minutes=self.block_time)
-            cache.set(self.block_key,{'end_time':block_end_time},timeout=self.block_time*60)
-            cache.delete(self.attempt_key)
+            if self.cache.add(self.block_key,{'end_time':block_end_time},timeout=self.block_time*60):
+                metrics.login_lockouts.inc()
 
             raise serializers.ValidationError(
                 {"detail":f"Too many failed login attempts. Account locked for {self.block_time} minutes."},
                 status.HTTP_429_TOO_MANY_REQUESTS
             )
         
-        cache.set(self.attempt_key,attempts,timeout=self.expire_time*60)
-        
         raise serializers.ValidationError(
             {"detail":f"Invalid credentials. Try again. You have {self.attempts_limit - attempts} attempts remaining."},
             status.HTTP_401_UNAUTHORIZED
@@ -79,4 +108,93 @@ class OTP_manager:
             return True
         
         return False
-    
+
+
+class UserCache:
+    """
+    Two-tier cache of authenticated users (with their profile).
+
+    The first tier is a bounded in-process TTL/LRU map, the second is the
+    USER_CACHE alias, shared by all workers. Entries are stored pickled so every
+    request gets its own User instance. Saves and deletes invalidate both
+    tiers of the current process and the shared tier; other processes drop
+    their local copy when its short TTL runs out.
+    """
+
+    key_prefix = 'auth_user_'
+
+    def __init__(self, maxsize=USER_CACHE_LOCAL_SIZE, local_ttl=USER_CACHE_LOCAL_TTL, ttl=USER_CACHE_TTL):
+        self.local = TTLCache(maxsize=maxsize, ttl=local_ttl)
+        self.lock = threading.Lock()
+        self.ttl = ttl
+
+    @property
+    def cache(self):
+        return caches[USER_CACHE]
+
+    def key(self, user_id):
+        return f"{self.key_prefix}{user_id}"
+
+    def load(self, user_id):
+        from .models import User
+        return User.objects.select_related('profile').filter(pk=user_id).first()
+
+    def get(self, user_id):
+        key = self.key(user_id)
+        with self.lock:
+            payload = self.local.get(key)
+        result = 'local'
+        if payload is None:
+            payload = self.cache.get(key)
+            result = 'shared'
+            if payload is None:
+                result = 'miss'
+                user = self.load(user_id)
+                if user is None:
+                    metrics.user_cache_lookups.inc(result=result)
+                    return None
+                payload = pickle.dumps(user)
+                self.cache.set(key, payload, timeout=self.ttl)
+            with self.lock:
+                self.local[key] = payload
+        metrics.user_cache_lookups.inc(result=result)
+        return pickle.loads(payload)
+
+    def invalidate(self, user_id):
+        key = self.key(user_id)
+        with self.lock:
+            self.local.pop(key, None)
+        self.cache.delete(key)
+
+    def clear(self):
+        with self.lock:
+            self.local.clear()
+
+
+user_cache = UserCache()
+
+
+class PeriodicWorker(threading.Thread):
+    """
+    Daemon thread calling ``task`` every ``interval`` seconds, for jobs that
+    can run inside the web process when no separate worker is deployed.
+    """
+
+    def __init__(self, name, task, interval):
+        super().__init__(name=name, daemon=True)
+        self.task = task
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.task()
+            except Exception:
+                logging.getLogger(__name__).exception('%s failed', self.name)
+            finally:
+                close_old_connections()
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
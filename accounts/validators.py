@@ -35,11 +35,15 @@ class PasswordValidator:
     
 
 class EmailValidator:
+
+    def __init__(self, unique=True):
+        # unique=False leaves duplicates to the database constraint
+        self.unique = unique
     
     def validate(self, email):
         if not email:
             raise serializers.ValidationError({"detail":"The given email must be set"})
-        if User.objects.filter(email=email).first():
+        if self.unique and User.objects.filter(email=email).first():
             raise serializers.ValidationError({"detail":"Email already exists"})
 
         return email
@@ -51,9 +55,10 @@ class EmailValidator:
 
 class PhoneValidator:
 
-    def __init__(self,length=9,allowed_prefixes=['70','71','73','77','78']):
+    def __init__(self,length=9,allowed_prefixes=['70','71','73','77','78'],unique=True):
         self.length = length
         self.allowed_prefixes = allowed_prefixes
+        self.unique = unique
         
     def validate(self, phone):
         if len(phone) != self.length:
@@ -62,7 +67,7 @@ class PhoneValidator:
             raise serializers.ValidationError({"detail":"Phone number must be a number"})
         if not any(phone.startswith(prefix) for prefix in self.allowed_prefixes):
             raise serializers.ValidationError({"detail":"Phone number invalid"})
-        if User.objects.filter(phone=phone).first():
+        if self.unique and User.objects.filter(phone=phone).first():
             raise serializers.ValidationError({"detail":"Phone already exists"})
         
         return phone
@@ -1,7 +1,8 @@
 from rest_framework.views import APIView
+from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from .tokens import RoleRefreshToken
+from .authentications import CachedJWTAuthentication
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework import status
 
@@ -31,6 +32,10 @@ from django.utils import timezone
 User = get_user_model()
 
 
+class LoginAPI(TokenObtainPairView):
+    throttle_scope = 'login'
+
+
 @extend_schema(tags=['Accounts'])
 class UserCreateAPI(APIView):
     serializer_class = UserInputSerializer
@@ -54,6 +59,7 @@ class UserCreateAPI(APIView):
 class OTPSendAPI(APIView):
     authentication_classes = []
     permission_classes = []
+    throttle_scope = 'otp'
     serializer_class = OTPSendSerializer
     def post(self, request):
         serializer = OTPSendSerializer(data=request.data)
@@ -67,6 +73,7 @@ class OTPSendAPI(APIView):
 class OTPVerifyAPI(APIView):
     authentication_classes = []
     permission_classes = []
+    throttle_scope = 'otp'
     serializer_class = OTPVerifySerializer
     def post(self, request):
         serializer = OTPVerifySerializer(data=request.data)
@@ -75,7 +82,7 @@ class OTPVerifyAPI(APIView):
                 user = User.objects.get(email=serializer.data["email"])
                 user.last_login = timezone.now()
                 user.save()
-                refresh = RefreshToken.for_user(user)
+                refresh = RoleRefreshToken.for_user(user)
                 
                 return Response(
                     {
@@ -90,7 +97,7 @@ class OTPVerifyAPI(APIView):
 
 @extend_schema(tags=['Accounts'])
 class UserProfileAPI(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     serializer_class = UserOutputSerializer
     permission_classes = [IsAuthenticated]
     def get(self, request):
@@ -101,7 +108,7 @@ class UserProfileAPI(APIView):
 
 @extend_schema(tags=['Accounts'])
 class UserUpdateAPI(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     serializer_class = UserUpdateSerializer
     def put(self, request):
@@ -124,7 +131,7 @@ class UserUpdateAPI(APIView):
 
 @extend_schema(tags=['Accounts'])
 class UserChangePasswordAPI(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     serializer_class = UserChangePasswordSerializer
     def put(self, request):
@@ -143,6 +150,7 @@ class LoginByGoogleView(APIView):
 
     permission_classes = [AllowAny]
     authentication_classes = []
+    throttle_scope = 'login'
    
     def get(self, request):
         code = request.GET.get('code')
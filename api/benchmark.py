@@ -0,0 +1,250 @@
+import math
+import statistics
+import time
+from collections import Counter
+from importlib import import_module
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count
+from django.urls import URLResolver, reverse
+from django_rest_passwordreset.models import ResetPasswordToken
+from rest_framework.test import APIClient
+
+from accounts.models import Profile, User, UserRole
+from accounts.tokens import RoleRefreshToken
+from accounts.utils import OTP_manager
+from api.middleware import QueryStats
+from courses.models import Subject
+
+BENCH_PASSWORD = 'bench-password-1'
+
+# routes that cannot run in-process, with the reason
+SKIPPED = {
+    'google_login': 'calls Google',
+}
+
+# latency percentiles checked against a baseline; p99 of a few dozen
+# samples is the slowest request and too noisy to gate on
+GATED_PERCENTILES = ('p50', 'p95')
+
+
+def api_routes(patterns=None, namespace=None):
+    """Names of every named route in ``api/urls.py``, namespaced like ``reverse`` wants them."""
+    if patterns is None:
+        patterns = import_module('api.urls').urlpatterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            inner = ':'.join(filter(None, (namespace, pattern.namespace))) or None
+            yield from api_routes(pattern.url_patterns, inner)
+        elif pattern.name:
+            yield f'{namespace}:{pattern.name}' if namespace else pattern.name
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of sorted ``values``."""
+    return values[max(0, math.ceil(len(values) * pct / 100) - 1)]
+
+
+class Fixture:
+    """
+    The users, courses and tokens the benchmark requests use, picked from
+    the data ``seed_scale`` generated for ``seed``: the busiest teacher,
+    student, course and subject, so list endpoints have rows to return.
+    """
+
+    def __init__(self, seed):
+        prefix = f'seed{seed}'
+        self.teacher = self.busiest(User.objects.filter(email__startswith=f'{prefix}-teacher-'), 'courses_created')
+        self.student = self.busiest(User.objects.filter(email__startswith=f'{prefix}-student-'), 'enrollments')
+        self.course = self.busiest(self.teacher.courses_created.all(), 'modules')
+        self.subject = self.busiest(Subject.objects.filter(slug__startswith=f'{prefix}-'), 'courses')
+        for user in (self.teacher, self.student):
+            user.set_password(BENCH_PASSWORD)
+            user.save(update_fields=['password'])
+        self.pending = User.objects.create(
+            email=f'{prefix}-pending@example.com', name='Pending', role=UserRole.STUDENT, is_active=False
+        )
+        # enrolls in the busiest course, which the busiest student may already be in
+        self.newcomer = User.objects.create(
+            email=f'{prefix}-newcomer@example.com', name='Newcomer', role=UserRole.STUDENT, is_active=True
+        )
+        Profile.objects.create(user=self.newcomer)
+        self.refresh = str(RoleRefreshToken.for_user(self.student))
+        self.access_tokens = {}
+
+    @staticmethod
+    def busiest(queryset, related):
+        obj = queryset.annotate(bench_count=Count(related)).order_by('-bench_count', 'pk').first()
+        if obj is None:
+            raise ValueError(f'No {queryset.model._meta.verbose_name} to benchmark with.')
+        return obj
+
+    def access(self, user):
+        if user.pk not in self.access_tokens:
+            self.access_tokens[user.pk] = str(RoleRefreshToken.for_user(user).access_token)
+        return self.access_tokens[user.pk]
+
+    def reset_token(self):
+        return ResetPasswordToken.objects.create(user=self.student).key
+
+    def otp(self):
+        return OTP_manager().generate_otp(self.pending.email)
+
+
+class Endpoint:
+    """
+    One benchmarked request. ``data`` is the query string of a GET and the
+    JSON body otherwise; ``prepare`` builds it per request instead, for
+    payloads that can only be used once (reset tokens, OTP codes).
+    """
+
+    def __init__(self, name, method='get', user=None, kwargs=None, data=None, prepare=None, label=None):
+        self.name = name
+        self.method = method
+        self.user = user
+        self.kwargs = kwargs
+        self.data = data
+        self.prepare = prepare
+        self.label = label or name
+
+    def path(self):
+        return reverse(self.name, kwargs=self.kwargs)
+
+
+def endpoints(fx):
+    """The requests run against every route of ``api/urls.py`` but the SKIPPED ones."""
+    course = {'pk': fx.course.pk}
+    reset_password = 'bench-reset-2'
+    return [
+        # accounts
+        Endpoint('token_obtain_pair', 'post', data={'email': fx.student.email, 'password': BENCH_PASSWORD}),
+        Endpoint('token_refresh', 'post', data={'refresh': fx.refresh}),
+        Endpoint('token_verify', 'post', data={'token': fx.access(fx.student)}),
+        Endpoint('token_blacklist', 'post', data={'refresh': fx.refresh}),
+        Endpoint('password_reset:reset-password-request', 'post', data={'email': fx.student.email}),
+        Endpoint('password_reset:reset-password-validate', 'post', prepare=lambda: {'token': fx.reset_token()}),
+        Endpoint(
+            'password_reset:reset-password-confirm', 'post',
+            prepare=lambda: {'token': fx.reset_token(), 'password': reset_password},
+        ),
+        Endpoint('user-register', 'post', data={
+            'name': 'Bench User', 'email': 'bench-register@example.com', 'role': UserRole.STUDENT,
+            'password': BENCH_PASSWORD, 'confirm_password': BENCH_PASSWORD,
+        }),
+        Endpoint('user-profile', user=fx.student),
+        Endpoint('user-update', 'put', user=fx.student, data={'name': 'Bench Student', 'role': UserRole.STUDENT}),
+        Endpoint('user-change-password', 'put', user=fx.student, data={
+            'old_password': BENCH_PASSWORD, 'new_password': reset_password, 'confirm_password': reset_password,
+        }),
+        Endpoint('otp-send', 'post', data={'email': fx.pending.email}),
+        Endpoint('otp-verify', 'post', prepare=lambda: {'email': fx.pending.email, 'otp': fx.otp()}),
+        # teachers
+        Endpoint('teacher-course-list', user=fx.teacher),
+        Endpoint('teacher-course-list', user=fx.teacher, data={'stats': 'true'}, label='teacher-course-list?stats'),
+        Endpoint('teacher-course-batch', 'post', user=fx.teacher, data={'operations': [
+            {'op': 'create', 'subject': fx.subject.slug, 'title': 'Bench course', 'overview': 'Bench'},
+            {'op': 'update', 'id': fx.course.pk, 'title': 'Bench update'},
+        ]}),
+        Endpoint('teacher-course-create', 'post', user=fx.teacher, data={
+            'subject': fx.subject.slug, 'title': 'Bench course', 'overview': 'Bench',
+        }),
+        Endpoint('teacher-course-detail', user=fx.teacher, kwargs=course),
+        Endpoint('teacher-course-update', 'put', user=fx.teacher, kwargs=course, data={
+            'subject': fx.subject.slug, 'title': 'Bench update', 'overview': 'Bench',
+        }),
+        Endpoint('teacher-course-delete', 'delete', user=fx.teacher, kwargs=course),
+        Endpoint('teacher-course-syllabus', 'post', user=fx.teacher, kwargs=course, data={'modules': [
+            {'title': 'Bench module', 'contents': [
+                {'type': 'text', 'title': 'Bench text', 'content': 'Bench'},
+                {'type': 'video', 'title': 'Bench video', 'url': 'https://videos.example.com/bench'},
+            ]},
+        ]}),
+        Endpoint('teacher-course-clone', 'post', user=fx.teacher, kwargs=course),
+        Endpoint('teacher-enrollment-analytics', user=fx.teacher),
+        # courses
+        Endpoint('subject-list'),
+        Endpoint('subject-detail', kwargs={'slug': fx.subject.slug}),
+        Endpoint('course-list'),
+        Endpoint('course-detail', kwargs={'id': fx.course.pk}),
+        # students
+        Endpoint('student-course-enroll', 'post', user=fx.newcomer, kwargs=course),
+        Endpoint('student-courses-enrolled', user=fx.student),
+    ]
+
+
+def measure(endpoint, fixture, requests, warmup=0, throttle_cache=None):
+    """
+    Time ``requests`` calls of ``endpoint`` after ``warmup`` untimed ones.
+    Every call runs in a savepoint that is rolled back, so writes can be
+    repeated against the same data. ``throttle_cache`` is emptied before
+    each call so rate limits never trip; the counter updates are still
+    part of the timing.
+    """
+    client = APIClient()
+    if endpoint.user is not None:
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {fixture.access(endpoint.user)}')
+    call = getattr(client, endpoint.method)
+    path = endpoint.path()
+
+    timings, queries, db_time, statuses = [], [], [], Counter()
+    for i in range(warmup + requests):
+        with transaction.atomic():
+            data = endpoint.prepare() if endpoint.prepare else endpoint.data
+            if throttle_cache:
+                caches[throttle_cache].clear()
+            stats = QueryStats()
+            with stats.record():
+                start = time.perf_counter()
+                if endpoint.method == 'get':
+                    response = call(path, data)
+                else:
+                    response = call(path, data, format='json')
+                elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+        if i >= warmup:
+            timings.append(elapsed * 1000)
+            queries.append(stats.count)
+            db_time.append(stats.duration * 1000)
+            statuses[response.status_code] += 1
+
+    timings.sort()
+    return {
+        'method': endpoint.method.upper(),
+        'path': path,
+        'requests': requests,
+        'errors': sum(count for code, count in statuses.items() if code >= 400),
+        'status': dict(sorted(statuses.items())),
+        'throughput': round(requests / (sum(timings) / 1000), 2),
+        'latency_ms': {
+            'mean': round(statistics.fmean(timings), 3),
+            'p50': round(percentile(timings, 50), 3),
+            'p95': round(percentile(timings, 95), 3),
+            'p99': round(percentile(timings, 99), 3),
+            'max': round(timings[-1], 3),
+        },
+        'queries': round(statistics.fmean(queries), 2),
+        'db_ms': round(statistics.fmean(db_time), 3),
+    }
+
+
+def compare(baseline, current, threshold, min_delta_ms=1.0):
+    """
+    Regressions of the ``current`` results against ``baseline``, as
+    ``(endpoint, metric, before, after)``. Latency counts when it grew by
+    more than ``threshold`` percent and ``min_delta_ms``; any extra query
+    or error counts. Endpoints missing from either run are ignored.
+    """
+    regressions = []
+    for label, now in current['endpoints'].items():
+        before = baseline['endpoints'].get(label)
+        if before is None:
+            continue
+        for metric in GATED_PERCENTILES:
+            old, new = before['latency_ms'][metric], now['latency_ms'][metric]
+            if new - old > min_delta_ms and new > old * (1 + threshold / 100):
+                regressions.append((label, metric, old, new))
+        for metric in ('queries', 'errors'):
+            if now[metric] > before[metric]:
+                regressions.append((label, metric, before[metric], now[metric]))
+    return regressions
@@ -0,0 +1,150 @@
+import itertools
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+
+class SQLiteCache(BaseCache):
+    """
+    Cache backend stored in a local SQLite file, shared by every process on
+    the host. Unlike LocMemCache and FileBasedCache, ``add`` and ``incr``
+    are single atomic statements, so counters stay exact across gunicorn
+    workers.
+
+        CACHES = {
+            'shared': {
+                'BACKEND': 'api.cache.SQLiteCache',
+                'LOCATION': '/path/to/shared.sqlite3',
+            }
+        }
+
+    Integers are stored as SQLite integers so ``incr`` can run in SQL;
+    everything else is pickled. Expired rows are deleted every
+    ``OPTIONS['CULL_EVERY']`` writes (1000) of each process.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = Path(location)
+        self.local = threading.local()
+        self.cull_every = params.get('OPTIONS', {}).get('CULL_EVERY', 1000)
+        self.writes = itertools.count(1)
+
+    # connections are per thread and reopened after a fork
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache '
+                '(key TEXT PRIMARY KEY, value BLOB, expires REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def encode(self, value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def decode(self, value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def expiry(self, timeout):
+        # get_backend_timeout already returns the expiry time
+        return self.get_backend_timeout(timeout)
+
+    def wrote(self):
+        # next() on a count is atomic, so threads never skip a cull
+        if next(self.writes) % self.cull_every == 0:
+            self.cull()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        cursor = self.connection().execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (key, self.encode(value), self.expiry(timeout), now),
+        )
+        self.wrote()
+        return cursor.rowcount == 1
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self.connection().execute(
+            'SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return default if row is None else self.decode(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self.connection().execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            (key, self.encode(value), self.expiry(timeout)),
+        )
+        self.wrote()
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self.connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.expiry(timeout), key, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self.connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+        return cursor.rowcount == 1
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self.connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self.connection().execute(
+            'UPDATE cache SET value = value + ? '
+            "WHERE key = ? AND typeof(value) = 'integer' AND (expires IS NULL OR expires > ?) "
+            'RETURNING value',
+            (delta, key, time.time()),
+        ).fetchone()
+        self.wrote()
+        if row is None:
+            raise ValueError("Key '%s' not found" % key)
+        return row[0]
+
+    def clear(self):
+        self.connection().execute('DELETE FROM cache')
+
+    def cull(self):
+        """Remove expired entries; run every ``cull_every`` writes."""
+        cursor = self.connection().execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?', (time.time(),)
+        )
+        return cursor.rowcount
+
+    def close(self, **kwargs):
+        # keep the per-thread connection open between requests
+        pass
@@ -0,0 +1,115 @@
+import json
+import re
+
+from django.db import connections, transaction
+from django.db.models import QuerySet
+
+_SQLITE_INDEX = re.compile(r'USING (?:COVERING )?INDEX (\S+)|USING (INTEGER PRIMARY KEY)')
+# older versions print SCAN TABLE t; constant rows and subqueries are no tables
+_SQLITE_TABLE = re.compile(r'^(?:SCAN|SEARCH) (?:TABLE )?(?!CONSTANT ROW|SUBQUERY|\()(\S+)')
+
+
+class Plan:
+    """
+    What the database does for one statement, the same for every vendor:
+    ``indexes`` it reads from, ``scans``, the tables (or aliases) it reads
+    in full, and ``sorts``, the steps that sort rows no index returns in
+    order. ``lines`` is the plan as the database printed it.
+    """
+
+    def __init__(self, sql, params):
+        self.sql = sql
+        self.params = params
+        self.indexes = set()
+        self.scans = []
+        self.sorts = []
+        self.lines = []
+
+    def __str__(self):
+        return '\n'.join(self.lines)
+
+    def add_sqlite(self, detail):
+        self.lines.append(detail)
+        if detail.startswith('USE TEMP B-TREE'):
+            self.sorts.append(detail)
+            return
+        table = _SQLITE_TABLE.match(detail)
+        if table is None:
+            return
+        # an automatic index is built by reading the whole table first
+        if 'AUTOMATIC' in detail or (detail.startswith('SCAN') and 'INDEX' not in detail):
+            self.scans.append(table[1])
+            return
+        index = _SQLITE_INDEX.search(detail)
+        if index:
+            self.indexes.add(index[1] or index[2])
+        # SCAN ... USING INDEX walks the whole index
+        if detail.startswith('SCAN'):
+            self.scans.append(table[1])
+
+    def add_postgresql(self, node, depth=0):
+        self.lines.append('  ' * depth + ' '.join(filter(None, (
+            node['Node Type'], node.get('Relation Name'), node.get('Index Name'),
+        ))))
+        if node['Node Type'] == 'Seq Scan':
+            self.scans.append(node.get('Alias') or node['Relation Name'])
+        elif 'Index Name' in node:
+            self.indexes.add(node['Index Name'])
+        elif node['Node Type'] in ('Sort', 'Incremental Sort'):
+            self.sorts.append(', '.join(node.get('Sort Key', [])))
+        for child in node.get('Plans', []):
+            self.add_postgresql(child, depth + 1)
+
+
+def explain_sql(sql, params=None, using='default'):
+    """
+    Plan of one SELECT, from ``EXPLAIN QUERY PLAN`` on SQLite and
+    ``EXPLAIN (FORMAT JSON)`` on PostgreSQL. PostgreSQL plans with
+    sequential scans disabled, as it reads the few rows of a test table
+    sequentially whatever the indexes.
+    """
+    connection = connections[using]
+    plan = Plan(sql, params)
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            for row in cursor.fetchall():
+                plan.add_sqlite(row[-1])
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            result = cursor.fetchone()[0]
+            if isinstance(result, str):
+                result = json.loads(result)
+            plan.add_postgresql(result[0]['Plan'])
+        else:
+            raise NotImplementedError(f'No plan parser for {connection.vendor}.')
+        # drops the SET LOCAL with the savepoint
+        transaction.set_rollback(True, using=using)
+    return plan
+
+
+class StatementRecorder:
+    """execute_wrapper keeping the SELECT statements run, with their parameters."""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            self.statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+def explain(query, using='default'):
+    """
+    Plans of the SELECTs run by ``query``: a queryset, which is evaluated,
+    or a callable, which is called.
+    """
+    recorder = StatementRecorder()
+    with connections[using].execute_wrapper(recorder):
+        if isinstance(query, QuerySet):
+            list(query)
+        else:
+            query()
+    return [explain_sql(sql, params, using) for sql, params in recorder.statements]
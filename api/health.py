@@ -0,0 +1,63 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def check_database(alias='default'):
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+
+
+def check_cache(alias):
+    cache = caches[alias]
+    cache.set('readyz', 1, 60)
+    if cache.get('readyz') != 1:
+        raise RuntimeError(f'cache {alias} lost a key')
+
+
+class ReadinessProbe:
+    """
+    Checks the database and HEALTH_CHECK_CACHES at most once every
+    HEALTH_CHECK_INTERVAL seconds per process; probes in between, and
+    those arriving while a check runs, get the last result.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked = None
+        self.result = None
+
+    def __call__(self):
+        fresh = self.checked is not None and time.monotonic() - self.checked < settings.HEALTH_CHECK_INTERVAL
+        if fresh or not self.lock.acquire(blocking=self.result is None):
+            return self.result
+        try:
+            self.result = self.check()
+            self.checked = time.monotonic()
+        finally:
+            self.lock.release()
+        return self.result
+
+    def check(self):
+        """``{name: 'ok' or the error}`` of every dependency."""
+        checks = [('database', check_database)]
+        checks += [(f'cache:{alias}', lambda alias=alias: check_cache(alias)) for alias in settings.HEALTH_CHECK_CACHES]
+        result = {}
+        for name, check in checks:
+            try:
+                check()
+                result[name] = 'ok'
+            except Exception as e:
+                logger.warning('Readiness check of %s failed: %s', name, e)
+                result[name] = type(e).__name__
+        return result
+
+
+readiness = ReadinessProbe()
@@ -0,0 +1,94 @@
+import atexit
+import logging
+import logging.config
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler
+
+from django.conf import settings
+
+
+class LogWriter:
+    """
+    The one thread per process that runs the configured log handlers.
+    Loggers hand records over through a bounded queue and return at once;
+    when the queue is full the record is dropped and counted instead of
+    making the request wait for disk or stdout.
+    """
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity
+        self.queue = None
+        self.pid = None
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    # threads do not survive a fork, so every process starts its own
+    def start(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.queue = queue.Queue(self.capacity or settings.LOG_QUEUE_SIZE)
+                threading.Thread(target=self.run, name='log-writer', daemon=True).start()
+                self.pid = os.getpid()
+
+    def put(self, handlers, record):
+        if self.pid != os.getpid():
+            self.start()
+        try:
+            self.queue.put_nowait((handlers, record))
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        while True:
+            handlers, record = self.queue.get()
+            for handler in handlers:
+                if record.levelno < handler.level:
+                    continue
+                try:
+                    handler.handle(record)
+                except Exception:
+                    # a broken handler must not stop the writer
+                    handler.handleError(record)
+            self.queue.task_done()
+
+    def flush(self, timeout=5):
+        """Wait up to ``timeout`` seconds for the queued records to be written."""
+        if self.pid == os.getpid():
+            with self.queue.all_tasks_done:
+                self.queue.all_tasks_done.wait_for(lambda: not self.queue.unfinished_tasks, timeout)
+
+
+log_writer = LogWriter()
+atexit.register(log_writer.flush)
+
+
+class QueuedHandler(QueueHandler):
+    """Stands in for a logger's handlers and passes records to ``log_writer``."""
+
+    def __init__(self, handlers, writer=None):
+        super().__init__(None)
+        self.handlers = tuple(handlers)
+        self.writer = writer or log_writer
+
+    def enqueue(self, record):
+        self.writer.put(self.handlers, record)
+
+
+def configure(config):
+    """
+    LOGGING_CONFIG: applies LOGGING, then puts the handlers of every logger
+    it configures behind ``log_writer``, so request threads only enqueue.
+    With LOG_QUEUE_SIZE = 0 handlers are left to write directly.
+    """
+    logging.config.dictConfig(config)
+    if not settings.LOG_QUEUE_SIZE:
+        return
+    names = list(config.get('loggers', {}))
+    if 'root' in config:
+        names.append(None)
+    for name in names:
+        logger = logging.getLogger(name)
+        if logger.handlers:
+            logger.handlers = [QueuedHandler(logger.handlers)]
@@ -0,0 +1,137 @@
+import fnmatch
+import json
+import platform
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command, load_command_class
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from accounts.models import User
+from accounts.utils import user_cache
+from api.benchmark import SKIPPED, Fixture, api_routes, compare, endpoints, measure
+
+BENCH_THROTTLE_CACHE = 'bench-throttle'
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every route in api/urls.py in-process with the test client and report '
+        'throughput, p50/p95/p99 latency and queries per endpoint. Runs against the data '
+        'seed_scale generates for --seed, creating it first if missing; nothing is kept. '
+        'With --baseline, exits non-zero when an endpoint regressed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1, help='seed_scale dataset to run against')
+        parser.add_argument('--scale', type=float, default=0.1, help='Fraction of the seed_scale default sizes to generate')
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per endpoint first')
+        parser.add_argument('--only', nargs='+', metavar='PATTERN', help='Endpoints to run, shell patterns')
+        parser.add_argument('--output', default=str(settings.BASE_DIR.parent / 'logs' / 'bench-api.json'))
+        parser.add_argument('--baseline', help='Results of an earlier run to compare with')
+        parser.add_argument('--threshold', type=float, default=10, help='Percent p50/p95 growth that counts as a regression')
+        parser.add_argument('--min-delta-ms', type=float, default=1.0, help='Ignore latency changes smaller than this')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests must be at least 1.')
+        baseline = None
+        if options['baseline']:
+            baseline = json.loads(Path(options['baseline']).read_text())
+
+        # production-like settings: no query log, no real email; every cache
+        # is private to the run, since its users, OTPs and role versions
+        # are rolled back with the data, and throttle counters are reset
+        # between requests
+        with override_settings(
+            DEBUG=False,
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            CACHES={
+                alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'bench-{alias}'}
+                for alias in [*settings.CACHES, BENCH_THROTTLE_CACHE]
+            },
+            THROTTLE_CACHE=BENCH_THROTTLE_CACHE,
+        ), transaction.atomic():
+            try:
+                self.seed(options)
+                results = self.run(options)
+            finally:
+                transaction.set_rollback(True)
+                # rolled-back pks are reused, so no cached bench user may outlive the run
+                user_cache.clear()
+                for alias in settings.CACHES:
+                    caches[alias].clear()
+
+        output = Path(options['output'])
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2))
+        self.stdout.write(f'Results written to {output}')
+
+        if baseline is not None:
+            self.check_baseline(baseline, results, options)
+
+    def seed(self, options):
+        if User.objects.filter(email__startswith=f"seed{options['seed']}-").exists():
+            return
+        defaults = load_command_class('courses', 'seed_scale').create_parser('manage.py', 'seed_scale').parse_args([])
+        counts = {
+            name: max(1, round(getattr(defaults, name) * options['scale']))
+            for name in ('teachers', 'students', 'subjects', 'courses', 'enrollments')
+        }
+        self.stdout.write(f"Seeding {', '.join(f'{count} {name}' for name, count in counts.items())}...")
+        call_command('seed_scale', seed=options['seed'], rollup=True, stdout=self.stdout, **counts)
+
+    def run(self, options):
+        try:
+            fixture = Fixture(options['seed'])
+        except ValueError as e:
+            raise CommandError(e)
+        selected = [
+            endpoint for endpoint in endpoints(fixture)
+            if not options['only'] or any(fnmatch.fnmatch(endpoint.label, pattern) for pattern in options['only'])
+        ]
+        covered = {endpoint.name for endpoint in endpoints(fixture)}
+        for name in api_routes():
+            if name not in covered and name not in SKIPPED:
+                self.stderr.write(self.style.WARNING(f'{name} has no benchmark request, add one to api/benchmark.py'))
+
+        results = {
+            'created': timezone.now().isoformat(),
+            'settings': settings.SETTINGS_MODULE,
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'seed': options['seed'],
+            'users': User.objects.count(),
+            'requests': options['requests'],
+            'warmup': options['warmup'],
+            'skipped': SKIPPED,
+            'endpoints': {},
+        }
+        self.stdout.write(
+            f"{'endpoint':<40} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>8} {'errors':>7}"
+        )
+        for endpoint in selected:
+            result = measure(
+                endpoint, fixture, options['requests'], options['warmup'], throttle_cache=BENCH_THROTTLE_CACHE
+            )
+            results['endpoints'][endpoint.label] = result
+            latency = result['latency_ms']
+            self.stdout.write(
+                f"{endpoint.label:<40} {result['throughput']:>8.1f} {latency['p50']:>7.2f}ms "
+                f"{latency['p95']:>7.2f}ms {latency['p99']:>7.2f}ms {result['queries']:>8g} {result['errors']:>7}"
+            )
+        return results
+
+    def check_baseline(self, baseline, results, options):
+        regressions = compare(baseline, results, options['threshold'], options['min_delta_ms'])
+        for label, metric, before, after in regressions:
+            self.stderr.write(self.style.ERROR(f'{label}: {metric} {before:g} -> {after:g}'))
+        if regressions:
+            raise CommandError(f"{len(regressions)} regressions against {options['baseline']}.")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}."))
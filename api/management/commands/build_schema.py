@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.schema import build, code_version
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate the OpenAPI schema served at /schema/ for the current code version, so no '
+        'request has to. Run at build time; files of other versions are deleted.'
+    )
+
+    def handle(self, *args, **options):
+        path = build()
+        self.stdout.write(f'Schema for {code_version()} written to {path}')
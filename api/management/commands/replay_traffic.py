@@ -0,0 +1,166 @@
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from requests.adapters import HTTPAdapter
+
+from api.benchmark import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay a capture written by TrafficCaptureMiddleware against a running instance, at the '
+        'captured pace times --speed, and report the latency distribution per route next to the '
+        'captured one. Bodies are not captured, so only --methods are replayed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='Capture files, e.g. logs/traffic.ndjson*')
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--speed', type=float, default=1.0, help='Pace multiplier; 0 sends as fast as --concurrency allows')
+        parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight at most')
+        parser.add_argument('--methods', nargs='+', default=['GET', 'HEAD', 'OPTIONS'])
+        parser.add_argument(
+            '--token', action='append', default=[], metavar='ROLE=JWT',
+            help='Bearer token sent for requests captured with ROLE; others of that role are skipped',
+        )
+        parser.add_argument('--limit', type=int, help='Replay at most this many requests')
+        parser.add_argument('--timeout', type=float, default=10)
+        parser.add_argument('--output', help='Write the report as JSON here')
+
+    def handle(self, *args, **options):
+        if options['speed'] < 0 or options['concurrency'] < 1:
+            raise CommandError('--speed must be 0 or more and --concurrency at least 1.')
+        self.options = options
+        self.base_url = options['base_url'].rstrip('/')
+        self.tokens = dict(token.split('=', 1) for token in options['token'])
+        self.local = threading.local()
+
+        records, skipped = self.load(options['files'])
+        if not records:
+            raise CommandError(f'Nothing to replay, skipped: {dict(skipped)}.')
+        self.stdout.write(f'Replaying {len(records)} requests, skipped: {dict(skipped) or "none"}.')
+
+        started = time.monotonic()
+        results = self.replay(records)
+        elapsed = time.monotonic() - started
+
+        report = self.report(records, results, elapsed)
+        report['skipped'] = dict(skipped)
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2))
+            self.stdout.write(f"Report written to {options['output']}")
+
+    def load(self, files):
+        records, skipped = [], Counter()
+        methods = {method.upper() for method in self.options['methods']}
+        for name in files:
+            with open(name, encoding='utf-8') as capture:
+                for line in capture:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        skipped['malformed'] += 1
+                        continue
+                    if record['method'] not in methods:
+                        skipped[f"method {record['method']}"] += 1
+                    elif record['role'] != 'anonymous' and record['role'] not in self.tokens:
+                        skipped[f"no token for {record['role']}"] += 1
+                    else:
+                        records.append(record)
+        # rotated files hold older records; replay in capture order
+        records.sort(key=lambda record: record['ts'])
+        return records[:self.options['limit']], skipped
+
+    def session(self):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+            session.mount('http://', HTTPAdapter(pool_maxsize=self.options['concurrency']))
+            session.mount('https://', HTTPAdapter(pool_maxsize=self.options['concurrency']))
+        return session
+
+    def send(self, record, due):
+        lag = time.monotonic() - due
+        headers = {}
+        if record['role'] in self.tokens:
+            headers['Authorization'] = f"Bearer {self.tokens[record['role']]}"
+        start = time.perf_counter()
+        try:
+            response = self.session().request(
+                record['method'], self.base_url + record['path'],
+                params=record['query'], headers=headers, timeout=self.options['timeout'],
+            )
+            status = response.status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        return status, (time.perf_counter() - start) * 1000, lag * 1000
+
+    def replay(self, records):
+        speed = self.options['speed']
+        first = records[0]['ts']
+        slots = threading.BoundedSemaphore(self.options['concurrency'])
+        futures = []
+        with ThreadPoolExecutor(self.options['concurrency'], thread_name_prefix='replay') as executor:
+            started = time.monotonic()
+            for record in records:
+                due = started + (record['ts'] - first) / speed if speed else time.monotonic()
+                pause = due - time.monotonic()
+                if pause > 0:
+                    time.sleep(pause)
+                # at most --concurrency in flight; late requests show up as lag
+                slots.acquire()
+                future = executor.submit(self.send, record, due)
+                future.add_done_callback(lambda _: slots.release())
+                futures.append(future)
+        return [future.result() for future in futures]
+
+    def report(self, records, results, elapsed):
+        routes = defaultdict(lambda: {'captured': [], 'latency': [], 'status': Counter()})
+        for record, (status, latency, _) in zip(records, results):
+            route = routes[f"{record['method']} {record['route'] or record['path']}"]
+            route['captured'].append(record['duration_ms'])
+            route['latency'].append(latency)
+            route['status'][status] += 1
+
+        lags = sorted(lag for _, _, lag in results)
+        report = {
+            'requests': len(results),
+            'elapsed_s': round(elapsed, 3),
+            'throughput': round(len(results) / elapsed, 2) if elapsed else None,
+            'lag_ms': {'p50': round(percentile(lags, 50), 3), 'p95': round(percentile(lags, 95), 3)},
+            'routes': {},
+        }
+        self.stdout.write(
+            f"{'route':<50} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'captured p50':>13} {'errors':>7}"
+        )
+        for label, route in sorted(routes.items(), key=lambda item: -len(item[1]['latency'])):
+            latency, captured = sorted(route['latency']), sorted(route['captured'])
+            errors = sum(count for status, count in route['status'].items() if not isinstance(status, int) or status >= 400)
+            report['routes'][label] = {
+                'count': len(latency),
+                'errors': errors,
+                'status': {str(status): count for status, count in route['status'].items()},
+                'latency_ms': {
+                    'p50': round(percentile(latency, 50), 3),
+                    'p95': round(percentile(latency, 95), 3),
+                    'p99': round(percentile(latency, 99), 3),
+                    'max': round(latency[-1], 3),
+                },
+                'captured_ms': {'p50': percentile(captured, 50), 'p95': percentile(captured, 95)},
+            }
+            stats = report['routes'][label]['latency_ms']
+            self.stdout.write(
+                f"{label:<50} {len(latency):>6} {stats['p50']:>7.2f}ms {stats['p95']:>7.2f}ms "
+                f"{stats['p99']:>7.2f}ms {percentile(captured, 50):>11.2f}ms {errors:>7}"
+            )
+        self.stdout.write(
+            f"{report['requests']} requests in {report['elapsed_s']}s, dispatch lag "
+            f"p50 {report['lag_ms']['p50']:.1f}ms p95 {report['lag_ms']['p95']:.1f}ms"
+        )
+        return report
@@ -0,0 +1,160 @@
+import re
+from collections import defaultdict
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from api.explain import explain_sql
+
+# "(0.001) SELECT ...; args=(...); alias=default" from django.db.backends
+_DJANGO_LINE = re.compile(r'^\((?P<seconds>[\d.]+)\) (?P<sql>SELECT .*); args=.*; alias=\S+$')
+# "duration: 1.2 ms  statement: SELECT ..." from PostgreSQL's log_min_duration_statement
+_POSTGRES_LINE = re.compile(r'duration: (?P<ms>[\d.]+) ms\s+statement: (?P<sql>SELECT .*)$')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r'\((?:\?, )+\?\)')
+_LIMIT = re.compile(r'\s+(?:LIMIT|OFFSET)\s.*$')
+
+
+def normalize(sql):
+    """Statement with its literal values replaced, so repeats compare equal."""
+    return _LIST.sub('(...)', _LITERAL.sub('?', sql))
+
+
+def column(alias):
+    """Pattern of a column of ``alias``, as Django quotes it: "t"."col" or U0."col"."""
+    return rf'(?:"{re.escape(alias)}"|\b{re.escape(alias)})\."(\w+)"'
+
+
+def joined(sql, alias):
+    """Columns of ``alias`` compared to a column of another table, as joins do."""
+    other = r'(?:"\w+"|\b\w+)\."\w+"'
+    return set(re.findall(rf'{column(alias)}\s*=\s*{other}', sql) + re.findall(rf'{other}\s*=\s*{column(alias)}', sql))
+
+
+def candidate(sql, alias):
+    """
+    ``(table, columns)`` an index could serve ``alias`` of ``sql`` with:
+    its columns compared for equality, then the ORDER BY columns when they
+    all belong to ``alias`` (``-`` for descending), else a range column.
+    """
+    tables = set(re.findall(rf'"(\w+)" {re.escape(alias)}\b', sql))
+    if len(tables) > 1:
+        return None, []  # subqueries reuse U0, T1... for different tables
+    table = tables.pop() if tables else alias.strip('"')
+
+    equal, ranges = [], []
+    for match in re.finditer(rf'{column(alias)}\s*(=|IN\b|IS\b|>=|<=|>|<|BETWEEN\b)', sql):
+        (equal if match[2] in ('=', 'IN', 'IS') else ranges).append(match[1])
+    # joins compare the other way round too
+    equal += re.findall(rf'=\s*{column(alias)}', sql)
+
+    order = []
+    ordering = sql.rsplit('ORDER BY', 1)[1] if 'ORDER BY' in sql else ''
+    for term in filter(None, (term.strip() for term in _LIMIT.sub('', ordering).split(','))):
+        match = re.fullmatch(rf'{column(alias)}(?: (ASC|DESC))?', term)
+        if match is None:
+            order = []
+            break
+        order.append(f'-{match[1]}' if match[2] == 'DESC' else match[1])
+
+    columns = list(dict.fromkeys(equal))
+    columns += [name for name in order if name.lstrip('-') not in columns] or ranges[:1]
+    return table, columns
+
+
+def existing_indexes(model):
+    """Leading columns of every index ``model`` has, as tuples of column names."""
+    fields = {field.name: field.column for field in model._meta.concrete_fields}
+    indexes = [(model._meta.pk.column,)]
+    indexes += [(field.column,) for field in model._meta.concrete_fields if field.db_index or field.unique]
+    indexes += [tuple(fields[name.lstrip('-')] for name in index.fields) for index in model._meta.indexes]
+    indexes += [tuple(fields[name] for name in together) for together in model._meta.unique_together]
+    return indexes
+
+
+class Command(BaseCommand):
+    help = (
+        'Read SQL statements from query logs (logs/queries.log written with QUERY_LOG under DEBUG, '
+        'or PostgreSQL log_min_duration_statement lines), EXPLAIN every distinct SELECT against '
+        'the database, and suggest a Meta.indexes entry for each full scan or sort without an index.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='Query logs, e.g. logs/queries.log*')
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--min-count', type=int, default=1, help='Ignore statements seen fewer times')
+
+    def handle(self, *args, **options):
+        statements = self.load(options['files'])
+        if not statements:
+            raise CommandError('No SELECT statements found in the logs.')
+        models = {model._meta.db_table: model for model in apps.get_models(include_auto_created=True)}
+
+        suggestions = defaultdict(lambda: {'count': 0, 'seconds': 0.0, 'problems': set(), 'example': None})
+        failed = 0
+        for count, seconds, sql in statements.values():
+            if count < options['min_count']:
+                continue
+            try:
+                plan = explain_sql(sql, using=options['database'])
+            except DatabaseError:
+                failed += 1  # e.g. a table dropped since
+                continue
+            problems = [(alias, f'full scan of {alias}', False) for alias in plan.scans]
+            if plan.sorts and 'ORDER BY' in sql:
+                ordered = re.match(r'\s*("?\w+"?)\.', sql.rsplit('ORDER BY', 1)[1])
+                if ordered:
+                    problems.append((ordered[1].strip('"'), '; '.join(plan.sorts), True))
+            for alias, problem, sort in problems:
+                table, columns = candidate(sql, alias)
+                model = models.get(table)
+                if model is None or not columns:
+                    continue
+                if sort and model._meta.pk.column in joined(sql, alias):
+                    continue  # rows found through another table's, in an order no index of this one gives
+                fields = {field.column: field.name for field in model._meta.concrete_fields}
+                if any(index[:len(columns)] == tuple(name.lstrip('-') for name in columns)
+                       for index in existing_indexes(model)):
+                    continue  # indexed, the planner chose not to use it
+                names = tuple(
+                    f"{'-' if name.startswith('-') else ''}{fields.get(name.lstrip('-'), name.lstrip('-'))}"
+                    for name in columns
+                )
+                suggestion = suggestions[(model._meta.label, names)]
+                suggestion['count'] += count
+                suggestion['seconds'] += seconds
+                suggestion['problems'].add(problem)
+                suggestion['example'] = suggestion['example'] or sql
+
+        self.stdout.write(
+            f'{sum(count for count, _, _ in statements.values())} statements, {len(statements)} distinct, '
+            f'{len(suggestions)} suggested indexes' + (f', {failed} could not be explained.' if failed else '.')
+        )
+        for (label, names), suggestion in sorted(suggestions.items(), key=lambda item: -item[1]['seconds']):
+            self.stdout.write(f'\n{label}: models.Index(fields={list(names)!r})')
+            self.stdout.write(
+                f"    {suggestion['count']} statements, {suggestion['seconds'] * 1000:.1f} ms in total: "
+                f"{', '.join(sorted(suggestion['problems']))}"
+            )
+            self.stdout.write(f"    {suggestion['example'][:200]}")
+
+    def load(self, files):
+        """``{normalized SQL: [count, seconds, one statement]}`` of the SELECTs in ``files``."""
+        statements = {}
+        for name in files:
+            with open(name, encoding='utf-8', errors='replace') as log:
+                for line in log:
+                    line = line.rstrip('\n')
+                    match = _DJANGO_LINE.search(line)
+                    if match:
+                        seconds = float(match['seconds'])
+                    else:
+                        match = _POSTGRES_LINE.search(line)
+                        if match is None:
+                            continue
+                        seconds = float(match['ms']) / 1000
+                    statement = statements.setdefault(normalize(match['sql']), [0, 0.0, match['sql']])
+                    statement[0] += 1
+                    statement[1] += seconds
+        return statements
@@ -0,0 +1,298 @@
+import atexit
+import fcntl
+import json
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf)
+# <pid>-<start in ms>.json, so a new process reusing a pid gets a file of its own;
+# files named <pid>.json were written by older versions
+_WORKER_FILE = re.compile(r'^(?P<pid>\d+)(?:-\d+)?\.json$')
+ARCHIVE = 'archive.json'
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _merge(value, other):
+    # counters are numbers, histograms lists of bucket counts and a sum
+    if isinstance(value, list):
+        return [a + b for a, b in zip(value, other)]
+    return value + other
+
+
+@contextmanager
+def _archive_lock(directory):
+    with open(directory / '.lock', 'a') as file:
+        fcntl.flock(file, fcntl.LOCK_EX)  # released when the file is closed
+        yield
+
+
+class Metric:
+    """Values of one metric per combination of label values."""
+
+    kind = None
+
+    def __init__(self, registry, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = registry.lock
+        registry.register(self)
+
+    def key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self, key, value):
+        yield self.name, _labels(self.labels, key), value
+
+
+class Histogram(Metric):
+    """Observations counted per bucket; a value is ``[bucket counts..., sum]``."""
+
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * len(self.buckets) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self, key, value):
+        cumulative = 0
+        for bound, count in zip(self.buckets, value):
+            cumulative += count
+            yield f'{self.name}_bucket', _labels(self.labels, key, [('le', _number(bound))]), cumulative
+        yield f'{self.name}_sum', _labels(self.labels, key), value[-1]
+        yield f'{self.name}_count', _labels(self.labels, key), cumulative
+
+
+class Registry:
+    """
+    In-process metrics, rendered in the Prometheus text format.
+
+    With METRICS_DIR set, every process writes its values to
+    ``<METRICS_DIR>/<pid>-<start>.json`` every METRICS_FLUSH_INTERVAL
+    seconds, and a scrape adds up the files of all workers with its own
+    live values. A worker adds its values to ``archive.json`` and deletes
+    its file on exit; a scrape does the same for the files of workers that
+    were killed (their pid is gone or the file was not written for
+    METRICS_STALE_AFTER seconds), so counters never go back and files do
+    not pile up.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.pid = None
+        self.process = None
+        self.file_lock = threading.Lock()
+        self.retired = False
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def counter(self, name, documentation, labels=()):
+        return Counter(self, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return Histogram(self, name, documentation, labels, buckets)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                name: [[list(key), value if isinstance(value, (int, float)) else list(value)]
+                       for key, value in metric.values.items()]
+                for name, metric in self.metrics.items()
+            }
+
+    def directory(self):
+        return Path(settings.METRICS_DIR) if settings.METRICS_DIR else None
+
+    # threads do not survive a fork, so every worker starts its own flusher
+    def start(self):
+        if self.directory() is None or self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                threading.Thread(target=self.flush_forever, name='metrics-flush', daemon=True).start()
+
+    def flush_forever(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            self.flush()
+
+    def worker_file(self):
+        """Name of this process's file, new after a fork."""
+        pid = os.getpid()
+        if self.process is None or self.process[0] != pid:
+            self.process = (pid, int(time.time() * 1000))
+        return f'{pid}-{self.process[1]}.json'
+
+    def flush(self):
+        directory = self.directory()
+        if directory is None:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / self.worker_file()
+        with self.file_lock:
+            if self.retired:
+                return  # the values are in the archive already
+            temporary = path.with_suffix('.tmp')
+            temporary.write_text(json.dumps(self.snapshot()))
+            os.replace(temporary, path)
+
+    def retire(self):
+        """Add this process's values to the archive and delete its file; run on exit."""
+        directory = self.directory()
+        if directory is None:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / self.worker_file()
+        with self.file_lock, _archive_lock(directory):
+            self.archive(directory, [self.snapshot()])
+            path.unlink(missing_ok=True)
+            self.retired = True
+
+    def archive(self, directory, snapshots):
+        """Add ``snapshots`` to archive.json; the caller holds the archive lock."""
+        path = directory / ARCHIVE
+        try:
+            archived = json.loads(path.read_text())
+        except (OSError, ValueError):
+            archived = {}
+        # metrics no longer registered are kept, in case they come back
+        totals = self.merge([archived, *snapshots], keep_unknown=True)
+        temporary = path.with_suffix('.tmp')
+        temporary.write_text(json.dumps({
+            name: [[list(key), value] for key, value in values.items()] for name, values in totals.items()
+        }))
+        os.replace(temporary, path)
+
+    @staticmethod
+    def dead(path, pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass  # alive, owned by another user
+        # the pid may belong to a new process since
+        return time.time() - path.stat().st_mtime > settings.METRICS_STALE_AFTER
+
+    def archive_dead(self, directory):
+        """Move the values of killed workers into the archive."""
+        own = self.worker_file()
+        paths = [
+            path for path in directory.glob('*.json')
+            if path.name != own and (match := _WORKER_FILE.match(path.name)) and self.dead(path, int(match['pid']))
+        ]
+        if not paths:
+            return
+        with _archive_lock(directory):
+            snapshots = []
+            for path in paths:
+                try:
+                    snapshots.append(json.loads(path.read_text()))
+                except (OSError, ValueError):
+                    continue  # archived by another scrape meanwhile
+            self.archive(directory, snapshots)
+            for path in paths:
+                path.unlink(missing_ok=True)
+
+    def merge(self, snapshots, keep_unknown=False):
+        totals = {name: {} for name in self.metrics}
+        for snapshot in snapshots:
+            for name, values in snapshot.items():
+                if name not in self.metrics and not keep_unknown:
+                    continue
+                for key, value in values:
+                    key = tuple(key)
+                    current = totals.setdefault(name, {}).get(key)
+                    totals[name][key] = value if current is None else _merge(current, value)
+        return totals
+
+    def collect(self):
+        """Values of every metric, summed over this process, the files of the others and the archive."""
+        snapshots = [] if self.retired else [self.snapshot()]
+        directory = self.directory()
+        if directory is not None and directory.is_dir():
+            self.archive_dead(directory)
+            own = self.worker_file()
+            for path in directory.glob('*.json'):
+                if path.name != own:
+                    try:
+                        snapshots.append(json.loads(path.read_text()))
+                    except (OSError, ValueError):
+                        continue  # removed or replaced while we read it
+        return self.merge(snapshots)
+
+    def render(self):
+        lines = []
+        for name, values in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for key, value in sorted(values.items()):
+                for sample, labels, number in metric.samples(key, value):
+                    lines.append(f'{sample}{labels} {_number(number)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+atexit.register(registry.retire)
+
+request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Time spent on requests, per route name.', ['view', 'method'],
+)
+requests_total = registry.counter('http_requests_total', 'Requests answered, per route name and status.', ['view', 'method', 'status'])
+db_queries = registry.counter('db_queries_total', 'SQL statements run by requests, per route name.', ['view'])
+db_duration = registry.counter('db_query_duration_seconds_total', 'Time requests spent in SQL, per route name.', ['view'])
+user_cache_lookups = registry.counter(
+    'user_cache_lookups_total', 'Authenticated user lookups, by the tier that answered.', ['result'],
+)
+throttle_rejections = registry.counter('throttle_rejections_total', 'Requests refused by a rate throttle.', ['scope'])
+login_lockouts = registry.counter('login_lockouts_total', 'Accounts locked after too many failed logins.')
+email_send_duration = registry.histogram(
+    'email_send_duration_seconds', 'Time to hand one outbox email to the mail server.', ['result'],
+)
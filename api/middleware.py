@@ -0,0 +1,304 @@
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from accounts.authentications import CachedJWTAuthentication
+from api import metrics
+from api.health import readiness
+from api.profiling import RequestProfiler
+
+logger = logging.getLogger(__name__)
+traffic_logger = logging.getLogger('api.traffic')
+access_logger = logging.getLogger('api.access')
+
+_PARAM_LIST = re.compile(r'\((?:%s, )+%s\)')
+
+
+def fingerprint(sql):
+    """Statement with parameter lists collapsed, so repeats compare equal."""
+    return _PARAM_LIST.sub('(...)', sql)
+
+
+class QueryStats:
+    """Count, total time and repeated statements of the queries recorded."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.statements.most_common() if count > 1}
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def server_timing(self):
+        repeated = sum(count - 1 for count in self.duplicates.values())
+        return f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries, {repeated} repeated"'
+
+
+class HealthCheckMiddleware:
+    """
+    Answers ``/healthz`` (the process is up) and ``/readyz`` (the database
+    and caches answer, see ``api.health.ReadinessProbe``) before any other
+    middleware runs, so probes skip the HTTPS redirect, host validation,
+    sessions and CSRF and are not logged. Must come first.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        path = request.path_info.rstrip('/')
+        if path not in ('/healthz', '/readyz') or request.method not in ('GET', 'HEAD'):
+            return self.get_response(request)
+        if path == '/healthz':
+            response = HttpResponse(b'ok', content_type='text/plain')
+        else:
+            checks = readiness()
+            ready = all(result == 'ok' for result in checks.values())
+            response = JsonResponse(checks, status=200 if ready else 503)
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+class QueryStatsMiddleware:
+    """
+    Records the SQL run by each request on ``request.query_stats``. Staff
+    users, and everyone under DEBUG, get it back as a ``Server-Timing``
+    header; statements repeated QUERY_REPEAT_WARNING times or more are
+    logged with the view name, as they usually mean an N+1.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        with stats.record():
+            response = self.get_response(request)
+        request.query_stats = stats
+
+        repeated = [(sql, count) for sql, count in stats.duplicates.items() if count >= settings.QUERY_REPEAT_WARNING]
+        if repeated:
+            match = request.resolver_match
+            logger.warning(
+                '%s ran %d queries, repeating: %s',
+                match.view_name if match else request.path,
+                stats.count,
+                '; '.join(f'{count}x {sql}' for sql, count in repeated),
+            )
+
+        # DRF copies the authenticated user onto the Django request
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or getattr(user, 'is_staff', False):
+            response['Server-Timing'] = stats.server_timing()
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Feeds the request metrics in ``api.metrics``: latency per route name,
+    requests per status, and the SQL of each request. Must come before
+    QueryStatsMiddleware, whose ``request.query_stats`` it reads.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics.registry.start()
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        # unmatched paths share one label, so scanners cannot add series
+        view = match.view_name if match else 'unmatched'
+        metrics.request_duration.observe(duration, view=view, method=request.method)
+        metrics.requests_total.inc(view=view, method=request.method, status=response.status_code)
+        stats = getattr(request, 'query_stats', None)
+        if stats is not None:
+            metrics.db_queries.inc(stats.count, view=view)
+            metrics.db_duration.inc(stats.duration, view=view)
+        return response
+
+
+class AccessLogMiddleware:
+    """
+    Logs every request to ``api.access`` as one JSON object: method, path,
+    route, status, duration, DB time and query count, and user id.
+    Requests are sampled at ACCESS_LOG_SAMPLE_RATE, except server errors,
+    which are always logged. Must come before QueryStatsMiddleware, whose
+    ``request.query_stats`` it reads.
+    """
+
+    def __init__(self, get_response):
+        if not settings.ACCESS_LOG_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.rate = settings.ACCESS_LOG_SAMPLE_RATE
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - start
+        if response.status_code < 500 and random.random() >= self.rate:
+            return response
+
+        match = request.resolver_match
+        stats = getattr(request, 'query_stats', None)
+        user = getattr(request, 'user', None)
+        access_logger.log(logging.ERROR if response.status_code >= 500 else logging.INFO, json.dumps({
+            'time': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'route': match.route if match else None,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 3),
+            'db_ms': round(stats.duration * 1000, 3) if stats else None,
+            'queries': stats.count if stats else None,
+            'user_id': user.pk if user is not None and user.is_authenticated else None,
+        }, separators=(',', ':')))
+        return response
+
+
+def request_role(request):
+    """``anonymous``, ``staff`` or the role of the user the request authenticated as."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return 'anonymous'
+    if user.is_staff:
+        return 'staff'
+    return getattr(user, 'role', None) or 'user'
+
+
+class TrafficCaptureMiddleware:
+    """
+    Writes a TRAFFIC_CAPTURE_RATE sample of requests to the ``api.traffic``
+    logger, one JSON object per line, for ``manage.py replay_traffic``.
+
+    Records hold the method, path, route, query string, role, status and
+    duration. Bodies, headers and client addresses are never kept, and the
+    values of query parameters named in TRAFFIC_CAPTURE_REDACT are replaced.
+    Unused, at no cost, while the rate is 0.
+    """
+
+    def __init__(self, get_response):
+        if not settings.TRAFFIC_CAPTURE_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.rate = settings.TRAFFIC_CAPTURE_RATE
+        self.redact = {name.lower() for name in settings.TRAFFIC_CAPTURE_REDACT}
+
+    def __call__(self, request):
+        if random.random() >= self.rate:
+            return self.get_response(request)
+
+        received = timezone.now()
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        traffic_logger.info(json.dumps({
+            'ts': received.timestamp(),
+            'method': request.method,
+            'path': request.path,
+            'route': match.route if match else None,
+            'query': [
+                [name, '[redacted]' if name.lower() in self.redact else value]
+                for name, values in request.GET.lists() for value in values
+            ],
+            'role': request_role(request),
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 3),
+        }, separators=(',', ':')))
+        return response
+
+
+class ProfileMiddleware:
+    """
+    Profiles a request with cProfile and tracemalloc when a staff user asks
+    for it with an ``X-Profile`` header or a ``profile`` query parameter,
+    and a PROFILE_SAMPLE_RATE sample of all requests. The artifacts are
+    written under PROFILE_DIR and an explicit request gets their id back in
+    ``X-Profile-Id``. Other requests only pay for the header lookup.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rate = settings.PROFILE_SAMPLE_RATE
+
+    def __call__(self, request):
+        staff = None
+        if 'HTTP_X_PROFILE' in request.META or 'profile' in request.GET:
+            staff = self.staff_user(request)
+            trigger = 'requested' if staff is not None else None
+        elif self.rate and random.random() < self.rate:
+            trigger = 'sampled'
+        else:
+            trigger = None
+
+        profiler = RequestProfiler()
+        # tracemalloc is process-wide, so skip while another request is profiled
+        if trigger is None or not profiler.acquire():
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with profiler:
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            user = staff  # views without authentication leave the user unset
+        summary = profiler.save(
+            trigger=trigger,
+            method=request.method,
+            path=request.path,
+            route=match.route if match else None,
+            status=response.status_code,
+            duration_ms=round(duration * 1000, 3),
+            user_id=user.pk if user is not None else None,
+        )
+        if trigger == 'requested':
+            response['X-Profile-Id'] = summary['id']
+        return response
+
+    @staticmethod
+    def staff_user(request):
+        """The staff user of the session, or of the JWT the view will authenticate with."""
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_staff:
+            try:
+                authenticated = CachedJWTAuthentication().authenticate(request)
+            except APIException:
+                return None
+            user = authenticated and authenticated[0]
+        return user if user and user.is_staff else None
@@ -0,0 +1,10 @@
+from rest_framework import pagination
+
+
+class LimitOffsetPagination(pagination.LimitOffsetPagination):
+    """``?size=`` and ``?index=`` pages of 10 courses by default, 50 at most."""
+
+    default_limit = 10
+    max_limit = 50
+    limit_query_param = 'size'
+    offset_query_param = 'index'
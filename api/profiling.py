@@ -0,0 +1,148 @@
+import cProfile
+import io
+import json
+import pstats
+import re
+import threading
+import tracemalloc
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.http import Http404
+from django.utils import timezone
+
+# <id>.prof (pstats), <id>.alloc.txt (allocation diff), <id>.json (summary)
+ARTIFACT_NAME = re.compile(r'^(?P<id>\d{8}T\d{6}-[0-9a-f]{8})\.(?:prof|alloc\.txt|json)$')
+
+# allocations made by the profiler itself
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+class RequestProfiler:
+    """
+    Runs ``cProfile`` and ``tracemalloc`` around one request. tracemalloc
+    is process-wide, so one request per process is profiled at a time;
+    ``acquire`` returns False while another one is.
+    """
+
+    lock = threading.Lock()
+
+    def acquire(self):
+        return self.lock.acquire(blocking=False)
+
+    def __enter__(self):
+        # leave tracing on if it was started outside, e.g. by PYTHONTRACEMALLOC
+        self.tracing = tracemalloc.is_tracing()
+        try:
+            if not self.tracing:
+                tracemalloc.start(settings.PROFILE_TRACEMALLOC_FRAMES)
+            tracemalloc.reset_peak()
+            self.before = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        except BaseException:
+            # __exit__ is not called, and a held lock would disable profiling for good
+            if not self.tracing:
+                tracemalloc.stop()
+            self.lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            self.profile.disable()
+            self.peak = tracemalloc.get_traced_memory()[1]
+            self.after = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+            if not self.tracing:
+                tracemalloc.stop()
+        finally:
+            self.lock.release()
+
+    def save(self, **meta):
+        """Write the artifacts under PROFILE_DIR and return the summary."""
+        directory = Path(settings.PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        now = timezone.now()
+        profile_id = f"{now:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        top = settings.PROFILE_SUMMARY_SIZE
+
+        self.profile.dump_stats(directory / f'{profile_id}.prof')
+        stats = pstats.Stats(self.profile, stream=io.StringIO())
+        functions = sorted(stats.stats.items(), key=lambda item: -item[1][2])
+
+        allocations = [stat for stat in self.after.compare_to(self.before, 'lineno') if stat.size_diff or stat.count_diff]
+        (directory / f'{profile_id}.alloc.txt').write_text(
+            ''.join(f'{stat}\n' for stat in allocations), encoding='utf-8'
+        )
+
+        summary = {
+            'id': profile_id,
+            'time': now.isoformat(),
+            **meta,
+            'cpu_ms': round(stats.total_tt * 1000, 3),
+            'function_calls': stats.total_calls,
+            'allocated_bytes': sum(stat.size_diff for stat in allocations),
+            'peak_bytes': self.peak,
+            # by time spent in the function itself, callees excluded
+            'top_functions': [
+                {
+                    'function': pstats.func_std_string(func),
+                    'calls': calls,
+                    'self_ms': round(self_time * 1000, 3),
+                    'cumulative_ms': round(cumulative * 1000, 3),
+                }
+                for func, (_, calls, self_time, cumulative, _) in functions[:top]
+            ],
+            'top_allocations': [
+                {
+                    'site': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+                    'size_diff': stat.size_diff,
+                    'count_diff': stat.count_diff,
+                }
+                for stat in allocations[:top]
+            ],
+        }
+        (directory / f'{profile_id}.json').write_text(json.dumps(summary, indent=2), encoding='utf-8')
+        prune(directory, settings.PROFILE_KEEP)
+        return summary
+
+
+def profile_ids(directory):
+    """Ids of the profiles stored in ``directory``, newest first."""
+    if not directory.is_dir():
+        return []
+    matches = (ARTIFACT_NAME.match(path.name) for path in directory.iterdir())
+    return sorted({match['id'] for match in matches if match}, reverse=True)
+
+
+def prune(directory, keep):
+    for profile_id in profile_ids(directory)[keep:]:
+        for path in directory.glob(f'{profile_id}.*'):
+            path.unlink(missing_ok=True)
+
+
+def profile_list():
+    """Summaries of the stored profiles, newest first, without the top lists."""
+    directory = Path(settings.PROFILE_DIR)
+    summaries = []
+    for profile_id in profile_ids(directory):
+        try:
+            summary = json.loads((directory / f'{profile_id}.json').read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            continue  # pruned, or still being written
+        summaries.append({key: value for key, value in summary.items() if not key.startswith('top_')})
+    return summaries
+
+
+def profile_artifact(name):
+    """Path of a stored artifact; only names written by ``RequestProfiler.save`` are served."""
+    path = Path(settings.PROFILE_DIR) / name
+    if not ARTIFACT_NAME.match(name) or not path.is_file():
+        raise Http404
+    return path
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+import drf_spectacular
+import rest_framework
+from django.apps import apps
+from django.conf import settings
+from drf_spectacular.renderers import OpenApiJsonRenderer
+from drf_spectacular.settings import spectacular_settings
+
+
+@lru_cache(maxsize=None)
+def source_version():
+    """Hash of the project's Python sources and of what turns them into a schema."""
+    root = Path(settings.BASE_DIR).parent
+    digest = hashlib.sha256(f'{drf_spectacular.__version__} {rest_framework.VERSION}'.encode())
+    digest.update(repr(settings.SPECTACULAR_SETTINGS).encode())
+    directories = {Path(settings.BASE_DIR)}
+    directories |= {Path(app.path) for app in apps.get_app_configs() if Path(app.path).is_relative_to(root)}
+    for path in sorted(path for directory in directories for path in directory.rglob('*.py')):
+        digest.update(str(path.relative_to(root)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def code_version():
+    """CODE_VERSION, e.g. the deployed commit, or a hash of the sources without one."""
+    return settings.CODE_VERSION or source_version()
+
+
+def schema_path(version):
+    return Path(settings.SCHEMA_CACHE_DIR) / f'openapi-{version}.json'
+
+
+def generate():
+    """The public schema, as ``manage.py spectacular`` generates it."""
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS(urlconf=spectacular_settings.SERVE_URLCONF)
+    return OpenApiJsonRenderer().render(generator.get_schema(request=None, public=True), renderer_context={})
+
+
+def build(version=None):
+    """Write the schema of ``version`` and delete the files of other versions."""
+    path = schema_path(version or code_version())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix('.tmp')
+    temporary.write_bytes(generate())
+    os.replace(temporary, path)
+    for stale in path.parent.glob('openapi-*.json'):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+    return path
+
+
+class SchemaStore:
+    """
+    The schema of the running code version, read once from the file
+    ``build_schema`` wrote (generated and written on first use without
+    one), and kept in memory rendered in every format asked for.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.path = None
+        self.schema = None
+        self.rendered = {}
+
+    def load(self):
+        path = schema_path(code_version())
+        if self.path == path:
+            return self
+        with self.lock:
+            # another thread may have loaded it while this one waited
+            if self.path != path:
+                try:
+                    body = path.read_bytes()
+                except FileNotFoundError:
+                    body = build().read_bytes()
+                self.schema = json.loads(body)
+                self.rendered = {}
+                self.path = path
+        return self
+
+    def render(self, renderer, media_type):
+        """``(body, etag)`` of the schema in the format of ``renderer``."""
+        key = (type(renderer), media_type)
+        if key not in self.rendered:
+            body = renderer.render(self.schema, media_type, {})
+            self.rendered[key] = body, '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+        return self.rendered[key]
+
+
+schema_store = SchemaStore()
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+from django.conf import settings
+from django.core.cache import caches
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+from api.middleware import QueryStats
+
+
+class IsolatedCaches:
+    """
+    Replaces the configured caches for a test run, so clearing them never
+    wipes a developer's shared cache file or flushes the Redis of REDIS_URL.
+    'shared' is an SQLite file in a temporary directory, so processes
+    forked by a test still share it.
+    """
+
+    def enable(self):
+        self.directory = tempfile.TemporaryDirectory(prefix='eduak-test-cache-')
+        self.override = override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'shared': {
+                'BACKEND': 'api.cache.SQLiteCache',
+                'LOCATION': os.path.join(self.directory.name, 'shared.sqlite3'),
+            },
+        })
+        self.override.enable()
+
+    def disable(self):
+        self.override.disable()
+        self.directory.cleanup()
+
+
+def clear_caches():
+    """Empty every cache of the test run, including the on-disk shared one."""
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+class CacheClearingResult(unittest.TextTestResult):
+
+    def startTest(self, test):
+        clear_caches()
+        super().startTest(test)
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runner for ``manage.py test``. Tests get their own caches (IsolatedCaches),
+    and as the shared one outlives the test database, throttle and lockout
+    counters are reset before each test, as conftest.py does under pytest.
+    The access log, which goes to stdout, is switched off so it does not
+    bury the test output.
+    """
+
+    def get_resultclass(self):
+        return super().get_resultclass() or CacheClearingResult
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.caches = IsolatedCaches()
+        self.caches.enable()
+        self.quiet = override_settings(ACCESS_LOG_SAMPLE_RATE=0)
+        self.quiet.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.quiet.disable()
+        self.caches.disable()
+        super().teardown_test_environment(**kwargs)
+
+
+class QueryBudgetMixin:
+    """
+    Adds ``assertQueryBudget`` to a test case: the endpoint called by
+    ``request`` must run at most ``budget`` queries, and exactly as many
+    again after ``seed`` has grown the data ``factor`` times.
+    """
+
+    def measure_queries(self, request):
+        # the first call fills per-process caches (users, role groups)
+        request()
+        with QueryStats().record() as stats:
+            response = request()
+        self.assertLess(response.status_code, 400, getattr(response, 'data', response))
+        return stats
+
+    def assertQueryBudget(self, budget, seed, request, factor=10):
+        seed(1)
+        small = self.measure_queries(request)
+        seed(factor - 1)
+        large = self.measure_queries(request)
+        repeated = '\n'.join(f'{count}x {sql}' for sql, count in large.duplicates.items())
+        self.assertLessEqual(small.count, budget, f'{small.count} queries over a budget of {budget}')
+        self.assertEqual(
+            large.count, small.count,
+            f'queries grew from {small.count} to {large.count} with {factor}x data, repeated:\n{repeated}',
+        )
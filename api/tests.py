@@ -1,3 +1,716 @@
-from django.test import TestCase
+import json
+import os
+import logging
+import pstats
+import threading
+import tempfile
+import tracemalloc
+from pathlib import Path
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework.exceptions import ValidationError
+from rest_framework.views import APIView
+
+from api.benchmark import SKIPPED, api_routes, compare
+from api.explain import explain
+from api.health import readiness
+from api.schema import code_version
+from accounts.services import email_enqueue, outbox_deliver
+from accounts.tokens import RoleRefreshToken
+from accounts.authentications import CustomAuthentication
+from accounts.utils import LimitLoginAttempt, user_cache
+from courses.models import Course, Enrollment, Subject
+from courses.selectors import course_catalog
+from students.selectors import enrolled_courses
+from teachers.selectors import course_list
+from api import metrics
+from api.profiling import RequestProfiler
+from api.log import LogWriter, QueuedHandler
+from api.middleware import QueryStats
+from api.testing import clear_caches
+from api.throttling import SlidingWindowRateThrottle
+
+
+class ClockThrottle(SlidingWindowRateThrottle):
+    rate = '3/min'
+    now = 0
+
+    def timer(self):
+        return ClockThrottle.now
+
+    def get_cache_key(self, request, view):
+        return 'throttle_test_%s' % self.get_ident(request)
+
+
+class SlidingWindowRateThrottleTest(TestCase):
+    """Test the sliding-window counter throttle"""
+
+    def setUp(self):
+        clear_caches()
+        self.request = APIRequestFactory().get('/')
+        self.view = APIView()
+        ClockThrottle.now = 600
+
+    def attempt(self):
+        throttle = ClockThrottle()
+        return throttle, throttle.allow_request(self.request, self.view)
+
+    def test_limit_within_window(self):
+        """Test requests over the rate are rejected and do not count"""
+        results = [self.attempt()[1] for _ in range(5)]
+        self.assertEqual(results, [True, True, True, False, False])
+        self.assertEqual(caches['shared'].get('throttle_test_127.0.0.1:10'), 3)
+
+    def test_previous_window_is_weighted(self):
+        """Test the previous window counts in proportion to its overlap"""
+        for _ in range(3):
+            self.attempt()
+        ClockThrottle.now = 690  # half way through the next window: 3 * 0.5 + current
+        self.assertTrue(self.attempt()[1])
+        throttle, allowed = self.attempt()
+        self.assertFalse(allowed)
+        # the next slot frees up once the old window weighs 1/3, 10s later
+        self.assertAlmostEqual(throttle.wait(), 10)
+
+    def test_window_expires(self):
+        """Test a full window later the budget is restored"""
+        for _ in range(4):
+            self.attempt()
+        ClockThrottle.now = 720
+        self.assertEqual([self.attempt()[1] for _ in range(3)], [True, True, True])
+
+
+class ThrottleScopeTest(APITestCase):
+    """Test endpoints use their throttle scope"""
+
+    def setUp(self):
+        clear_caches()
+
+    def test_login_scope(self):
+        """Test login is limited by the login rate"""
+        data = {'email': 'nobody@example.com', 'password': 'wrong'}
+        for _ in range(10):
+            response = self.client.post(reverse('token_obtain_pair'), data)
+            self.assertNotEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        response = self.client.post(reverse('token_obtain_pair'), data)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+    def test_catalog_scope(self):
+        """Test the catalog is counted under its own scope, not anon"""
+        with mock.patch.object(SlidingWindowRateThrottle, 'timer', lambda self: 7200):
+            response = self.client.get(reverse('course-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(caches['shared'].get('throttle_catalog_127.0.0.1:2'), 1)
+        self.assertIsNone(caches['shared'].get('throttle_anon_127.0.0.1:2'))
+
+
+class QueryStatsTest(APITestCase):
+    """Test per-request SQL instrumentation"""
+
+    def test_repeated_statements(self):
+        """Test repeats are grouped by statement, whatever the parameters"""
+        User = get_user_model()
+        with QueryStats().record() as stats:
+            for i in range(3):
+                User.objects.filter(pk=i).exists()
+            list(User.objects.filter(pk__in=[1, 2]))
+            list(User.objects.filter(pk__in=[1, 2, 3]))
+        self.assertEqual(stats.count, 5)
+        self.assertEqual(sorted(stats.duplicates.values()), [2, 3])
+        self.assertTrue(any('IN (...)' in sql for sql in stats.duplicates))
+
+    def test_server_timing_for_staff_only(self):
+        """Test the header is sent to staff and not to anonymous users"""
+        response = self.client.get(reverse('course-list'))
+        self.assertNotIn('Server-Timing', response)
+
+        staff = get_user_model().objects.create(email='staff@example.com', is_staff=True, is_active=True)
+        self.client.force_authenticate(user=staff)
+        response = self.client.get(reverse('user-profile'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries, \d+ repeated"$')
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class BenchApiCommandTest(TestCase):
+    """Test the endpoint benchmark"""
+
+    def setUp(self):
+        Group.objects.get_or_create(name='teacher')
+        Group.objects.get_or_create(name='student')
+        self.output = Path(tempfile.mkdtemp()) / 'bench.json'
+
+    def bench(self, **options):
+        call_command(
+            'bench_api', scale=0.002, requests=2, warmup=0, output=str(self.output), stdout=StringIO(), **options
+        )
+        return json.loads(self.output.read_text())
+
+    def test_every_route(self):
+        """Test every API route but the skipped ones runs without errors"""
+        caches['shared'].set('kept', 1)
+        results = self.bench()
+        names = {label.split('?')[0] for label in results['endpoints']}
+        self.assertEqual(names, set(api_routes()) - set(SKIPPED))
+        errors = {label: result['status'] for label, result in results['endpoints'].items() if result['errors']}
+        self.assertEqual(errors, {})
+        # the dataset and every request were rolled back, and the users,
+        # OTPs and role versions cached for them went with the run's caches
+        self.assertFalse(get_user_model().objects.exists())
+        self.assertEqual(caches['shared'].connection().execute('SELECT key FROM cache').fetchall(), [(':1:kept',)])
+        self.assertFalse(user_cache.local)
+
+    def test_baseline(self):
+        """Test a run is checked against a baseline"""
+        results = self.bench(only=['course-detail'])
+        baseline = self.output.with_name('baseline.json')
+        results['endpoints']['course-detail']['queries'] = 0
+        baseline.write_text(json.dumps(results))
+        # latency of two requests is noise; only the query count may regress
+        with self.assertRaisesMessage(CommandError, '1 regressions'):
+            self.bench(only=['course-detail'], baseline=str(baseline), threshold=10 ** 6)
+
+    def test_compare(self):
+        """Test latency regressions need both the threshold and the minimum delta"""
+        def run(p50, p95, queries=2):
+            latency = {'p50': p50, 'p95': p95, 'p99': p95}
+            return {'endpoints': {'course-list': {'latency_ms': latency, 'queries': queries, 'errors': 0}}}
+
+        self.assertEqual(compare(run(10, 20), run(10.5, 23), threshold=10), [('course-list', 'p95', 20, 23)])
+        self.assertEqual(compare(run(1, 2), run(1.5, 2.9), threshold=10), [])
+        self.assertEqual(compare(run(10, 20), run(10, 20, queries=3), threshold=10), [('course-list', 'queries', 2, 3)])
+
+
+@override_settings(TRAFFIC_CAPTURE_RATE=1)
+class TrafficCaptureTest(APITestCase):
+    """Test sampled traffic capture"""
+
+    def captured(self, request):
+        with self.assertLogs('api.traffic', 'INFO') as logs:
+            request()
+        return [json.loads(record.getMessage()) for record in logs.records]
+
+    def test_anonymized_record(self):
+        """Test a record keeps the route and query but redacts sensitive values"""
+        [record] = self.captured(lambda: self.client.get(reverse('course-list'), {'size': 5, 'email': 'a@b.c'}))
+        self.assertEqual(record['method'], 'GET')
+        self.assertEqual(record['path'], reverse('course-list'))
+        self.assertEqual(record['route'], 'api/v1/courses/')
+        self.assertEqual(record['query'], [['size', '5'], ['email', '[redacted]']])
+        self.assertEqual(record['role'], 'anonymous')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['duration_ms'], 0)
+
+    def test_role(self):
+        """Test the role of the authenticated user is recorded"""
+        teacher = get_user_model().objects.create(email='teacher@example.com', role='teacher', is_active=True)
+        self.client.force_authenticate(user=teacher)
+        [record] = self.captured(lambda: self.client.get(reverse('user-profile')))
+        self.assertEqual(record['role'], 'teacher')
+
+    @override_settings(TRAFFIC_CAPTURE_RATE=0)
+    def test_disabled(self):
+        """Test nothing is captured at a rate of 0"""
+        with self.assertNoLogs('api.traffic'):
+            self.client.get(reverse('course-list'))
+
+
+class ReplayTrafficCommandTest(LiveServerTestCase):
+    """Test replaying a capture against a running server"""
+
+    def test_replay(self):
+        """Test captured GETs are replayed and reported per route"""
+        def record(ts, method, name, role='anonymous', query=()):
+            return json.dumps({
+                'ts': ts, 'method': method, 'path': reverse(name), 'route': reverse(name).lstrip('/'),
+                'query': list(query), 'role': role, 'status': 200, 'duration_ms': 2.5,
+            })
+
+        capture = Path(tempfile.mkdtemp()) / 'traffic.ndjson'
+        capture.write_text('\n'.join([
+            record(10.0, 'GET', 'course-list', query=[['size', '2']]),
+            record(10.1, 'GET', 'subject-list'),
+            record(10.2, 'GET', 'course-list'),
+            record(10.3, 'POST', 'user-register'),
+            record(10.4, 'GET', 'user-profile', role='student'),
+            'not json',
+        ]))
+        output = capture.with_name('report.json')
+        call_command(
+            'replay_traffic', str(capture), base_url=self.live_server_url, speed=0, concurrency=2,
+            output=str(output), stdout=StringIO(),
+        )
+        report = json.loads(output.read_text())
+        self.assertEqual(report['requests'], 3)
+        self.assertEqual(report['skipped'], {'method POST': 1, 'no token for student': 1, 'malformed': 1})
+        courses = report['routes']['GET api/v1/courses/']
+        self.assertEqual((courses['count'], courses['status']), (2, {'200': 2}))
+        self.assertEqual(courses['captured_ms']['p50'], 2.5)
+        self.assertEqual(report['routes']['GET api/v1/courses/subjects/']['errors'], 0)
+
+
+class BlockingHandler(logging.Handler):
+    """Collects records, holding the first until ``unblock`` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.entered = threading.Event()
+        self.unblock = threading.Event()
+        self.records = []
+
+    def emit(self, record):
+        self.entered.set()
+        self.unblock.wait(5)
+        self.records.append(record.getMessage())
+
+
+class LogQueueTest(TestCase):
+    """Test log records are written off the calling thread"""
+
+    def test_configured_loggers_are_queued(self):
+        """Test LOGGING handlers sit behind the queue"""
+        for name in ('django', 'api.access', 'accounts'):
+            [handler] = logging.getLogger(name).handlers
+            self.assertIsInstance(handler, QueuedHandler)
+
+    def test_slow_handler_does_not_block(self):
+        """Test a stuck handler neither blocks logging nor grows the queue"""
+        handler = BlockingHandler()
+        writer = LogWriter(capacity=1)
+        logger = logging.getLogger('api.tests.queue')
+        logger.propagate = False
+        logger.handlers = [QueuedHandler([handler], writer)]
+        self.addCleanup(setattr, logger, 'handlers', [])
+
+        logger.warning('first')
+        self.assertTrue(handler.entered.wait(5))
+        for message in ('second', 'third', 'fourth'):
+            logger.warning('%s', message)
+        self.assertEqual(writer.dropped, 2)
+
+        handler.unblock.set()
+        writer.flush()
+        self.assertEqual(handler.records, ['first', 'second'])
+
+
+@override_settings(ACCESS_LOG_SAMPLE_RATE=1)
+class AccessLogTest(APITestCase):
+    """Test the structured access log"""
+
+    def logged(self, request):
+        with self.assertLogs('api.access', 'INFO') as logs:
+            request()
+        return [json.loads(record.getMessage()) for record in logs.records]
+
+    def test_record(self):
+        """Test a record has the route, status, timings and user"""
+        user = get_user_model().objects.create(email='student@example.com', role='student', is_active=True)
+        self.client.force_authenticate(user=user)
+        [record] = self.logged(lambda: self.client.get(reverse('user-profile')))
+        self.assertEqual(record['route'], 'api/v1/accounts/profile/')
+        self.assertEqual((record['method'], record['status'], record['user_id']), ('GET', 200, user.pk))
+        self.assertGreaterEqual(record['duration_ms'], record['db_ms'])
+        self.assertGreater(record['queries'], 0)
+
+    def test_anonymous(self):
+        """Test anonymous requests have no user id"""
+        [record] = self.logged(lambda: self.client.get(reverse('course-list')))
+        self.assertIsNone(record['user_id'])
+
+    @override_settings(ACCESS_LOG_SAMPLE_RATE=1e-9)
+    def test_sampling(self):
+        """Test successful requests outside the sample are not logged"""
+        with self.assertNoLogs('api.access'):
+            self.client.get(reverse('course-list'))
+
+
+def metric_value(metric, **labels):
+    """Current value of ``metric``; the observation count for histograms."""
+    value = metrics.registry.collect()[metric.name].get(metric.key(labels), 0)
+    return sum(value[:-1]) if isinstance(value, list) else value
+
+
+class MetricsTest(APITestCase):
+    """Test the metrics registry and scrape endpoint"""
+
+    def test_endpoint_needs_token(self):
+        """Test /metrics/ is hidden without the configured bearer token"""
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_404_NOT_FOUND)
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_404_NOT_FOUND)
+            self.client.credentials(HTTP_AUTHORIZATION='Bearer secret')
+            self.client.get(reverse('course-list'))
+            response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertRegex(body, r'http_request_duration_seconds_bucket\{view="course-list",method="GET",le="\+Inf"\} \d+')
+
+    def test_request_metrics(self):
+        """Test latency, status and SQL are recorded per route name"""
+        before = metric_value(metrics.request_duration, view='subject-list', method='GET')
+        queries = metric_value(metrics.db_queries, view='subject-list')
+        self.client.get(reverse('subject-list'))
+        self.client.get('/no/such/page/')
+        self.assertEqual(metric_value(metrics.request_duration, view='subject-list', method='GET'), before + 1)
+        self.assertGreater(metric_value(metrics.db_queries, view='subject-list'), queries)
+        self.assertGreater(metric_value(metrics.requests_total, view='unmatched', method='GET', status=404), 0)
+
+    def test_throttle_rejections(self):
+        """Test refused requests are counted per scope"""
+        class ScopedClockThrottle(ClockThrottle):
+            scope = 'clock'
+
+        clear_caches()
+        ClockThrottle.now = 600
+        before = metric_value(metrics.throttle_rejections, scope='clock')
+        request = APIRequestFactory().get('/')
+        for _ in range(5):
+            ScopedClockThrottle().allow_request(request, APIView())
+        self.assertEqual(metric_value(metrics.throttle_rejections, scope='clock'), before + 2)
+
+    def test_login_lockouts(self):
+        """Test a lockout is counted once"""
+        before = metric_value(metrics.login_lockouts)
+        limiter = LimitLoginAttempt(attempts_limit=2)
+        limiter('metrics@example.com')
+        for _ in range(3):
+            with self.assertRaises(ValidationError):
+                limiter.attempt()
+        self.assertEqual(metric_value(metrics.login_lockouts), before + 1)
+
+    def test_email_send_duration(self):
+        """Test every outbox send is timed"""
+        before = metric_value(metrics.email_send_duration, result='sent')
+        email_enqueue(subject='Hi', body='Hello', to=['a@example.com'], from_email='b@example.com')
+        self.assertEqual(outbox_deliver(), (1, 0))
+        self.assertEqual(metric_value(metrics.email_send_duration, result='sent'), before + 1)
+
+    def test_multiprocess(self):
+        """Test a scrape adds up the files written by other workers"""
+        directory = Path(tempfile.mkdtemp())
+        with self.settings(METRICS_DIR=str(directory)):
+            own = metric_value(metrics.login_lockouts)
+            histogram = [0] * len(metrics.DEFAULT_BUCKETS) + [0.5]
+            histogram[6] = 2
+            (directory / '1-1000.json').write_text(json.dumps({
+                'login_lockouts_total': [[[], 3]],
+                'email_send_duration_seconds': [[['sent'], histogram]],
+                'retired_metric': [[[], 1]],
+            }))
+            self.assertEqual(metric_value(metrics.login_lockouts), own + 3)
+            self.assertIn('email_send_duration_seconds_sum{result="sent"} ', metrics.registry.render())
+
+            metrics.registry.flush()
+            written = json.loads((directory / metrics.registry.worker_file()).read_text())
+            self.assertEqual(written['login_lockouts_total'], [[[], own]] if own else [])
+
+    def test_dead_workers_archived(self):
+        """Test files of killed workers move to the archive without changing the totals"""
+        directory = Path(tempfile.mkdtemp())
+        with self.settings(METRICS_DIR=str(directory)):
+            own = metric_value(metrics.login_lockouts)
+            # a pid that no longer runs, and a pid reused since: same pid as ours, old file
+            gone = directory / '999999999-1000.json'
+            reused = directory / f'{os.getpid()}-1000.json'
+            for path in (gone, reused):
+                path.write_text(json.dumps({'login_lockouts_total': [[[], 2]], 'retired_metric': [[[], 1]]}))
+            os.utime(reused, (0, 0))
+
+            self.assertEqual(metric_value(metrics.login_lockouts), own + 4)
+            self.assertFalse(gone.exists() or reused.exists())
+            archive = json.loads((directory / metrics.ARCHIVE).read_text())
+            self.assertEqual(archive['retired_metric'], [[[], 2]])
+            self.assertEqual(metric_value(metrics.login_lockouts), own + 4)
+
+    def test_retire(self):
+        """Test an exiting worker leaves its totals in the archive and no file"""
+        directory = Path(tempfile.mkdtemp())
+        registry = metrics.Registry()
+        lockouts = registry.counter('login_lockouts_total', 'Lockouts.')
+        lockouts.inc(3)
+        with self.settings(METRICS_DIR=str(directory)):
+            registry.flush()
+            registry.retire()
+            registry.flush()
+            self.assertEqual([path.name for path in directory.glob('*.json')], [metrics.ARCHIVE])
+            self.assertEqual(registry.collect()['login_lockouts_total'], {(): 3})
+
+
+class ProfileTest(APITestCase):
+    """Test on-demand request profiling"""
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp()) / 'profiles'
+        settings = self.settings(PROFILE_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        User = get_user_model()
+        self.staff = User.objects.create(email='staff@example.com', is_staff=True, is_active=True)
+        self.student = User.objects.create(email='student@example.com', role='student', is_active=True)
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RoleRefreshToken.for_user(user).access_token}')
+
+    def test_requested_by_staff(self):
+        """Test staff get a CPU profile, an allocation diff and a summary"""
+        self.login(self.staff)
+        response = self.client.get(reverse('course-list'), HTTP_X_PROFILE='1')
+        profile_id = response['X-Profile-Id']
+
+        self.assertGreater(pstats.Stats(str(self.directory / f'{profile_id}.prof')).total_calls, 0)
+        self.assertTrue((self.directory / f'{profile_id}.alloc.txt').is_file())
+        summary = json.loads((self.directory / f'{profile_id}.json').read_text())
+        self.assertEqual(summary['trigger'], 'requested')
+        self.assertEqual(summary['route'], 'api/v1/courses/')
+        self.assertEqual(summary['user_id'], self.staff.pk)
+        self.assertTrue(summary['top_functions'])
+        self.assertTrue(summary['top_allocations'])
+        self.assertIn(':', summary['top_allocations'][0]['site'])
+
+    def test_ignored_for_others(self):
+        """Test the flag does nothing for anonymous and non-staff users"""
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('course-list'), {'profile': 1}))
+        self.login(self.student)
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('course-list'), {'profile': 1}))
+        self.assertFalse(self.directory.exists())
+
+    def test_failed_start_releases_lock(self):
+        """Test a profiler that fails to start leaves profiling available"""
+        profiler = RequestProfiler()
+        self.assertTrue(profiler.acquire())
+        with mock.patch('api.profiling.cProfile.Profile', side_effect=RuntimeError('in use')):
+            with self.assertRaises(RuntimeError):
+                with profiler:
+                    pass
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertTrue(profiler.acquire())
+        profiler.lock.release()
+
+    @override_settings(PROFILE_SAMPLE_RATE=1, PROFILE_KEEP=2)
+    def test_sampled(self):
+        """Test sampled requests are profiled without telling the client, keeping the newest"""
+        for _ in range(3):
+            self.assertNotIn('X-Profile-Id', self.client.get(reverse('subject-list')))
+        self.assertEqual(len(list(self.directory.glob('*.json'))), 2)
+        self.assertEqual(len(list(self.directory.iterdir())), 6)
+
+    def test_download(self):
+        """Test staff list and download the artifacts"""
+        self.login(self.staff)
+        profile_id = self.client.get(reverse('course-list'), HTTP_X_PROFILE='1')['X-Profile-Id']
+
+        [summary] = self.client.get(reverse('request-profile-list')).json()
+        self.assertEqual(summary['id'], profile_id)
+        self.assertNotIn('top_functions', summary)
+
+        response = self.client.get(reverse('request-profile-artifact', args=[f'{profile_id}.prof']))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertEqual(
+            b''.join(response.streaming_content), (self.directory / f'{profile_id}.prof').read_bytes()
+        )
+        response = self.client.get(reverse('request-profile-artifact', args=['..%2Fsettings.py']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.login(self.student)
+        response = self.client.get(reverse('request-profile-artifact', args=[f'{profile_id}.json']))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+def index_name(model, *fields):
+    """Name of the index ``model`` declares on ``fields`` in Meta.indexes."""
+    return next(index.name for index in model._meta.indexes if tuple(index.fields) == fields)
+
+
+class ExplainPlanTest(TestCase):
+    """Test the hot queries are answered from their indexes"""
+
+    def setUp(self):
+        User = get_user_model()
+        self.teacher = User.objects.create(email='teacher@example.com', role='teacher', is_active=True)
+        self.student = User.objects.create(
+            email='student@example.com', phone='+15550100', role='student', is_active=True
+        )
+        self.subject = Subject.objects.create(title='Programming', slug='programming')
+        for i in range(3):
+            course = Course.objects.create(owner=self.teacher, subject=self.subject, title=f'Course {i}', overview='-')
+            Enrollment.objects.create(course=course, user=self.student)
+
+    def assertIndexed(self, plan, index=None):
+        self.assertFalse(plan.scans, f'full scan of {plan.scans} in\n{plan}\n{plan.sql}')
+        self.assertFalse(plan.sorts, f'sort without an index in\n{plan}\n{plan.sql}')
+        if index is not None:
+            self.assertIn(index, plan.indexes, f'{index} not used in\n{plan}')
+
+    def test_catalog_by_subject(self):
+        """Test the catalog of one subject, newest first"""
+        for catalog in (
+            course_catalog().filter(subject__slug='programming').order_by('-created')[:10],
+            self.subject.courses.all()[:10],
+        ):
+            [plan] = explain(catalog)
+            self.assertIndexed(plan, index_name(Course, 'subject', '-created'))
+
+    def test_teacher_course_list(self):
+        """Test a teacher's courses, with and without the stats subqueries"""
+        for with_stats in (False, True):
+            [plan] = explain(course_list(self.teacher, with_stats)[:10])
+            self.assertIndexed(plan, index_name(Course, 'owner', '-created'))
+
+    def test_enrolled_courses(self):
+        """Test a student's courses are found from the enrollment user index"""
+        [plan] = explain(enrolled_courses(self.student)[:10])
+        # newest course first needs a sort, but only of this student's enrollments
+        self.assertFalse(plan.scans, f'full scan of {plan.scans} in\n{plan}')
+        self.assertTrue(any('user_id' in index for index in plan.indexes), str(plan))
+
+    def test_login_lookup(self):
+        """Test users are found by email and phone without a scan"""
+        for identifier in ('student@example.com', '+15550100'):
+            [plan] = explain(lambda: CustomAuthentication().user_for_identifier(identifier))
+            self.assertIndexed(plan)
+            self.assertTrue(plan.indexes)
+
+    def test_scan_detected(self):
+        """Test the harness reports scans and sorts"""
+        [plan] = explain(Course.objects.order_by('overview'))
+        self.assertTrue(plan.scans, str(plan))
+        self.assertTrue(plan.sorts, str(plan))
+
+
+class SuggestIndexesCommandTest(TestCase):
+    """Test index suggestions from query logs"""
+
+    def setUp(self):
+        self.teacher = get_user_model().objects.create(email='teacher@example.com', role='teacher', is_active=True)
+
+    def write_log(self, *querysets):
+        with CaptureQueriesContext(connection) as queries:
+            for queryset in querysets:
+                list(queryset)
+        path = Path(tempfile.mkdtemp()) / 'queries.log'
+        path.write_text(''.join(f"({query['time']}) {query['sql']}; args=(); alias=default\n" for query in queries))
+        return str(path)
+
+    def test_suggests_missing_index(self):
+        """Test a filtered, sorted scan gets an index and indexed queries do not"""
+        log = self.write_log(
+            *(Course.objects.filter(overview=f'overview {i}').order_by('-created') for i in range(3)),
+            course_list(self.teacher),
+            enrolled_courses(self.teacher),
+        )
+        with open(log, 'a') as f:
+            f.write('INFO something else\n')
+        out = StringIO()
+        call_command('suggest_indexes', log, stdout=out)
+        output = out.getvalue()
+        self.assertIn("courses.Course: models.Index(fields=['overview', '-created'])", output)
+        self.assertIn('3 statements', output)
+        self.assertEqual(output.count('models.Index'), 1)
+
+    def test_empty_log(self):
+        """Test a log without statements is an error"""
+        path = Path(tempfile.mkdtemp()) / 'queries.log'
+        path.write_text('nothing here\n')
+        with self.assertRaises(CommandError):
+            call_command('suggest_indexes', str(path), stdout=StringIO())
+
+
+@override_settings(CODE_VERSION='test-1')
+class SchemaTest(APITestCase):
+    """Test the prebuilt OpenAPI schema"""
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        settings = self.settings(SCHEMA_CACHE_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_served_from_build(self):
+        """Test a built schema is served without generating it, with an ETag"""
+        call_command('build_schema', stdout=StringIO())
+        with mock.patch('api.schema.generate', side_effect=AssertionError('generated per request')):
+            response = self.client.get(reverse('schema'), {'format': 'json'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn('/api/v1/courses/', response.json()['paths'])
+
+            again = self.client.get(reverse('schema'), {'format': 'json'}, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(again['ETag'], response['ETag'])
+
+            yaml = self.client.get(reverse('schema'))
+            self.assertTrue(yaml['Content-Type'].startswith('application/vnd.oai.openapi'))
+            self.assertNotEqual(yaml['ETag'], response['ETag'])
+
+    def test_jwt_security_scheme(self):
+        """Test endpoints behind CachedJWTAuthentication declare the bearer JWT scheme"""
+        schema = self.client.get(reverse('schema'), {'format': 'json'}).json()
+        self.assertEqual(
+            schema['components']['securitySchemes']['jwtAuth'],
+            {'type': 'http', 'scheme': 'bearer', 'bearerFormat': 'JWT'},
+        )
+        self.assertIn({'jwtAuth': []}, schema['paths']['/api/v1/accounts/profile/']['get']['security'])
+
+    def test_code_version(self):
+        """Test a new code version gets its own schema and old ones are removed"""
+        self.assertEqual(self.client.get(reverse('schema')).status_code, status.HTTP_200_OK)
+        self.assertEqual([path.name for path in self.directory.iterdir()], ['openapi-test-1.json'])
+
+        with self.settings(CODE_VERSION=''):
+            self.assertRegex(code_version(), r'^[0-9a-f]{16}$')
+            call_command('build_schema', stdout=StringIO())
+            self.assertEqual([path.name for path in self.directory.iterdir()], [f'openapi-{code_version()}.json'])
+
+
+class HealthCheckTest(TestCase):
+    """Test the liveness and readiness endpoints"""
+
+    def setUp(self):
+        readiness.checked = readiness.result = None
+
+    @override_settings(SECURE_SSL_REDIRECT=True, ALLOWED_HOSTS=['eduak.example.com'])
+    def test_liveness(self):
+        """Test /healthz answers without the database, redirects or host checks"""
+        with self.assertNumQueries(0):
+            response = self.client.get('/healthz', HTTP_HOST='10.0.0.7')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, b'ok')
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        self.assertFalse(response.cookies)
+
+    def test_readiness(self):
+        """Test /readyz checks the database once per interval"""
+        with self.assertNumQueries(1):
+            response = self.client.get('/readyz/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'database': 'ok', 'cache:shared': 'ok'})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/readyz').status_code, status.HTTP_200_OK)
+
+    @override_settings(HEALTH_CHECK_INTERVAL=0)
+    def test_not_ready(self):
+        """Test a failing dependency makes /readyz answer 503"""
+        with mock.patch('api.health.check_database', side_effect=OperationalError('gone')), \
+                self.assertLogs('api.health', 'WARNING'):
+            response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.json()['database'], 'OperationalError')
+        self.assertEqual(self.client.get('/readyz').status_code, status.HTTP_200_OK)
+
+    def test_other_methods(self):
+        """Test only GET and HEAD are answered"""
+        self.assertEqual(self.client.head('/healthz').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.post('/healthz').status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import throttling
+from api import metrics
+
+
+class SlidingWindowRateThrottle(throttling.SimpleRateThrottle):
+    """
+    Sliding-window counter throttle.
+
+    Instead of a list of timestamps, every client has one integer counter
+    per fixed window in the shared cache. The rolling count is estimated as
+
+        current + previous * (1 - elapsed / duration)
+
+    so memory per client is two integers whatever the rate, and each request
+    costs one atomic ``incr`` that every worker sees.
+    """
+
+    cache_alias = None  # defaults to settings.THROTTLE_CACHE
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias or settings.THROTTLE_CACHE]
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window, self.elapsed = divmod(self.now, self.duration)
+        current_key = '%s:%d' % (self.key, window)
+        self.previous = self.cache.get('%s:%d' % (self.key, window - 1), 0)
+
+        # a counter lives two windows: first as current, then as previous
+        self.cache.add(current_key, 0, self.duration * 2)
+        self.current = self.cache.incr(current_key)
+
+        weight = 1 - self.elapsed / self.duration
+        if self.previous * weight + self.current > self.num_requests:
+            # rejected requests do not use up the budget
+            self.current = self.cache.decr(current_key)
+            return self.throttle_failure()
+        return self.throttle_success()
+
+    def throttle_success(self):
+        return True
+
+    def throttle_failure(self):
+        metrics.throttle_rejections.inc(scope=self.scope)
+        return False
+
+    def wait(self):
+        remaining = self.duration - self.elapsed
+        allowed = self.num_requests - self.current - 1
+        if self.previous and allowed >= 0:
+            # the previous window's weight decays linearly over this one
+            needed = self.duration * (1 - allowed / self.previous) - self.elapsed
+            return min(max(needed, 0), remaining)
+        return remaining
+
+
+class AnonRateThrottle(throttling.AnonRateThrottle, SlidingWindowRateThrottle):
+    """Limits anonymous clients by IP, using the ``anon`` rate."""
+
+
+class UserRateThrottle(throttling.UserRateThrottle, SlidingWindowRateThrottle):
+    """Limits authenticated users by id, using the ``user`` rate."""
+
+
+class ScopedRateThrottle(throttling.ScopedRateThrottle, SlidingWindowRateThrottle):
+    """Limits views that set ``throttle_scope`` using the rate of that scope."""
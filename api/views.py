@@ -1,3 +1,73 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils.crypto import constant_time_compare
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SpectacularAPIView
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from api.metrics import registry
+from api.profiling import profile_artifact, profile_list
+from api.schema import schema_store
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint. Needs ``Authorization: Bearer <METRICS_TOKEN>``,
+    and is not served at all without a token, except under DEBUG.
+    """
+    if not settings.DEBUG:
+        expected = f'Bearer {settings.METRICS_TOKEN}'
+        if not settings.METRICS_TOKEN or not constant_time_compare(request.headers.get('Authorization', ''), expected):
+            raise Http404
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@extend_schema(tags=['Profiling'])
+class RequestProfileListAPI(APIView):
+    """Profiles written by ProfileMiddleware, newest first."""
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(operation_id='profiles_list', responses={200: OpenApiTypes.OBJECT})
+    def get(self, request):
+        return Response(profile_list())
+
+
+@extend_schema(tags=['Profiling'])
+class RequestProfileArtifactAPI(APIView):
+    """
+    Download ``<id>.prof`` (open with ``python -m pstats`` or snakeviz),
+    ``<id>.alloc.txt`` (allocation diff) or ``<id>.json`` (summary).
+    """
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(operation_id='profiles_download', responses={200: OpenApiTypes.BINARY})
+    def get(self, request, name):
+        return FileResponse(profile_artifact(name).open('rb'), as_attachment=True, filename=name)
+
+
+class SchemaAPI(SpectacularAPIView):
+    """
+    /schema/ from the file ``manage.py build_schema`` writes for the code
+    version, rendered once per format and kept in memory, with an ETag.
+    Translated (``lang``) and versioned schemas are still generated per
+    request.
+    """
+
+    def _get_schema_response(self, request):
+        if not self.serve_public or request.GET.get('lang') or self.api_version or request.version \
+                or self._get_version_parameter(request):
+            return super()._get_schema_response(request)
+
+        body, etag = schema_store.load().render(request.accepted_renderer, request.accepted_media_type)
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        else:
+            charset = request.accepted_renderer.charset
+            content_type = f'{request.accepted_media_type}; charset={charset}' if charset else request.accepted_media_type
+            response = HttpResponse(body, content_type=content_type)
+            response['Content-Disposition'] = f'inline; filename="{self._get_filename(request, None)}"'
+        response['ETag'] = etag
+        return response
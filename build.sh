@@ -9,6 +9,9 @@ pip install -r requirements.txt
 # Collect static files
 python manage.py collectstatic --no-input
 
+# Generate the OpenAPI schema once instead of on the first /schema/ request
+python manage.py build_schema
+
 # Run migrations
 python manage.py migrate
 
@@ -59,14 +59,20 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.HealthCheckMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'api.middleware.AccessLogMiddleware',
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.QueryStatsMiddleware',
+    'api.middleware.TrafficCaptureMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ProfileMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -119,6 +125,23 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing
+# PASSWORD_HASH_ITERATIONS comes from `manage.py calibrate_hasher`; stored
+# hashes are upgraded to it on the next successful login.
+# It replaces PBKDF2PasswordHasher: Django picks the last hasher listed for
+# an algorithm name, so listing both would verify logins outside hash_pool.
+PASSWORD_HASHERS = [
+    'accounts.hashers.CalibratedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = config('PASSWORD_HASH_ITERATIONS', default=870000, cast=int)  # Django 5.1 default
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=2, cast=int)  # concurrent hashes per process
+PASSWORD_HASH_QUEUE = 16        # hashes waiting for a worker before logins are refused
+PASSWORD_HASH_WAIT = 5          # seconds to wait for a queue slot
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -152,14 +175,13 @@ AUTH_USER_MODEL = 'accounts.User'
 
 # CUSTOM AUTHENTICATION BACKENDS
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
-    'accounts.authentications.CustomAuthentication',
+    'accounts.authentications.CustomAuthentication',  # email or phone; extends ModelBackend
 ]
 
 # REST FRAMEWORK SETTINGS
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentications.CachedJWTAuthentication',
     ],
     'DEFAULT_SCHEMA_CLASS': 'api.custom_schema.CustomSchemaGenerator',
     'DEFAULT_PARSER_CLASSES': [
@@ -168,12 +190,16 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'api.throttling.AnonRateThrottle',
+        'api.throttling.UserRateThrottle',
+        'api.throttling.ScopedRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/hour',
-        'user': '1000/hour'
+        'user': '1000/hour',
+        'catalog': '600/hour',   # public course catalog, replaces 'anon'
+        'login': '10/minute',    # password and google login
+        'otp': '10/hour',        # sending and verifying OTP codes
     }
 }
 
@@ -185,28 +211,112 @@ SIMPLE_JWT = {
     'UPDATE_LAST_LOGIN': True,                       # update last login column
     'ROTATE_REFRESH_TOKENS': True,                   # rotate refresh tokens
     'BLACKLIST_AFTER_ROTATION': True,                # blacklist after rotation
+    'TOKEN_OBTAIN_SERIALIZER': 'accounts.serializers.RoleTokenObtainPairSerializer',  # role claims
 }
 
 # CACHE SETTINGS
+# 'shared' is visible to every worker process: Redis when REDIS_URL is set
+# (needs the redis package), otherwise a SQLite file on the local host.
+REDIS_URL = config('REDIS_URL', default='')
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-cache-name',
-    }
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'api.cache.SQLiteCache',
+        'LOCATION': config('SHARED_CACHE_PATH', default=str(BASE_DIR.parent / 'cache' / 'shared.sqlite3')),
+    },
 }
 
 # ACCOUNTS LOGIN LIMIT SETTINGS
 LOGIN_ATTEMPT_LIMIT = 3         
 LOGIN_ATTEMPT_EXPIRE_TIME = 15  
 LOGIN_BLOCK_TIME = 60           
+LOGIN_ATTEMPT_CACHE = 'shared'  # must be shared across workers for the limit to hold
+ROLE_VERSION_CACHE = 'shared'   # role claim versions; must be shared for a role change to reach every worker
+
+# THROTTLE SETTINGS
+THROTTLE_CACHE = 'shared'       # request counters, shared across workers
+
+# HEALTH CHECK SETTINGS
+# /healthz and /readyz are answered by HealthCheckMiddleware, ahead of all other middleware.
+HEALTH_CHECK_INTERVAL = 5       # seconds a readiness result is reused; one check per worker per interval
+HEALTH_CHECK_CACHES = ('shared',)  # caches /readyz needs to answer
+
+# QUERY INSTRUMENTATION SETTINGS
+QUERY_REPEAT_WARNING = 5        # log requests running one statement this many times
+QUERY_LOG = config('QUERY_LOG', default=False, cast=bool)  # every statement to logs/queries.log under DEBUG, for suggest_indexes
+
+# METRICS SETTINGS
+# Scraped from /metrics/ in the Prometheus text format.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')  # bearer token for /metrics/, which is off without one (unless DEBUG)
+METRICS_DIR = config('METRICS_DIR', default='')      # per-worker files added up on scrape; empty for a single process
+METRICS_FLUSH_INTERVAL = 5      # seconds between writes of a worker's file
+METRICS_STALE_AFTER = 600       # seconds without a write after which a worker's file is archived as dead
+
+# PROFILING SETTINGS
+# Staff send `X-Profile: 1` or `?profile=1` to get a request profiled; see ProfileMiddleware.
+PROFILE_SAMPLE_RATE = config('PROFILE_SAMPLE_RATE', default=0.0, cast=float)  # share of all requests profiled, 0 is off
+PROFILE_DIR = BASE_DIR.parent / 'logs' / 'profiles'  # .prof, .alloc.txt and .json per profile
+PROFILE_KEEP = 100              # profiles kept, older ones are deleted
+PROFILE_SUMMARY_SIZE = 25       # functions and allocation sites in a summary
+PROFILE_TRACEMALLOC_FRAMES = 1  # frames stored per allocation
+
+# TRAFFIC CAPTURE SETTINGS
+# Sampled requests go to logs/traffic.ndjson (see LOGGING) for `manage.py replay_traffic`.
+TRAFFIC_CAPTURE_RATE = config('TRAFFIC_CAPTURE_RATE', default=0.0, cast=float)  # share of requests kept, 0 is off
+TRAFFIC_CAPTURE_REDACT = ('token', 'key', 'code', 'otp', 'password', 'email', 'phone')  # query values never written
+
+# TEST SETTINGS
+TEST_RUNNER = 'api.testing.TestRunner'  # runs tests on their own caches, reset before each test
+
+# AUTHENTICATED USER CACHE SETTINGS
+USER_CACHE_LOCAL_SIZE = 1024    # users kept per process
+USER_CACHE_LOCAL_TTL = 10       # seconds, bounds staleness across workers
+USER_CACHE_TTL = 300            # seconds in the shared cache
+USER_CACHE = 'shared'           # second tier, must be shared for saves to reach every worker
+
+
+# EMAIL OUTBOX SETTINGS
+EMAIL_OUTBOX_BATCH_SIZE = 50    # emails sent per SMTP connection
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_BACKOFF = 30       # seconds, doubled on every retry
+EMAIL_OUTBOX_LEASE = 900        # seconds a claimed batch is hidden from other workers, well over a batch of sends
+EMAIL_OUTBOX_KEEP_DAYS = 7      # sent and failed emails are deleted by prune_tokens after this
+EMAIL_TIMEOUT = 10              # seconds per SMTP operation, so a stuck send cannot outlive the lease
+EMAIL_OUTBOX_INTERVAL = 5       # seconds between polls of the worker
+EMAIL_OUTBOX_IN_PROCESS = config('EMAIL_OUTBOX_IN_PROCESS', default=False, cast=bool)  # run the worker inside the web process
+
+
+# TOKEN JANITOR SETTINGS
+TOKEN_JANITOR_BATCH_SIZE = 1000 # rows deleted per transaction
+TOKEN_JANITOR_PAUSE = 0.2       # seconds between batches
+TOKEN_JANITOR_INTERVAL = 3600   # seconds between in-process runs
+TOKEN_JANITOR_IN_PROCESS = config('TOKEN_JANITOR_IN_PROCESS', default=False, cast=bool)  # prune from the web process
 
 
 # GOOGLE SETTINGS
 GOOGLE_CLIENT_ID = config('GOOGLE_CLIENT_ID')
 GOOGLE_CLIENT_SECRET = config('GOOGLE_CLIENT_SECRET')
 GOOGLE_REDIRECT_URI = config('GOOGLE_REDIRECT_URI')
+GOOGLE_TOKEN_URL = 'https://accounts.google.com/o/oauth2/token'
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/oauth2/v3/certs'    # JWKS used to verify id_token
+GOOGLE_USER_INFO_URL = 'https://www.googleapis.com/oauth2/v1/userinfo'
+GOOGLE_HTTP_TIMEOUT = (3.05, 10)    # connect, read seconds
+GOOGLE_HTTP_POOL_SIZE = 10          # kept-alive connections per process
+GOOGLE_CERTS_TTL = 3600             # seconds, when Google sends no max-age
+GOOGLE_ID_TOKEN_LEEWAY = 30         # seconds of clock skew allowed on exp
+
 
 
+# OPENAPI SCHEMA SETTINGS
+# /schema/ serves the file `manage.py build_schema` writes for the running code version.
+CODE_VERSION = config('CODE_VERSION', default=config('RENDER_GIT_COMMIT', default=''))  # hash of the sources when empty
+SCHEMA_CACHE_DIR = BASE_DIR.parent / 'cache' / 'schema'
 
 SPECTACULAR_SETTINGS = {
     'TITLE': 'EDUAK',
@@ -244,6 +354,12 @@ CORS_ALLOWED_ORIGINS = []
 CORS_ALLOW_CREDENTIALS = True
 
 # Logging Configuration
+# api.log.configure applies LOGGING and moves every handler onto one writer
+# thread per process; request threads only put records on a bounded queue.
+LOGGING_CONFIG = 'api.log.configure'
+LOG_QUEUE_SIZE = 10000          # records waiting for the writer before new ones are dropped, 0 writes directly
+ACCESS_LOG_SAMPLE_RATE = config('ACCESS_LOG_SAMPLE_RATE', default=1.0, cast=float)  # share of requests in the access log, 5xx always
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -256,6 +372,10 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'message': {
+            'format': '{message}',
+            'style': '{',
+        },
     },
     'filters': {
         'require_debug_false': {
@@ -279,6 +399,31 @@ LOGGING = {
             'backupCount': 5,
             'formatter': 'verbose',
         },
+        'access': {
+            'level': 'INFO',
+            'class': 'logging.StreamHandler',
+            'stream': 'ext://sys.stdout',
+            'formatter': 'message',
+        },
+        'queries': {
+            'level': 'DEBUG',
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': BASE_DIR.parent / 'logs' / 'queries.log',
+            'maxBytes': 1024 * 1024 * 50,  # 50 MB
+            'backupCount': 2,
+            'formatter': 'message',
+            'filters': ['require_debug_true'],  # Django only logs SQL under DEBUG
+            'delay': True,
+        },
+        'traffic': {
+            'level': 'INFO',
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': BASE_DIR.parent / 'logs' / 'traffic.ndjson',
+            'maxBytes': 1024 * 1024 * 50,  # 50 MB
+            'backupCount': 5,
+            'formatter': 'message',
+            'delay': True,  # no file until something is captured
+        },
     },
     'loggers': {
         'django': {
@@ -301,5 +446,19 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'django.db.backends': {
+            'handlers': ['queries'],
+            'level': 'DEBUG' if QUERY_LOG else 'INFO',
+        },
+        'api.access': {
+            'handlers': ['access'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'api.traffic': {
+            'handlers': ['traffic'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
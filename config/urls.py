@@ -4,13 +4,18 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
-from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
+from drf_spectacular.views import SpectacularRedocView, SpectacularSwaggerView
+
+from api.views import RequestProfileArtifactAPI, RequestProfileListAPI, SchemaAPI, metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/', include('api.urls'),name='api'),
+    path('metrics/', metrics, name='metrics'),
+    path('profiles/', RequestProfileListAPI.as_view(), name='request-profile-list'),
+    path('profiles/<str:name>', RequestProfileArtifactAPI.as_view(), name='request-profile-artifact'),
 
-    path('schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('schema/', SchemaAPI.as_view(), name='schema'),
     # Optional UI:
     path('swagger/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
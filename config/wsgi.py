@@ -14,3 +14,17 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.production')
 
 application = get_wsgi_application()
+
+from django.conf import settings
+
+if settings.EMAIL_OUTBOX_IN_PROCESS:
+    from accounts.services import outbox_deliver
+    from accounts.utils import PeriodicWorker
+
+    PeriodicWorker('email-outbox', outbox_deliver, settings.EMAIL_OUTBOX_INTERVAL).start()
+
+if settings.TOKEN_JANITOR_IN_PROCESS:
+    from accounts.services import tokens_prune
+    from accounts.utils import PeriodicWorker
+
+    PeriodicWorker('token-janitor', tokens_prune, settings.TOKEN_JANITOR_INTERVAL).start()
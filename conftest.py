@@ -0,0 +1,19 @@
+import pytest
+
+from api.testing import IsolatedCaches, clear_caches
+
+
+@pytest.fixture(autouse=True, scope='session')
+def _isolated_caches():
+    # never clear the caches the settings point at, e.g. the Redis in .env
+    isolated = IsolatedCaches()
+    isolated.enable()
+    yield
+    isolated.disable()
+
+
+@pytest.fixture(autouse=True)
+def _clear_caches(_isolated_caches):
+    # throttle and lockout counters live in the shared cache, which
+    # survives between tests
+    clear_caches()
@@ -2,6 +2,7 @@ from django.contrib import admin
 from .models import (
     Subject,
     Course,
+    Enrollment,
 )
 
 
@@ -16,3 +17,10 @@ class SubjectAdmin(admin.ModelAdmin):
 class CourseAdmin(admin.ModelAdmin):
     list_display = ('title', 'subject', 'created',  'photo')
     search_fields = ('title',)
+
+
+@admin.register(Enrollment)
+class EnrollmentAdmin(admin.ModelAdmin):
+    list_display = ('course', 'user', 'created')
+    list_select_related = ('course', 'user')
+    raw_id_fields = ('course', 'user')
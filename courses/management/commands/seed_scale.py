@@ -0,0 +1,229 @@
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from accounts.models import User, Profile, UserRole
+from accounts.services import role_group_id
+from courses.models import Subject, Course, Module, Content, Enrollment
+from teachers.models import ContentItemType
+from teachers.services import CONTENT_ITEM_MODELS, enrollment_rollup_rebuild
+
+# share of generated content items per type
+ITEM_TYPE_WEIGHTS = {
+    ContentItemType.TEXT: 50,
+    ContentItemType.VIDEO: 25,
+    ContentItemType.FILE: 15,
+    ContentItemType.IMAGE: 10,
+}
+
+
+def zipf_cum_weights(rng, size, exponent):
+    """Cumulative Zipf weights over ``size`` items, shuffled so rank is not pk order."""
+    weights = [1 / rank ** exponent for rank in range(1, size + 1)]
+    rng.shuffle(weights)
+    return list(itertools.accumulate(weights))
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep the ``created`` values we generate."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now_add in saved:
+            field.auto_now_add = auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a large synthetic dataset with bulk_create: teachers, students, subjects, '
+        'courses, modules, content items and enrollments, with Zipf-skewed popularity. '
+        'The same --seed always produces the same data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--teachers', type=int, default=200)
+        parser.add_argument('--students', type=int, default=20000)
+        parser.add_argument('--subjects', type=int, default=30)
+        parser.add_argument('--courses', type=int, default=2000)
+        parser.add_argument('--modules', type=int, default=6, help='Average modules per course')
+        parser.add_argument('--items', type=int, default=3, help='Average content items per module')
+        parser.add_argument('--enrollments', type=int, default=200000)
+        parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent for teacher, subject and course popularity')
+        parser.add_argument('--days', type=int, default=365, help='Spread course and enrollment dates over this many days')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--rollup', action='store_true', help='Rebuild enrollment rollups afterwards')
+
+    def handle(self, *args, **options):
+        if options['teachers'] < 1 or options['subjects'] < 1 or options['students'] < 1:
+            raise CommandError('Need at least one teacher, subject and student.')
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.prefix = f"seed{options['seed']}"
+        self.batch_size = options['batch_size']
+        if User.objects.filter(email__startswith=f'{self.prefix}-').exists():
+            raise CommandError(f"Data for --seed {options['seed']} already exists, use another seed.")
+
+        # dates are anchored to midnight so reruns on one day are identical
+        self.end = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.start = self.end - timedelta(days=options['days'])
+
+        started = time.monotonic()
+        with transaction.atomic():
+            teachers = self.step('teachers', lambda: self.create_users(UserRole.TEACHER, options['teachers']))
+            students = self.step('students', lambda: self.create_users(UserRole.STUDENT, options['students']))
+            subjects = self.step('subjects', self.create_subjects)
+            courses = self.step('courses', lambda: self.create_courses(teachers, subjects))
+            self.step('modules', lambda: self.create_syllabi(courses))
+            self.stdout.write(f'{self.content_count} content items')
+            self.step('enrollments', lambda: self.create_enrollments(courses, students))
+        if options['rollup']:
+            self.step('rollup rows', lambda: range(enrollment_rollup_rebuild(start=self.start)))
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.monotonic() - started:.1f}s.'))
+
+    def step(self, label, create):
+        started = time.monotonic()
+        result = create()
+        self.stdout.write(f'{len(result)} {label} in {time.monotonic() - started:.1f}s')
+        return result
+
+    def timestamp(self, after=None):
+        start = (after or self.start).timestamp()
+        return datetime.fromtimestamp(start + (self.end.timestamp() - start) * self.rng.random(), tz=dt_timezone.utc)
+
+    def create_users(self, role, count):
+        # one shared hash: hashing every synthetic user would dominate the run
+        password = make_password(f'{self.prefix}-password')
+        users = User.objects.bulk_create(
+            (
+                User(
+                    email=f'{self.prefix}-{role}-{i}@example.com',
+                    name=f'{role.title()} {i}',
+                    role=role,
+                    is_active=True,
+                    password=password,
+                )
+                for i in range(count)
+            ),
+            batch_size=self.batch_size,
+        )
+        group_id = role_group_id(role)
+        User.groups.through.objects.bulk_create(
+            (User.groups.through(user_id=user.pk, group_id=group_id) for user in users),
+            batch_size=self.batch_size,
+        )
+        Profile.objects.bulk_create((Profile(user_id=user.pk) for user in users), batch_size=self.batch_size)
+        return [user.pk for user in users]
+
+    def create_subjects(self):
+        return Subject.objects.bulk_create(
+            Subject(title=f'Subject {i}', slug=f'{self.prefix}-subject-{i}')
+            for i in range(self.options['subjects'])
+        )
+
+    def create_courses(self, teachers, subjects):
+        skew = self.options['skew']
+        owners = self.rng.choices(teachers, cum_weights=zipf_cum_weights(self.rng, len(teachers), skew), k=self.options['courses'])
+        topics = self.rng.choices(subjects, cum_weights=zipf_cum_weights(self.rng, len(subjects), skew), k=self.options['courses'])
+        with explicit_timestamps(Course._meta.get_field('created')):
+            return Course.objects.bulk_create(
+                (
+                    Course(
+                        owner_id=owner,
+                        subject=subject,
+                        title=f'{subject.title} course {i}',
+                        overview=f'Overview of course {i}',
+                        created=self.timestamp(),
+                    )
+                    for i, (owner, subject) in enumerate(zip(owners, topics))
+                ),
+                batch_size=self.batch_size,
+            )
+
+    def around(self, average):
+        return self.rng.randint(0, 2 * average) if average else 0
+
+    def create_syllabi(self, courses):
+        content_types = ContentType.objects.get_for_models(*(model for model, _ in CONTENT_ITEM_MODELS.values()))
+        item_types = list(ITEM_TYPE_WEIGHTS)
+        item_weights = list(ITEM_TYPE_WEIGHTS.values())
+        per_chunk = max(1, self.batch_size // max(1, self.options['modules'] * self.options['items']))
+        total = []
+        self.content_count = 0
+
+        for offset in range(0, len(courses), per_chunk):
+            chunk = courses[offset:offset + per_chunk]
+            modules = Module.objects.bulk_create(
+                Module(course=course, title=f'Module {order + 1}', description='', order=order)
+                for course in chunk
+                for order in range(self.around(self.options['modules']))
+            )
+
+            items = {item_type: [] for item_type in item_types}
+            placements = []
+            for module in modules:
+                count = self.around(self.options['items'])
+                for order, item_type in enumerate(self.rng.choices(item_types, weights=item_weights, k=count)):
+                    model, field = CONTENT_ITEM_MODELS[item_type]
+                    owner_id = module.course.owner_id
+                    items[item_type].append(model(owner_id=owner_id, title=f'{item_type} {order + 1}', **{
+                        field: f'seed/{item_type}-{module.pk}-{order}' if item_type != ContentItemType.VIDEO
+                        else f'https://videos.example.com/{module.pk}/{order}',
+                    }))
+                    placements.append((module, order, item_type, len(items[item_type]) - 1))
+            for item_type, objs in items.items():
+                CONTENT_ITEM_MODELS[item_type][0].objects.bulk_create(objs)
+
+            self.content_count += len(placements)
+            Content.objects.bulk_create(
+                Content(
+                    module=module,
+                    order=order,
+                    content_type=content_types[CONTENT_ITEM_MODELS[item_type][0]],
+                    object_id=items[item_type][index].pk,
+                )
+                for module, order, item_type, index in placements
+            )
+            total.extend(modules)
+        return total
+
+    def create_enrollments(self, courses, students):
+        target = self.options['enrollments']
+        course_weights = zipf_cum_weights(self.rng, len(courses), self.options['skew'])
+        course_indexes = range(len(courses))
+        # a popular course can run out of students; give up after this many draws
+        draws_left = target * 4
+        seen = set()
+        created = 0
+
+        with explicit_timestamps(Enrollment._meta.get_field('created')):
+            while created < target and draws_left > 0:
+                size = min(self.batch_size, target - created, draws_left)
+                draws_left -= size
+                rows = []
+                for index in self.rng.choices(course_indexes, cum_weights=course_weights, k=size):
+                    student = self.rng.randrange(len(students))
+                    key = index * len(students) + student
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    course = courses[index]
+                    rows.append(Enrollment(course_id=course.pk, user_id=students[student], created=self.timestamp(course.created)))
+                Enrollment.objects.bulk_create(rows)
+                created += len(rows)
+
+        if created < target:
+            self.stderr.write(self.style.WARNING(
+                f'Only {created} unique enrollments fit; add students or courses, or lower --skew.'
+            ))
+        return range(created)
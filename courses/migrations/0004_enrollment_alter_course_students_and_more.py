@@ -0,0 +1,54 @@
+# Generated by Django 5.1.4 on 2026-10-19 03:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Turn the auto-created Course.students table into the explicit
+    Enrollment model. The table already exists, so the model is only
+    added to the migration state and the new column is added afterwards.
+    """
+
+    dependencies = [
+        ('courses', '0003_alter_course_created_alter_course_title_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[],
+            state_operations=[
+                migrations.CreateModel(
+                    name='Enrollment',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='courses.course')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'courses_course_students',
+                        'unique_together': {('course', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='course',
+                    name='students',
+                    field=models.ManyToManyField(blank=True, related_name='courses_joined', through='courses.Enrollment', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['course', '-created'], name='courses_cou_course__56c836_idx'),
+        ),
+    ]
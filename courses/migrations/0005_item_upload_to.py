@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-19 05:57
+
+import courses.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_enrollment_alter_course_students_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='file',
+            name='file',
+            field=models.FileField(upload_to=courses.models.item_upload_to),
+        ),
+        migrations.AlterField(
+            model_name='image',
+            name='file',
+            field=models.FileField(upload_to=courses.models.item_upload_to),
+        ),
+    ]
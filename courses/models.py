@@ -49,6 +49,7 @@ class Course(models.Model):
     created = models.DateTimeField(auto_now_add=True, db_index=True)
     students = models.ManyToManyField(
         User,
+        through='Enrollment',
         related_name='courses_joined',
         blank=True
     )
@@ -79,6 +80,34 @@ class Course(models.Model):
         return self.title
     
 
+class Enrollment(models.Model):
+    """
+    Explicit through model for Course.students so enrollments
+    carry the time they happened.
+    """
+    course = models.ForeignKey(
+        Course,
+        related_name='enrollments',
+        on_delete=models.CASCADE
+    )
+    user = models.ForeignKey(
+        User,
+        related_name='enrollments',
+        on_delete=models.CASCADE
+    )
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = 'courses_course_students'
+        unique_together = [('course', 'user')]
+        indexes = [
+            models.Index(fields=['course', '-created']),
+        ]
+
+    def __str__(self):
+        return f'{self.user} -> {self.course}'
+
+
 class Module(models.Model):
     course = models.ForeignKey(
         Course, related_name='modules', on_delete=models.CASCADE
@@ -117,6 +146,11 @@ class Content(models.Model):
     class Meta:
         ordering = ['order']
 
+def item_upload_to(instance, filename):
+    """``files/<owner id>/<filename>``: every user uploads under a prefix of their own."""
+    return f'{instance.upload_dir}/{instance.owner_id}/{filename}'
+
+
 class ItemBase(models.Model):
     owner = models.ForeignKey(User,
         related_name='%(class)s_related',
@@ -149,14 +183,16 @@ class Text(ItemBase):
         return True
 
 class File(ItemBase):
-    file = models.FileField(upload_to='files')
+    upload_dir = 'files'
+    file = models.FileField(upload_to=item_upload_to)
     
     def is_file(self):
         return True
 
 
 class Image(ItemBase):
-    file = models.FileField(upload_to='images')
+    upload_dir = 'images'
+    file = models.FileField(upload_to=item_upload_to)
 
     def is_image(self):
         return True
@@ -0,0 +1,32 @@
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from .models import (
+    Subject,
+    Course,
+    Module,
+    Enrollment,
+)
+
+
+def count_subquery(queryset, field='course'):
+    """Per-row count of ``queryset`` grouped by ``field``, for use in annotate()."""
+    counts = queryset.order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def course_counts(courses):
+    """Annotate student_count and module_count without loading the rows."""
+    return courses.annotate(
+        student_count=count_subquery(Enrollment.objects.filter(course=OuterRef('pk'))),
+        module_count=count_subquery(Module.objects.filter(course=OuterRef('pk'))),
+    )
+
+
+def subject_list():
+    return Subject.objects.annotate(
+        course_count=count_subquery(Course.objects.filter(subject=OuterRef('pk')), field='subject')
+    )
+
+
+def course_catalog():
+    return course_counts(Course.objects.select_related('owner', 'subject'))
@@ -11,6 +11,7 @@ from .models import (
     Video,
 )
 class SubjectsOutputSerializer(serializers.ModelSerializer):
+        total_courses = serializers.IntegerField(source='course_count', read_only=True)
         class Meta:
             model = Subject
             fields = ['title', 'slug','photo', 'total_courses']
@@ -25,6 +26,8 @@ class SubjectCoursesOutputSerializer(serializers.ModelSerializer):
 class CourseSerializer(serializers.ModelSerializer):
         subject = serializers.CharField(source='subject.title')
         owner = serializers.CharField(source='owner.name')
+        total_students = serializers.IntegerField(source='student_count', read_only=True)
+        total_modules = serializers.IntegerField(source='module_count', read_only=True)
         class Meta:
             model = Course
             fields = ['id','owner','title','subject', 'overview', 'photo','total_students','total_modules','created']
\ No newline at end of file
@@ -1,9 +1,13 @@
+from io import StringIO
 from django.test import TestCase
+from django.core.management import call_command
+from django.contrib.auth.models import Group
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.urls import reverse
-from courses.models import Subject, Course, Module
+from courses.models import Subject, Course, Module, Content, Enrollment
+from api.testing import QueryBudgetMixin
 
 User = get_user_model()
 
@@ -149,3 +153,80 @@ class CourseAPITest(APITestCase):
         """Test searching courses"""
         response = self.client.get(self.list_url, {'search': 'Python'})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class CatalogQueryBudgetTest(QueryBudgetMixin, APITestCase):
+    """Test catalog endpoints run a fixed number of queries"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(email='owner@example.com', password='pass123')
+        self.subject = Subject.objects.create(title='Programming', slug='programming')
+        self.seeded = 0
+
+    def seed(self, count):
+        """Add ``count`` subjects and courses, each course with students and modules"""
+        for _ in range(count):
+            self.seeded += 1
+            Subject.objects.create(title=f'Subject {self.seeded}', slug=f'subject-{self.seeded}')
+            course = Course.objects.create(
+                owner=self.owner, subject=self.subject, title=f'Course {self.seeded}', overview='Overview'
+            )
+            self.first_course = getattr(self, 'first_course', course)
+            for i in range(2):
+                Module.objects.create(course=course, title=f'Module {i}')
+                course.students.add(User.objects.create(email=f'student{self.seeded}-{i}@example.com'))
+
+    def test_subject_list_budget(self):
+        """Test listing subjects"""
+        self.assertQueryBudget(2, self.seed, lambda: self.client.get(reverse('subject-list')))
+
+    def test_subject_detail_budget(self):
+        """Test listing a subject's courses"""
+        url = reverse('subject-detail', kwargs={'slug': self.subject.slug})
+        self.assertQueryBudget(3, self.seed, lambda: self.client.get(url))
+
+    def test_course_list_budget(self):
+        """Test listing courses"""
+        self.assertQueryBudget(2, self.seed, lambda: self.client.get(reverse('course-list')))
+
+    def test_course_detail_budget(self):
+        """Test retrieving a course"""
+        self.assertQueryBudget(
+            1, self.seed, lambda: self.client.get(reverse('course-detail', kwargs={'id': self.first_course.pk}))
+        )
+
+
+class SeedScaleCommandTest(TestCase):
+    """Test the synthetic dataset generator"""
+
+    def setUp(self):
+        Group.objects.get_or_create(name='teacher')
+        Group.objects.get_or_create(name='student')
+
+    def seed(self, seed):
+        call_command(
+            'seed_scale', seed=seed, teachers=3, students=40, subjects=4, courses=12,
+            modules=2, items=2, enrollments=150, batch_size=50, stdout=StringIO(),
+        )
+        return (
+            list(Course.objects.order_by('pk').values_list('title', 'owner__email', 'subject__slug', 'created')),
+            list(Enrollment.objects.order_by('pk').values_list('course__title', 'user__email', 'created')),
+            list(Content.objects.order_by('pk').values_list('module__title', 'content_type__model', 'order')),
+        )
+
+    def test_counts(self):
+        """Test requested volumes are created"""
+        self.seed(7)
+        self.assertEqual(User.objects.filter(email__startswith='seed7-teacher-').count(), 3)
+        self.assertEqual(User.objects.filter(email__startswith='seed7-student-', groups__name='student').count(), 40)
+        self.assertEqual(Course.objects.count(), 12)
+        self.assertEqual(Enrollment.objects.count(), 150)
+        self.assertTrue(Module.objects.exists())
+        self.assertTrue(Content.objects.exists())
+
+    def test_deterministic(self):
+        """Test the same seed produces the same data"""
+        first = self.seed(7)
+        User.objects.filter(email__startswith='seed7-').delete()
+        Subject.objects.all().delete()
+        self.assertEqual(self.seed(7), first)
@@ -6,6 +6,10 @@ from .models import (
     Subject,
     Course,
 )
+from .selectors import (
+    subject_list,
+    course_catalog,
+)
 from .serializers import (
     SubjectsOutputSerializer,
     SubjectCoursesOutputSerializer,
@@ -13,18 +17,21 @@ from .serializers import (
 )
 
 from rest_framework.filters import OrderingFilter, SearchFilter
-from rest_framework.pagination import LimitOffsetPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema
+from api.pagination import LimitOffsetPagination
+from api.throttling import ScopedRateThrottle
 
 @extend_schema(tags=['Courses'])
 class SubjectViewSet(viewsets.ViewSet):
     
-    queryset = Subject.objects.prefetch_related('courses').all()
+    queryset = subject_list()
     serializer_class = SubjectsOutputSerializer
     retrieve_serializer_class = SubjectCoursesOutputSerializer
     permission_classes = []
     authentication_classes = []
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'catalog'
     pagination_class = LimitOffsetPagination
 
     def list(self, request):
@@ -38,8 +45,8 @@ class SubjectViewSet(viewsets.ViewSet):
         return Response(serializer.data)
     
     def retrieve(self, request, slug):
-        subject = self.queryset.get(slug=slug)
-        queryset = subject.courses.select_related('owner', 'subject').prefetch_related('students').all()
+        subject = Subject.objects.get(slug=slug)
+        queryset = subject.courses.all()
         paginator = self.pagination_class()
         page = paginator.paginate_queryset(queryset, request)
         if page is not None:
@@ -58,15 +65,13 @@ class SubjectViewSet(viewsets.ViewSet):
     
 @extend_schema(tags=['Courses'])
 class CourseListAPI(ListAPIView):
-    queryset = Course.objects.select_related('owner', 'subject').prefetch_related('students').all()
+    queryset = course_catalog()
     serializer_class = CourseSerializer
     pagination_class = LimitOffsetPagination
     permission_classes = []
     authentication_classes = []
-    pagination_class.default_limit = 10
-    pagination_class.max_limit = 50
-    pagination_class.limit_query_param = 'size'
-    pagination_class.offset_query_param = 'index'
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'catalog'
 
     filter_backends = [
         SearchFilter,
@@ -81,10 +86,12 @@ class CourseListAPI(ListAPIView):
 
 @extend_schema(tags=['Courses'])
 class CourseDetailAPI(RetrieveAPIView):
-  queryset = Course.objects.select_related('owner', 'subject').prefetch_related('students', 'modules').all()
+  queryset = course_catalog()
   serializer_class = CourseSerializer
   permission_classes = []
   authentication_classes = []
+  throttle_classes = [ScopedRateThrottle]
+  throttle_scope = 'catalog'
 
   pk_url_kwarg = 'id'
   lookup_field = 'id'
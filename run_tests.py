@@ -20,6 +20,7 @@ if __name__ == "__main__":
         'courses.tests',
         'teachers.tests',
         'students.tests',
+        'api.tests',
     ])
     
     sys.exit(bool(failures))
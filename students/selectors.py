@@ -0,0 +1,10 @@
+from courses.models import Course
+from courses.selectors import course_counts
+
+
+def enrolled_courses(user):
+    """Courses ``user`` is enrolled in, newest course first."""
+    return course_counts(
+        Course.objects.filter(enrollments__user=user)
+        .select_related('owner', 'subject')
+    )
@@ -14,6 +14,8 @@ class CourseJoinSerializer(serializers.ModelSerializer):
     modules = ModuleSerializer(many=True, read_only=True)
     owner = serializers.CharField(source='owner.name')
     subject = serializers.CharField(source='subject.title')
+    total_students = serializers.IntegerField(source='student_count', read_only=True)
+    total_modules = serializers.IntegerField(source='module_count', read_only=True)
     class Meta:
         model = Course
         fields = ['id','title','subject','owner','overview','photo','total_students','total_modules','created','modules']
\ No newline at end of file
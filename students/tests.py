@@ -1,10 +1,13 @@
+from datetime import timedelta
 from django.test import TestCase
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.urls import reverse
-from courses.models import Subject, Course
+from courses.models import Subject, Course, Module, Enrollment
+from api.testing import QueryBudgetMixin
 from accounts.models import UserRole
 
 User = get_user_model()
@@ -149,6 +152,14 @@ class EnrolledCoursesTest(APITestCase):
         else:
             self.assertEqual(len(response.data), 2)
     
+    def test_list_enrolled_courses_newest_course_first(self):
+        """Test enrolled courses are ordered by course creation, not by enrollment"""
+        Enrollment.objects.filter(course=self.course1).update(created=timezone.now() + timedelta(hours=1))
+        self.client.force_authenticate(user=self.student)
+        response = self.client.get(self.enrolled_url)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([course['id'] for course in results], [self.course2.id, self.course1.id])
+
     def test_list_enrolled_courses_unauthenticated(self):
         """Test listing enrolled courses without authentication"""
         response = self.client.get(self.enrolled_url)
@@ -237,3 +248,42 @@ class StudentCourseAccessTest(APITestCase):
         self.assertFalse(
             self.course.students.filter(id=self.not_enrolled_student.id).exists()
         )
+
+
+class StudentQueryBudgetTest(QueryBudgetMixin, APITestCase):
+    """Test student endpoints run a fixed number of queries"""
+
+    def setUp(self):
+        self.teacher = User.objects.create(email='teacher@example.com', role=UserRole.TEACHER, is_active=True)
+        self.student = User.objects.create(email='student@example.com', role=UserRole.STUDENT, is_active=True)
+        self.subject = Subject.objects.create(title='Programming', slug='programming')
+        self.open_courses = []
+        self.seeded = 0
+        self.client.force_authenticate(user=self.student)
+
+    def seed(self, count):
+        """Add one enrolled and two open courses per ``count``, each with modules and other students"""
+        for _ in range(count):
+            for enrolled in (True, False, False):
+                self.seeded += 1
+                course = Course.objects.create(
+                    owner=self.teacher, subject=self.subject, title=f'Course {self.seeded}', overview='Overview'
+                )
+                for i in range(2):
+                    Module.objects.create(course=course, title=f'Module {i}')
+                    course.students.add(User.objects.create(email=f'other{self.seeded}-{i}@example.com'))
+                if enrolled:
+                    course.students.add(self.student)
+                else:
+                    self.open_courses.append(course.pk)
+
+    def test_enrolled_list_budget(self):
+        """Test listing enrolled courses with their modules"""
+        self.assertQueryBudget(2, self.seed, lambda: self.client.get(reverse('student-courses-enrolled')))
+
+    def test_enroll_budget(self):
+        """Test enrolling in a course"""
+        self.assertQueryBudget(
+            7, self.seed,
+            lambda: self.client.post(reverse('student-course-enroll', kwargs={'pk': self.open_courses.pop()})),
+        )
@@ -3,11 +3,12 @@ from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from accounts.authentications import CachedJWTAuthentication
 from django.shortcuts import get_object_or_404
 from courses.models import (
     Course,
 )
+from .selectors import enrolled_courses
 from .serializers import (
     CourseJoinSerializer,
     ModuleSerializer,
@@ -19,17 +20,17 @@ from drf_spectacular.utils import extend_schema
 
 @extend_schema(tags=['Students'])
 class CourseEnrollAPI(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     def post(self, request, pk, format=None):
         course = get_object_or_404(Course, pk=pk)
         user = request.user
-        if course.owner == user:
+        if course.owner_id == user.id:
             return Response(
                 {'detail': 'You cannot enroll in your own course'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        if user in course.students.all():
+        if course.enrollments.filter(user=user).exists():
             return Response(
                 {'detail': 'You are already enrolled in this course'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -42,10 +43,9 @@ class CourseEnrollAPI(APIView):
         
 @extend_schema(tags=['Students'])
 class CoursesEnrolledAPI(ListAPIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     serializer_class = CourseJoinSerializer
     
     def get_queryset(self):
-        user = self.request.user
-        return user.courses_joined.select_related('owner', 'subject').prefetch_related('students').all()
\ No newline at end of file
+        return enrolled_courses(self.request.user).prefetch_related('modules')
\ No newline at end of file
@@ -0,0 +1,33 @@
+from datetime import datetime, time, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from teachers.services import enrollment_rollup_rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild hourly and daily enrollment rollups from the enrollment table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Only rebuild the last N days')
+        parser.add_argument('--since', help='Rebuild from this date (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Rebuild up to and including this date (YYYY-MM-DD)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def _parse_date(self, value):
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Invalid date: {value}')
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    def handle(self, *args, **options):
+        start = end = None
+        if options['days'] is not None:
+            start = timezone.now() - timedelta(days=options['days'])
+        if options['since']:
+            start = self._parse_date(options['since'])
+        if options['until']:
+            end = self._parse_date(options['until']) + timedelta(days=1)
+
+        written = enrollment_rollup_rebuild(start=start, end=end, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} rollup rows.'))
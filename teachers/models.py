@@ -1,3 +1,52 @@
 from django.db import models
+from django.contrib.auth import get_user_model
+from courses.models import Course
 
-# Create your models here.
+User = get_user_model()
+
+
+class RollupGranularity(models.TextChoices):
+    HOUR = 'hour'
+    DAY = 'day'
+
+
+class CourseBatchOperation(models.TextChoices):
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+
+
+class ContentItemType(models.TextChoices):
+    TEXT = 'text'
+    FILE = 'file'
+    IMAGE = 'image'
+    VIDEO = 'video'
+
+
+class EnrollmentRollup(models.Model):
+    """
+    Precomputed enrollment counts per course and time bucket.
+    Analytics reads only this table, never the raw enrollments.
+    """
+    teacher = models.ForeignKey(
+        User,
+        related_name='enrollment_rollups',
+        on_delete=models.CASCADE
+    )
+    course = models.ForeignKey(
+        Course,
+        related_name='enrollment_rollups',
+        on_delete=models.CASCADE
+    )
+    granularity = models.CharField(max_length=4, choices=RollupGranularity.choices)
+    bucket = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [('course', 'granularity', 'bucket')]
+        indexes = [
+            models.Index(fields=['teacher', 'granularity', 'bucket']),
+        ]
+
+    def __str__(self):
+        return f'{self.course_id} {self.granularity} {self.bucket}: {self.count}'
@@ -1,13 +1,17 @@
 from rest_framework import permissions
 from accounts.models import UserRole
+from accounts.tokens import role_claims
 
 
 class IsTeacher(permissions.BasePermission):
 
     def has_permission(self, request, view):
+        claims = role_claims(request)
+        if claims is not None:
+            return UserRole.TEACHER in claims['groups'] or claims['is_superuser']
         return request.user.groups.filter(name=UserRole.TEACHER).exists() or request.user.is_superuser
     
 class IsOwner(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
-        return obj.owner == request.user
\ No newline at end of file
+        return obj.owner_id == request.user.id
\ No newline at end of file
@@ -1,13 +1,32 @@
+from django.db.models import OuterRef, Subquery, Sum
 from rest_framework.exceptions import ValidationError
 from courses.models import (
     Subject,
     Course,
+    Module,
+    Enrollment,
 )
+from courses.selectors import count_subquery
+from .models import EnrollmentRollup
 
 
-def course_list(owner):
+def course_list(owner, with_stats=False):
+    """
+    Courses owned by ``owner``. With ``with_stats`` every row is annotated
+    with enrollment_count, module_count and last_enrollment, computed by
+    correlated subqueries inside the same SELECT.
+    """
     try:
-        courses = Course.objects.filter(owner=owner)
+        courses = Course.objects.filter(owner=owner).select_related('subject')
+        if with_stats:
+            enrollments = Enrollment.objects.filter(course=OuterRef('pk'))
+            courses = courses.annotate(
+                enrollment_count=count_subquery(enrollments),
+                module_count=count_subquery(Module.objects.filter(course=OuterRef('pk'))),
+                last_enrollment=Subquery(
+                    enrollments.order_by('-created').values('created')[:1]
+                ),
+            )
     except Exception as e:
         raise ValidationError({"detail":e})
     
@@ -15,8 +34,43 @@ def course_list(owner):
     
 def course_detail(pk):
     try:
-        course = Course.objects.get(pk=pk)
+        course = Course.objects.select_related('subject').get(pk=pk)
     except Exception as e:
         raise ValidationError({"detail":e})
     
-    return course
\ No newline at end of file
+    return course
+
+
+def enrollment_analytics(owner, start, end, granularity, course=None):
+    """
+    Enrollment time series and per-course totals for ``owner`` between
+    ``start`` (inclusive) and ``end`` (exclusive), read from the rollups.
+    """
+    rollups = EnrollmentRollup.objects.filter(
+        teacher=owner,
+        granularity=granularity,
+        bucket__gte=start,
+        bucket__lt=end,
+    )
+    if course is not None:
+        rollups = rollups.filter(course_id=course)
+
+    series = list(
+        rollups.values('bucket').annotate(count=Sum('count')).order_by('bucket')
+    )
+    courses = list(
+        rollups.values('course_id', 'course__title')
+        .annotate(count=Sum('count'))
+        .order_by('-count', 'course_id')
+    )
+    return {
+        'granularity': granularity,
+        'start': start,
+        'end': end,
+        'total': sum(row['count'] for row in series),
+        'series': series,
+        'courses': [
+            {'id': row['course_id'], 'title': row['course__title'], 'count': row['count']}
+            for row in courses
+        ],
+    }
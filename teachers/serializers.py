@@ -1,8 +1,14 @@
+import posixpath
+from datetime import datetime, time, timedelta
+from django.utils import timezone
 from rest_framework import serializers
+from .models import RollupGranularity, CourseBatchOperation, ContentItemType
 
 from courses.models import (
     Subject,
     Course,
+    File,
+    Image,
 )
 
         
@@ -23,4 +29,147 @@ class CourseOutputSerializer(serializers.ModelSerializer):
     subject = serializers.CharField(source='subject.title')
     class Meta:
         model = Course
-        fields = ['id','title', 'subject', 'overview', 'photo','created']
\ No newline at end of file
+        fields = ['id','title', 'subject', 'overview', 'photo','created']
+
+
+class CourseStatsOutputSerializer(CourseOutputSerializer):
+    enrollment_count = serializers.IntegerField(read_only=True)
+    module_count = serializers.IntegerField(read_only=True)
+    last_enrollment = serializers.DateTimeField(read_only=True, allow_null=True)
+
+    class Meta(CourseOutputSerializer.Meta):
+        fields = CourseOutputSerializer.Meta.fields + ['enrollment_count', 'module_count', 'last_enrollment']
+
+
+class CourseBatchItemSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=CourseBatchOperation.choices)
+    id = serializers.IntegerField(required=False)
+    # resolved in bulk by the service, not per item
+    subject = serializers.SlugField(max_length=200, required=False)
+    title = serializers.CharField(max_length=200, required=False)
+    overview = serializers.CharField(max_length=255, required=False)
+
+    def validate(self, data):
+        if data['op'] == CourseBatchOperation.CREATE:
+            missing = [field for field in ('subject', 'title', 'overview') if field not in data]
+            if missing:
+                raise serializers.ValidationError({"detail":f"Missing fields for create: {', '.join(missing)}"})
+        elif 'id' not in data:
+            raise serializers.ValidationError({"detail":f"id is required for {data['op']}"})
+        return data
+
+
+class CourseBatchInputSerializer(serializers.Serializer):
+    operations = CourseBatchItemSerializer(many=True, allow_empty=False, max_length=500)
+
+
+class CourseBatchResultSerializer(serializers.Serializer):
+    index = serializers.IntegerField()
+    op = serializers.CharField()
+    id = serializers.IntegerField()
+    status = serializers.CharField()
+
+class SyllabusContentSerializer(serializers.Serializer):
+    type = serializers.ChoiceField(choices=ContentItemType.choices)
+    title = serializers.CharField(max_length=250)
+    content = serializers.CharField(required=False)
+    url = serializers.URLField(required=False)
+    # storage name of a file the user uploaded, e.g. files/<user id>/slides.pdf
+    file = serializers.CharField(max_length=100, required=False)
+
+    required_fields = {
+        ContentItemType.TEXT: 'content',
+        ContentItemType.VIDEO: 'url',
+        ContentItemType.FILE: 'file',
+        ContentItemType.IMAGE: 'file',
+    }
+    upload_models = {
+        ContentItemType.FILE: File,
+        ContentItemType.IMAGE: Image,
+    }
+
+    def validate(self, data):
+        field = self.required_fields[data['type']]
+        if field not in data:
+            raise serializers.ValidationError({"detail":f"{field} is required for {data['type']} content"})
+        if data['type'] in self.upload_models:
+            self.validate_upload(self.upload_models[data['type']], data['file'])
+        return data
+
+    def validate_upload(self, model, name):
+        """Only files under the requesting user's own upload prefix can be attached."""
+        prefix = f"{model.upload_dir}/{self.context['request'].user.pk}/"
+        if '\\' in name or posixpath.normpath(name) != name or not name.startswith(prefix):
+            raise serializers.ValidationError({"detail":f"file must be one of your uploads under {prefix}"})
+
+
+class SyllabusModuleSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=200)
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+    contents = SyllabusContentSerializer(many=True, required=False, default=list)
+
+
+class SyllabusInputSerializer(serializers.Serializer):
+    modules = SyllabusModuleSerializer(many=True, allow_empty=False, max_length=500)
+
+
+class SyllabusContentOutputSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    type = serializers.CharField()
+    item_id = serializers.IntegerField()
+    order = serializers.IntegerField()
+
+
+class SyllabusModuleOutputSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    order = serializers.IntegerField()
+    contents = SyllabusContentOutputSerializer(many=True)
+
+class CourseCloneInputSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=200, required=False)
+
+class EnrollmentAnalyticsInputSerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    granularity = serializers.ChoiceField(choices=RollupGranularity.choices, default=RollupGranularity.DAY)
+    course = serializers.IntegerField(required=False)
+
+    max_days = {
+        RollupGranularity.HOUR: 31,
+        RollupGranularity.DAY: 731,
+    }
+
+    def validate(self, data):
+        end = data.get('end') or timezone.localdate()
+        start = data.get('start') or end - timedelta(days=29)
+        if start > end:
+            raise serializers.ValidationError({"detail":"start must be before end"})
+        if (end - start).days >= self.max_days[data['granularity']]:
+            raise serializers.ValidationError(
+                {"detail":f"Range too large for {data['granularity']} granularity"}
+            )
+        # the range covers whole days: [start 00:00, end + 1 day 00:00)
+        data['start'] = timezone.make_aware(datetime.combine(start, time.min))
+        data['end'] = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+        return data
+
+
+class EnrollmentBucketSerializer(serializers.Serializer):
+    bucket = serializers.DateTimeField()
+    count = serializers.IntegerField()
+
+
+class EnrollmentCourseTotalSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class EnrollmentAnalyticsOutputSerializer(serializers.Serializer):
+    granularity = serializers.CharField()
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    total = serializers.IntegerField()
+    series = EnrollmentBucketSerializer(many=True)
+    courses = EnrollmentCourseTotalSerializer(many=True)
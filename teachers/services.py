@@ -1,7 +1,26 @@
+from collections import Counter
+from django.db import IntegrityError, transaction
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, F, Max
+from django.db.models.functions import Greatest, TruncDay, TruncHour
+from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 from courses.models import (
     Subject,
     Course,
+    Enrollment,
+    Module,
+    Content,
+    Text,
+    File,
+    Image,
+    Video,
+)
+from .models import (
+    EnrollmentRollup,
+    RollupGranularity,
+    CourseBatchOperation,
+    ContentItemType,
 )
 
 
@@ -43,4 +62,301 @@ def course_delete(course):
     try:
         course.delete()
     except Exception as e:
-        raise ValidationError({"detail":e})
\ No newline at end of file
+        raise ValidationError({"detail":e})
+
+BATCH_STATUS = {
+    CourseBatchOperation.CREATE: 'created',
+    CourseBatchOperation.UPDATE: 'updated',
+    CourseBatchOperation.DELETE: 'deleted',
+}
+
+
+def course_batch(owner, operations):
+    """
+    Apply a list of create/update/delete operations on ``owner``'s courses
+    in one transaction. Every operation is checked before anything is
+    written; any error rejects the whole batch with per-index messages.
+    """
+    slugs = {op['subject'] for op in operations if 'subject' in op}
+    ids = [op['id'] for op in operations if op['op'] != CourseBatchOperation.CREATE]
+    subjects = Subject.objects.in_bulk(slugs, field_name='slug')
+    courses = Course.objects.in_bulk(ids)
+
+    errors = {}
+    seen = set()
+    for index, op in enumerate(operations):
+        if 'subject' in op and op['subject'] not in subjects:
+            errors[index] = f"Subject '{op['subject']}' does not exist."
+        if op['op'] == CourseBatchOperation.CREATE:
+            continue
+        course = courses.get(op['id'])
+        if course is None:
+            errors[index] = f"Course {op['id']} does not exist."
+        elif course.owner_id != owner.id:
+            errors[index] = f"You do not own course {op['id']}."
+        elif op['id'] in seen:
+            errors[index] = f"Course {op['id']} appears more than once."
+        seen.add(op['id'])
+    if errors:
+        raise ValidationError({"detail":"Batch rejected.", "errors":errors})
+
+    created, updated, deleted = [], [], []
+    update_fields = set()
+    for op in operations:
+        if op['op'] == CourseBatchOperation.CREATE:
+            created.append(Course(
+                owner=owner,
+                subject=subjects[op['subject']],
+                title=op['title'],
+                overview=op['overview'],
+            ))
+        elif op['op'] == CourseBatchOperation.UPDATE:
+            course = courses[op['id']]
+            if 'subject' in op:
+                course.subject = subjects[op['subject']]
+                update_fields.add('subject')
+            for field in ('title', 'overview'):
+                if field in op:
+                    setattr(course, field, op[field])
+                    update_fields.add(field)
+            updated.append(course)
+        else:
+            deleted.append(op['id'])
+
+    try:
+        with transaction.atomic():
+            Course.objects.bulk_create(created)
+            if updated and update_fields:
+                Course.objects.bulk_update(updated, sorted(update_fields))
+            if deleted:
+                Course.objects.filter(pk__in=deleted).delete()
+    except Exception as e:
+        raise ValidationError({"detail":e})
+
+    new_courses = iter(created)
+    results = []
+    for index, op in enumerate(operations):
+        pk = next(new_courses).pk if op['op'] == CourseBatchOperation.CREATE else op['id']
+        results.append({
+            'index': index,
+            'op': op['op'],
+            'id': pk,
+            'status': BATCH_STATUS[op['op']],
+        })
+    return results
+
+CONTENT_ITEM_MODELS = {
+    ContentItemType.TEXT: (Text, 'content'),
+    ContentItemType.FILE: (File, 'file'),
+    ContentItemType.IMAGE: (Image, 'file'),
+    ContentItemType.VIDEO: (Video, 'url'),
+}
+
+
+def syllabus_create(course, owner, modules):
+    """
+    Append a whole module/content tree to ``course``.
+
+    Orders are assigned here rather than by OrderField so every level is a
+    single bulk_create: one for the modules, one per item type and one for
+    the Content rows, whatever the size of the tree.
+    """
+    try:
+        with transaction.atomic():
+            last_order = Module.objects.filter(course=course).aggregate(last=Max('order'))['last']
+            first_order = 0 if last_order is None else last_order + 1
+            new_modules = Module.objects.bulk_create([
+                Module(
+                    course=course,
+                    title=module['title'],
+                    description=module['description'],
+                    order=first_order + position,
+                )
+                for position, module in enumerate(modules)
+            ])
+
+            items = {item_type: [] for item_type in CONTENT_ITEM_MODELS}
+            placements = []
+            for module, data in zip(new_modules, modules):
+                for order, content in enumerate(data['contents']):
+                    model, field = CONTENT_ITEM_MODELS[content['type']]
+                    item = model(owner=owner, title=content['title'], **{field: content[field]})
+                    items[content['type']].append(item)
+                    placements.append((module, order, content['type'], item))
+
+            for item_type, objs in items.items():
+                if objs:
+                    CONTENT_ITEM_MODELS[item_type][0].objects.bulk_create(objs)
+
+            content_types = ContentType.objects.get_for_models(
+                *(model for model, _ in CONTENT_ITEM_MODELS.values())
+            )
+            contents = Content.objects.bulk_create([
+                Content(
+                    module=module,
+                    content_type=content_types[CONTENT_ITEM_MODELS[item_type][0]],
+                    object_id=item.pk,
+                    order=order,
+                )
+                for module, order, item_type, item in placements
+            ])
+    except Exception as e:
+        raise ValidationError({"detail":e})
+
+    tree = {module.pk: {'id': module.pk, 'title': module.title, 'order': module.order, 'contents': []}
+            for module in new_modules}
+    for content, (module, order, item_type, item) in zip(contents, placements):
+        tree[module.pk]['contents'].append({
+            'id': content.pk,
+            'type': item_type,
+            'item_id': item.pk,
+            'order': order,
+        })
+    return list(tree.values())
+
+def _copy(obj, **changes):
+    obj.pk = None
+    obj._state.adding = True
+    for field, value in changes.items():
+        setattr(obj, field, value)
+    return obj
+
+
+def course_clone(course, owner, title=None):
+    """
+    Deep copy ``course`` with its modules, contents and items for ``owner``.
+
+    Each level is read once and written with one bulk_create, remapping
+    ids on the way down, so the query count does not depend on the size
+    of the course. Stored files are shared with the original, not copied.
+    """
+    try:
+        with transaction.atomic():
+            clone = Course.objects.create(
+                owner=owner,
+                subject_id=course.subject_id,
+                title=title or course.title,
+                overview=course.overview,
+                photo=course.photo.name,
+            )
+
+            modules = list(Module.objects.filter(course=course))
+            old_module_ids = [module.pk for module in modules]
+            new_modules = Module.objects.bulk_create(
+                [_copy(module, course=clone) for module in modules]
+            )
+            module_map = dict(zip(old_module_ids, (module.pk for module in new_modules)))
+
+            contents = list(Content.objects.filter(module__course=course))
+            content_types = ContentType.objects.get_for_models(
+                *(model for model, _ in CONTENT_ITEM_MODELS.values())
+            )
+            item_maps = {}
+            for model, content_type in content_types.items():
+                items = list(model.objects.filter(
+                    pk__in=Content.objects.filter(
+                        module__course=course,
+                        content_type=content_type,
+                    ).values('object_id')
+                ))
+                if not items:
+                    continue
+                old_item_ids = [item.pk for item in items]
+                new_items = model.objects.bulk_create([_copy(item, owner=owner) for item in items])
+                item_maps[content_type.pk] = dict(zip(old_item_ids, (item.pk for item in new_items)))
+
+            Content.objects.bulk_create([
+                _copy(
+                    content,
+                    module_id=module_map[content.module_id],
+                    object_id=item_maps[content.content_type_id][content.object_id],
+                )
+                for content in contents
+                if content.object_id in item_maps.get(content.content_type_id, {})
+            ])
+    except Exception as e:
+        raise ValidationError({"detail":e})
+
+    return clone
+
+def _bucket_start(moment, granularity):
+    moment = timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+    if granularity == RollupGranularity.DAY:
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def _rollup_increment(teacher_id, course_id, granularity, bucket, amount):
+    lookup = dict(course_id=course_id, granularity=granularity, bucket=bucket)
+    count = F('count') + amount
+    if amount < 0:
+        # buckets can be behind after bulk loads; a delete must not fail on that
+        count = Greatest(count, 0)
+    updated = EnrollmentRollup.objects.filter(**lookup).update(count=count)
+    if updated or amount < 0:
+        return
+    try:
+        with transaction.atomic():
+            EnrollmentRollup.objects.create(teacher_id=teacher_id, count=amount, **lookup)
+    except IntegrityError:
+        # another worker created the bucket first
+        EnrollmentRollup.objects.filter(**lookup).update(count=F('count') + amount)
+
+
+def enrollment_rollup_record(enrollments, amount=1):
+    """
+    Add ``amount`` to the hourly and daily buckets of each enrollment.
+    ``enrollments`` is an iterable of (teacher_id, course_id, created).
+    """
+    increments = Counter()
+    for teacher_id, course_id, created in enrollments:
+        for granularity in RollupGranularity.values:
+            increments[(teacher_id, course_id, granularity, _bucket_start(created, granularity))] += amount
+
+    for (teacher_id, course_id, granularity, bucket), total in increments.items():
+        _rollup_increment(teacher_id, course_id, granularity, bucket, total)
+
+
+def enrollment_rollup_rebuild(start=None, end=None, batch_size=1000):
+    """
+    Recompute every bucket between ``start`` and ``end`` from the enrollment
+    table. Used to catch up after bulk loads and to repair drift.
+    Returns the number of rollup rows written.
+    """
+    enrollments = Enrollment.objects.all()
+    rollups = EnrollmentRollup.objects.all()
+    if start is not None:
+        start = _bucket_start(start, RollupGranularity.DAY)
+        enrollments = enrollments.filter(created__gte=start)
+        rollups = rollups.filter(bucket__gte=start)
+    if end is not None:
+        enrollments = enrollments.filter(created__lt=end)
+        rollups = rollups.filter(bucket__lt=end)
+
+    truncs = {
+        RollupGranularity.HOUR: TruncHour('created'),
+        RollupGranularity.DAY: TruncDay('created'),
+    }
+    with transaction.atomic():
+        rollups.delete()
+        written = 0
+        for granularity, trunc in truncs.items():
+            rows = (
+                enrollments.order_by()
+                .annotate(bucket=trunc)
+                .values('course_id', 'course__owner_id', 'bucket')
+                .annotate(total=Count('pk'))
+            )
+            objs = [
+                EnrollmentRollup(
+                    teacher_id=row['course__owner_id'],
+                    course_id=row['course_id'],
+                    granularity=granularity,
+                    bucket=row['bucket'],
+                    count=row['total'],
+                )
+                for row in rows.iterator()
+            ]
+            EnrollmentRollup.objects.bulk_create(objs, batch_size=batch_size)
+            written += len(objs)
+    return written
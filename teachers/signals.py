@@ -0,0 +1,44 @@
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from courses.models import Course, Enrollment
+from .services import enrollment_rollup_record
+
+
+def _enrollment_rows(instance, reverse, pk_set):
+    if reverse:
+        enrollments = Enrollment.objects.filter(user_id=instance.pk, course_id__in=pk_set)
+    else:
+        enrollments = Enrollment.objects.filter(course_id=instance.pk, user_id__in=pk_set)
+    return list(enrollments.values_list('course__owner_id', 'course_id', 'created'))
+
+
+@receiver(post_save, sender=Enrollment)
+def enrollment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        owner_id = Course.objects.filter(pk=instance.course_id).values_list('owner_id', flat=True).get()
+        enrollment_rollup_record([(owner_id, instance.course_id, instance.created)])
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, origin=None, **kwargs):
+    """
+    Sent for every row Enrollment.delete(), queryset .delete(),
+    Course.students.remove()/clear() and user deletion remove.
+    """
+    # the course's rollups go with it
+    if isinstance(origin, Course) or (isinstance(origin, QuerySet) and origin.model is Course):
+        return
+    # decrements only update existing buckets, which need no teacher
+    enrollment_rollup_record([(None, instance.course_id, instance.created)], amount=-1)
+
+
+@receiver(m2m_changed, sender=Course.students.through)
+def enrollments_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Course.students.add() bypasses Enrollment.save(), so count additions
+    from the m2m signal instead; removals delete rows and reach
+    ``enrollment_deleted``.
+    """
+    if action == 'post_add' and pk_set:
+        enrollment_rollup_record(_enrollment_rows(instance, reverse, pk_set))
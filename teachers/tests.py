@@ -1,11 +1,19 @@
+from datetime import timedelta
+from io import StringIO
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.urls import reverse
-from courses.models import Subject, Course
+from courses.models import Subject, Course, Module, Content, Enrollment, File
 from accounts.models import UserRole
+from teachers.models import EnrollmentRollup, RollupGranularity
+from api.testing import QueryBudgetMixin
 
 User = get_user_model()
 
@@ -125,7 +133,47 @@ class TeacherCourseListTest(APITestCase):
         """Test teacher can list their courses"""
         response = self.client.get(self.list_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['subject'], self.subject.title)
+        self.assertNotIn('enrollment_count', response.data['results'][0])
+
+    def test_list_teacher_courses_size_index(self):
+        """Test the list pages with size and index"""
+        for i in range(2):
+            Course.objects.create(owner=self.teacher, subject=self.subject, title=f'Course {i}', overview='Overview')
+        response = self.client.get(self.list_url, {'size': 2, 'index': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_list_teacher_courses_with_stats(self):
+        """Test per-course statistics are annotated on request"""
+        student = User.objects.create_user(email='student@example.com', password='testpass123')
+        self.course.students.add(student)
+        Module.objects.create(course=self.course, title='Intro')
+        Module.objects.create(course=self.course, title='Basics')
+        response = self.client.get(self.list_url, {'stats': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = response.data['results'][0]
+        self.assertEqual(result['enrollment_count'], 1)
+        self.assertEqual(result['module_count'], 2)
+        self.assertIsNotNone(result['last_enrollment'])
+
+    def test_list_teacher_courses_constant_queries(self):
+        """Test listing does not issue a query per course"""
+        for i in range(5):
+            Course.objects.create(
+                owner=self.teacher,
+                subject=Subject.objects.create(title=f'Subject {i}', slug=f'subject-{i}'),
+                title=f'Course {i}',
+                overview='Overview'
+            )
+        # teacher group check, count, page
+        with self.assertNumQueries(3):
+            response = self.client.get(self.list_url, {'stats': 'true'})
+        self.assertEqual(response.data['count'], 6)
 
 
 class CourseUpdateTest(APITestCase):
@@ -232,3 +280,427 @@ class CourseDeleteTest(APITestCase):
         response = self.client.delete(self.delete_url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(Course.objects.filter(id=self.course.id).exists())
+
+
+class EnrollmentAnalyticsTest(APITestCase):
+    """Test enrollment rollups and the analytics endpoint"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        teacher_group, _ = Group.objects.get_or_create(name='teacher')
+        Group.objects.get_or_create(name='student')
+        
+        self.teacher = User.objects.create_user(
+            email='teacher@example.com',
+            password='testpass123'
+        )
+        self.teacher.role = UserRole.TEACHER
+        self.teacher.is_active = True
+        self.teacher.groups.add(teacher_group)
+        self.teacher.save()
+        
+        self.subject = Subject.objects.create(
+            title='Programming',
+            slug='programming'
+        )
+        self.course = Course.objects.create(
+            owner=self.teacher,
+            subject=self.subject,
+            title='Python Course',
+            overview='Learn Python'
+        )
+        self.students = [
+            User.objects.create_user(email=f'student{i}@example.com', password='testpass123')
+            for i in range(3)
+        ]
+        self.course.students.add(*self.students[:2])
+        self.students[2].courses_joined.add(self.course)
+        
+        self.analytics_url = reverse('teacher-enrollment-analytics')
+        self.client.force_authenticate(user=self.teacher)
+    
+    def test_rollups_maintained_on_enroll(self):
+        """Test enrolling updates hourly and daily buckets"""
+        daily = EnrollmentRollup.objects.get(course=self.course, granularity=RollupGranularity.DAY)
+        hourly = EnrollmentRollup.objects.get(course=self.course, granularity=RollupGranularity.HOUR)
+        self.assertEqual(daily.count, 3)
+        self.assertEqual(hourly.count, 3)
+        self.assertEqual(daily.teacher, self.teacher)
+    
+    def test_rollups_decrement_on_remove(self):
+        """Test removing an enrollment updates the buckets"""
+        self.course.students.remove(self.students[0])
+        daily = EnrollmentRollup.objects.get(course=self.course, granularity=RollupGranularity.DAY)
+        self.assertEqual(daily.count, 2)
+
+    def test_rollups_decrement_on_delete(self):
+        """Test deleting enrollment rows directly updates the buckets"""
+        Enrollment.objects.get(course=self.course, user=self.students[0]).delete()
+        Enrollment.objects.filter(user__in=self.students[1:]).delete()
+        for granularity in RollupGranularity.values:
+            rollup = EnrollmentRollup.objects.get(course=self.course, granularity=granularity)
+            self.assertEqual(rollup.count, 0)
+
+    def test_rollups_behind_do_not_block_delete(self):
+        """Test deleting enrollments missing from the buckets stops at zero"""
+        EnrollmentRollup.objects.update(count=1)
+        Enrollment.objects.filter(course=self.course).delete()
+        self.assertFalse(Enrollment.objects.filter(course=self.course).exists())
+        for granularity in RollupGranularity.values:
+            rollup = EnrollmentRollup.objects.get(course=self.course, granularity=granularity)
+            self.assertEqual(rollup.count, 0)
+
+    def test_analytics_reads_rollups_only(self):
+        """Test analytics endpoint never touches the enrollment table"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.analytics_url, {'granularity': 'hour'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], 3)
+        self.assertEqual(response.data['courses'][0]['id'], self.course.id)
+        self.assertEqual(len(response.data['series']), 1)
+        for query in queries.captured_queries:
+            self.assertNotIn(Enrollment._meta.db_table, query['sql'])
+    
+    def test_analytics_invalid_range(self):
+        """Test hourly analytics rejects very large ranges"""
+        response = self.client.get(
+            self.analytics_url,
+            {'granularity': 'hour', 'start': '2024-01-01', 'end': '2024-12-31'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_rollup_command_rebuilds(self):
+        """Test catch-up command recomputes rollups from enrollments"""
+        EnrollmentRollup.objects.all().delete()
+        Enrollment.objects.filter(user=self.students[0]).update(
+            created=timezone.now() - timedelta(days=2)
+        )
+        call_command('rollup_enrollments', stdout=StringIO())
+        counts = dict(
+            EnrollmentRollup.objects.filter(granularity=RollupGranularity.DAY)
+            .values_list('bucket', 'count')
+        )
+        self.assertEqual(sorted(counts.values()), [1, 2])
+
+
+class CourseBatchTest(APITestCase):
+    """Test batch create/update/delete of courses"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        teacher_group, _ = Group.objects.get_or_create(name='teacher')
+        Group.objects.get_or_create(name='student')
+        
+        self.teacher = User.objects.create_user(
+            email='teacher@example.com',
+            password='testpass123'
+        )
+        self.teacher.role = UserRole.TEACHER
+        self.teacher.is_active = True
+        self.teacher.groups.add(teacher_group)
+        self.teacher.save()
+        
+        self.other_teacher = User.objects.create_user(
+            email='other@example.com',
+            password='testpass123'
+        )
+        
+        self.subject = Subject.objects.create(title='Programming', slug='programming')
+        self.other_subject = Subject.objects.create(title='Design', slug='design')
+        self.course = Course.objects.create(
+            owner=self.teacher,
+            subject=self.subject,
+            title='Python Course',
+            overview='Learn Python'
+        )
+        self.old_course = Course.objects.create(
+            owner=self.teacher,
+            subject=self.subject,
+            title='Old Course',
+            overview='Outdated'
+        )
+        self.foreign_course = Course.objects.create(
+            owner=self.other_teacher,
+            subject=self.subject,
+            title='Not Mine',
+            overview='Other teacher'
+        )
+        
+        self.batch_url = reverse('teacher-course-batch')
+        self.client.force_authenticate(user=self.teacher)
+    
+    def test_batch_success(self):
+        """Test mixed operations are applied and reported per item"""
+        operations = [
+            {'op': 'create', 'subject': 'design', 'title': f'Course {i}', 'overview': 'New'}
+            for i in range(20)
+        ]
+        operations += [
+            {'op': 'update', 'id': self.course.id, 'subject': 'design', 'title': 'Python 2'},
+            {'op': 'delete', 'id': self.old_course.id},
+        ]
+        response = self.client.post(self.batch_url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 22)
+        self.assertEqual(response.data[0]['status'], 'created')
+        self.assertEqual(response.data[-1]['status'], 'deleted')
+        self.assertEqual(Course.objects.filter(subject=self.other_subject).count(), 21)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.title, 'Python 2')
+        self.assertEqual(self.course.overview, 'Learn Python')
+        self.assertFalse(Course.objects.filter(id=self.old_course.id).exists())
+    
+    def test_batch_rejected_atomically(self):
+        """Test one bad operation rejects the whole batch"""
+        operations = [
+            {'op': 'create', 'subject': 'programming', 'title': 'New', 'overview': 'New'},
+            {'op': 'delete', 'id': self.foreign_course.id},
+            {'op': 'update', 'id': self.course.id, 'subject': 'missing'},
+        ]
+        response = self.client.post(self.batch_url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data['errors']), {1, 2})
+        self.assertFalse(Course.objects.filter(title='New').exists())
+        self.assertTrue(Course.objects.filter(id=self.foreign_course.id).exists())
+    
+    def test_batch_query_count_constant(self):
+        """Test query count does not grow with the number of operations"""
+        def run(size):
+            operations = [
+                {'op': 'create', 'subject': 'design', 'title': f'Course {i}', 'overview': 'New'}
+                for i in range(size)
+            ]
+            operations.append({'op': 'update', 'id': self.course.id, 'title': f'Python {size}'})
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.batch_url, {'operations': operations}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(queries)
+        
+        self.assertEqual(run(5), run(100))
+    
+    def test_batch_invalid_item(self):
+        """Test item validation runs before the service"""
+        operations = [{'op': 'update', 'title': 'No id'}]
+        response = self.client.post(self.batch_url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SyllabusCreateTest(APITestCase):
+    """Test bulk authoring of modules and contents"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        teacher_group, _ = Group.objects.get_or_create(name='teacher')
+        Group.objects.get_or_create(name='student')
+        
+        self.teacher = User.objects.create_user(
+            email='teacher@example.com',
+            password='testpass123'
+        )
+        self.teacher.role = UserRole.TEACHER
+        self.teacher.is_active = True
+        self.teacher.groups.add(teacher_group)
+        self.teacher.save()
+        
+        self.subject = Subject.objects.create(title='Programming', slug='programming')
+        self.course = Course.objects.create(
+            owner=self.teacher,
+            subject=self.subject,
+            title='Python Course',
+            overview='Learn Python'
+        )
+        Module.objects.create(course=self.course, title='Existing')
+        
+        self.syllabus_url = reverse('teacher-course-syllabus', kwargs={'pk': self.course.id})
+        self.client.force_authenticate(user=self.teacher)
+    
+    def build_modules(self, count):
+        return [
+            {
+                'title': f'Module {i}',
+                'contents': [
+                    {'type': 'text', 'title': 'Notes', 'content': 'Read me'},
+                    {'type': 'video', 'title': 'Lecture', 'url': 'https://example.com/v.mp4'},
+                    {'type': 'file', 'title': 'Slides', 'file': f'files/{self.teacher.pk}/slides.pdf'},
+                    {'type': 'image', 'title': 'Diagram', 'file': f'images/{self.teacher.pk}/diagram.png'},
+                ]
+            }
+            for i in range(count)
+        ]
+    
+    def test_create_syllabus(self):
+        """Test the tree is created with orders after existing modules"""
+        response = self.client.post(self.syllabus_url, {'modules': self.build_modules(3)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([m['order'] for m in response.data], [1, 2, 3])
+        self.assertEqual([c['order'] for c in response.data[0]['contents']], [0, 1, 2, 3])
+        self.assertEqual(Module.objects.filter(course=self.course).count(), 4)
+        module = Module.objects.get(id=response.data[1]['id'])
+        items = [content.item for content in module.contents.all()]
+        self.assertEqual([item.title for item in items], ['Notes', 'Lecture', 'Slides', 'Diagram'])
+        self.assertEqual(items[0].owner, self.teacher)
+    
+    def test_create_syllabus_query_count_constant(self):
+        """Test query count does not grow with the size of the tree"""
+        def run(size):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.syllabus_url, {'modules': self.build_modules(size)}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+        
+        run(1)  # warm the content type cache
+        self.assertEqual(run(2), run(50))
+    
+    def test_create_syllabus_missing_field(self):
+        """Test content items are validated per type"""
+        modules = [{'title': 'Module', 'contents': [{'type': 'video', 'title': 'No url'}]}]
+        response = self.client.post(self.syllabus_url, {'modules': modules}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_syllabus_foreign_file(self):
+        """Test files can only come from the teacher's own upload prefix"""
+        other = User.objects.create_user(email='other@example.com', password='testpass123')
+        for name in [
+            'files/slides.pdf',
+            f'files/{other.pk}/slides.pdf',
+            f'files/{self.teacher.pk}/../{other.pk}/slides.pdf',
+            f'images/{self.teacher.pk}/slides.pdf',
+            f'/files/{self.teacher.pk}/slides.pdf',
+        ]:
+            modules = [{'title': 'Module', 'contents': [{'type': 'file', 'title': 'Slides', 'file': name}]}]
+            response = self.client.post(self.syllabus_url, {'modules': modules}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, name)
+        self.assertFalse(File.objects.exists())
+    
+    def test_create_syllabus_not_owner(self):
+        """Test only the owner can author the syllabus"""
+        other = User.objects.create_user(email='other@example.com', password='testpass123')
+        self.client.force_authenticate(user=other)
+        response = self.client.post(self.syllabus_url, {'modules': self.build_modules(1)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CourseCloneTest(APITestCase):
+    """Test deep cloning of a course"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        teacher_group, _ = Group.objects.get_or_create(name='teacher')
+        Group.objects.get_or_create(name='student')
+        
+        self.teacher = User.objects.create_user(
+            email='teacher@example.com',
+            password='testpass123'
+        )
+        self.teacher.role = UserRole.TEACHER
+        self.teacher.is_active = True
+        self.teacher.groups.add(teacher_group)
+        self.teacher.save()
+        
+        self.subject = Subject.objects.create(title='Programming', slug='programming')
+        self.course = Course.objects.create(
+            owner=self.teacher,
+            subject=self.subject,
+            title='Python Course',
+            overview='Learn Python',
+            photo='courses/courses/photos/python.png'
+        )
+        self.client.force_authenticate(user=self.teacher)
+        self.clone_url = reverse('teacher-course-clone', kwargs={'pk': self.course.id})
+    
+    def add_modules(self, count):
+        modules = [
+            {
+                'title': f'Module {i}',
+                'contents': [
+                    {'type': 'text', 'title': 'Notes', 'content': 'Read me'},
+                    {'type': 'file', 'title': 'Slides', 'file': f'files/{self.teacher.pk}/slides.pdf'},
+                ]
+            }
+            for i in range(count)
+        ]
+        url = reverse('teacher-course-syllabus', kwargs={'pk': self.course.id})
+        self.client.post(url, {'modules': modules}, format='json')
+    
+    def test_clone_course(self):
+        """Test the whole tree is copied and blobs are shared"""
+        self.add_modules(3)
+        response = self.client.post(self.clone_url, {'title': 'Python Course 2025'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        clone = Course.objects.get(id=response.data['id'])
+        self.assertEqual(clone.title, 'Python Course 2025')
+        self.assertEqual(clone.photo.name, self.course.photo.name)
+        self.assertEqual(
+            list(clone.modules.values_list('title', 'order')),
+            list(self.course.modules.values_list('title', 'order'))
+        )
+        original = [c.item for c in Content.objects.filter(module__course=self.course)]
+        copied = [c.item for c in Content.objects.filter(module__course=clone)]
+        self.assertEqual(len(copied), 6)
+        self.assertTrue(all(a.pk != b.pk for a, b in zip(original, copied)))
+        self.assertEqual(
+            [getattr(item, 'file', None) and item.file.name for item in copied],
+            [getattr(item, 'file', None) and item.file.name for item in original]
+        )
+        self.assertEqual(clone.students.count(), 0)
+    
+    def test_clone_query_count_constant(self):
+        """Test cloning cost does not grow with the course size"""
+        def run():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.clone_url, {}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+        
+        self.add_modules(1)
+        small = run()
+        self.add_modules(30)
+        self.assertEqual(run(), small)
+    
+    def test_clone_not_owner(self):
+        """Test a teacher cannot clone someone else's course"""
+        other = User.objects.create_user(email='other@example.com', password='testpass123')
+        other.groups.add(Group.objects.get(name='teacher'))
+        self.client.force_authenticate(user=other)
+        response = self.client.post(self.clone_url, {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TeacherQueryBudgetTest(QueryBudgetMixin, APITestCase):
+    """Test teacher endpoints run a fixed number of queries"""
+
+    def setUp(self):
+        teacher_group, _ = Group.objects.get_or_create(name='teacher')
+        self.teacher = User.objects.create(email='teacher@example.com', role=UserRole.TEACHER, is_active=True)
+        self.teacher.groups.add(teacher_group)
+        self.subject = Subject.objects.create(title='Programming', slug='programming')
+        self.seeded = 0
+        self.client.force_authenticate(user=self.teacher)
+
+    def seed(self, count):
+        """Add ``count`` courses, each with modules and students"""
+        for _ in range(count):
+            self.seeded += 1
+            course = Course.objects.create(
+                owner=self.teacher, subject=self.subject, title=f'Course {self.seeded}', overview='Overview'
+            )
+            self.first_course = getattr(self, 'first_course', course)
+            for i in range(2):
+                Module.objects.create(course=course, title=f'Module {i}')
+                course.students.add(User.objects.create(email=f'student{self.seeded}-{i}@example.com'))
+
+    def test_course_list_budget(self):
+        """Test listing courses"""
+        self.assertQueryBudget(3, self.seed, lambda: self.client.get(reverse('teacher-course-list')))
+
+    def test_course_list_stats_budget(self):
+        """Test listing courses with stats"""
+        self.assertQueryBudget(
+            3, self.seed, lambda: self.client.get(reverse('teacher-course-list'), {'stats': 'true'})
+        )
+
+    def test_course_detail_budget(self):
+        """Test retrieving a course"""
+        self.assertQueryBudget(
+            2, self.seed, lambda: self.client.get(reverse('teacher-course-detail', kwargs={'pk': self.first_course.pk}))
+        )
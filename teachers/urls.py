@@ -5,12 +5,20 @@ from .views import (
     CourseDetailAPI,
     CourseUpdateAPI,    
     CourseDeleteAPI,
+    CourseBatchAPI,
+    SyllabusCreateAPI,
+    CourseCloneAPI,
+    EnrollmentAnalyticsAPI,
 )
 
 urlpatterns = [
     path('courses/', CourseListAPI.as_view(), name='teacher-course-list'),
+    path('courses/batch/', CourseBatchAPI.as_view(), name='teacher-course-batch'),
     path('courses/create/', CourseCreateAPI.as_view(), name='teacher-course-create'),
     path('courses/<int:pk>/', CourseDetailAPI.as_view(), name='teacher-course-detail'),
     path('courses/<int:pk>/update/', CourseUpdateAPI.as_view(), name='teacher-course-update'),
     path('courses/<int:pk>/delete/', CourseDeleteAPI.as_view(), name='teacher-course-delete'),
+    path('courses/<int:pk>/syllabus/', SyllabusCreateAPI.as_view(), name='teacher-course-syllabus'),
+    path('courses/<int:pk>/clone/', CourseCloneAPI.as_view(), name='teacher-course-clone'),
+    path('analytics/enrollments/', EnrollmentAnalyticsAPI.as_view(), name='teacher-enrollment-analytics'),
 ]
\ No newline at end of file
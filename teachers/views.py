@@ -6,6 +6,14 @@ from rest_framework.permissions import IsAuthenticated
 from .serializers import (
     CourseInputSerializer,
     CourseOutputSerializer,
+    CourseStatsOutputSerializer,
+    CourseBatchInputSerializer,
+    CourseBatchResultSerializer,
+    CourseCloneInputSerializer,
+    SyllabusInputSerializer,
+    SyllabusModuleOutputSerializer,
+    EnrollmentAnalyticsInputSerializer,
+    EnrollmentAnalyticsOutputSerializer,
 )
 from .permissions import (
     IsTeacher,
@@ -15,13 +23,18 @@ from .services import (
     course_create,
     course_update,
     course_delete,
+    course_batch,
+    syllabus_create,
+    course_clone,
 )
 from .selectors import (
     course_list,
     course_detail,
+    enrollment_analytics,
 )
 
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from api.pagination import LimitOffsetPagination
 
 @extend_schema(tags=['Teachers'], responses={201: CourseOutputSerializer})
 class CourseCreateAPI(APIView):
@@ -51,15 +64,35 @@ class CourseListAPI(APIView):
         IsTeacher,
     ]
     serializer_class = CourseOutputSerializer
-        
+    stats_serializer_class = CourseStatsOutputSerializer
+    pagination_class = LimitOffsetPagination
+
+    def with_stats(self):
+        return self.request.query_params.get('stats', '').lower() in ('1', 'true', 'yes')
+
     def get_queryset(self):
-        return course_list(owner=self.request.user)
+        return course_list(owner=self.request.user, with_stats=self.with_stats())
 
+    def get_serializer_class(self):
+        return self.stats_serializer_class if self.with_stats() else self.serializer_class
 
-    @extend_schema(operation_id="list_teacher_courses",)
+
+    @extend_schema(
+        operation_id="list_teacher_courses",
+        parameters=[
+            OpenApiParameter('stats', bool, description='Include enrollment_count, module_count and last_enrollment'),
+        ],
+        responses={200: CourseStatsOutputSerializer(many=True)},
+    )
     def get(self, request):
         courses = self.get_queryset()
-        serializer = self.serializer_class(courses, many=True)
+        serializer_class = self.get_serializer_class()
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(courses, request, view=self)
+        if page is not None:
+            serializer = serializer_class(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+        serializer = serializer_class(courses, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 @extend_schema(tags=['Teachers'])
@@ -124,4 +157,101 @@ class CourseDeleteAPI(APIView):
     
     def delete(self, request, pk):
         course_delete(self.get_object(pk))
-        return Response(status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@extend_schema(tags=['Teachers'], responses={200: CourseBatchResultSerializer(many=True)})
+class CourseBatchAPI(APIView):
+    permission_classes = [
+        IsAuthenticated,
+        IsTeacher,
+    ]
+    serializer_class = CourseBatchInputSerializer
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        if serializer.is_valid():
+            results = course_batch(
+                owner=request.user,
+                operations=serializer.validated_data['operations'],
+            )
+            return Response(CourseBatchResultSerializer(results, many=True).data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@extend_schema(tags=['Teachers'], responses={201: SyllabusModuleOutputSerializer(many=True)})
+class SyllabusCreateAPI(APIView):
+    permission_classes = [
+        IsAuthenticated,
+        IsOwner,
+    ]
+    serializer_class = SyllabusInputSerializer
+
+    def get_object(self, pk):
+        course = course_detail(pk=pk)
+        self.check_object_permissions(self.request, course)
+        return course
+
+    def post(self, request, pk):
+        course = self.get_object(pk)
+
+        serializer = self.serializer_class(data=request.data, context={'request': request})
+        if serializer.is_valid():
+            modules = syllabus_create(
+                course=course,
+                owner=request.user,
+                modules=serializer.validated_data['modules'],
+            )
+            return Response(SyllabusModuleOutputSerializer(modules, many=True).data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@extend_schema(tags=['Teachers'], responses={201: CourseOutputSerializer})
+class CourseCloneAPI(APIView):
+    permission_classes = [
+        IsAuthenticated,
+        IsTeacher,
+        IsOwner,
+    ]
+    serializer_class = CourseCloneInputSerializer
+
+    def get_object(self, pk):
+        course = course_detail(pk=pk)
+        self.check_object_permissions(self.request, course)
+        return course
+
+    def post(self, request, pk):
+        course = self.get_object(pk)
+
+        serializer = self.serializer_class(data=request.data)
+        if serializer.is_valid():
+            clone = course_clone(
+                course=course,
+                owner=request.user,
+                title=serializer.validated_data.get('title'),
+            )
+            return Response(CourseOutputSerializer(clone).data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@extend_schema(tags=['Teachers'])
+class EnrollmentAnalyticsAPI(APIView):
+    permission_classes = [
+        IsAuthenticated,
+        IsTeacher,
+    ]
+    serializer_class = EnrollmentAnalyticsInputSerializer
+
+    @extend_schema(
+        parameters=[EnrollmentAnalyticsInputSerializer],
+        responses={200: EnrollmentAnalyticsOutputSerializer},
+    )
+    def get(self, request):
+        serializer = self.serializer_class(data=request.query_params)
+        if serializer.is_valid():
+            analytics = enrollment_analytics(
+                owner=request.user,
+                start=serializer.validated_data['start'],
+                end=serializer.validated_data['end'],
+                granularity=serializer.validated_data['granularity'],
+                course=serializer.validated_data.get('course'),
+            )
+            return Response(EnrollmentAnalyticsOutputSerializer(analytics).data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)